@@ -0,0 +1,235 @@
+"""
+Benchmarks of the MIDI and schema hot paths, with a stored baseline and a regression check.
+
+Cases, each run on music_notes.json and on synthetic pieces with its sections repeated to
+10x-1000x the bars (--scale):
+  json_to_midi_bytes       encode the whole piece
+  pitch_to_midi            every pitch string of the piece
+  duration_to_ticks        every duration of the piece
+  model_validate           MusicNotes.model_validate of the raw JSON
+  model_dump_json          MusicNotes.model_dump_json
+  merge_sections           NotesGenService.collect_music_notes of the per-section results,
+                           the merge at the end of generate_all_channel_notes
+
+Times are the best of several runs. A fixed reference workload is timed right before each
+case, and the check counts a case as slower only if it is so both in seconds and relative to
+the reference, so drifts in machine speed during a run weigh less.
+
+Usage:
+  python -m benchmarks.bench_hot_paths                      # print the results
+  python -m benchmarks.bench_hot_paths --save               # record benchmarks/baseline.json
+  python -m benchmarks.bench_hot_paths --check              # exit 1 on a regression against it
+  [--scale 1 10 100 1000] [--tolerance 0.25] [--retries 2] [--baseline PATH] [--output results.json]
+
+A case that looks regressed is measured again (--retries) before the check fails, so a
+one-off slow run on a busy machine does not. Record the baseline on the machine that runs
+the check.
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+from src.schemas.music import MusicNotes, MusicRhythm, RhythmSection, SectionChannelsResponse
+from src.services.midi import json_to_midi_bytes, pitch_to_midi, duration_to_ticks
+from src.services.notes_gen import NotesGenService
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SCALES = [1, 10, 100, 1000]
+# Runs stop after this many seconds or max_runs, whichever comes first; at least min_runs
+MIN_SECONDS = 0.5
+MIN_RUNS = 3
+MAX_RUNS = 200
+
+
+def scale_notes_json(raw: dict, factor: int) -> dict:
+    """
+    The raw MusicNotes JSON with every channel's sections repeated `factor` times, renamed
+    `<section>_<repeat>` and with bars renumbered so the piece gets longer.
+    """
+    channels = []
+    for channel in raw["channels"]:
+        sections = []
+        for repeat in range(factor):
+            for section in channel["sections"]:
+                bar_offset = repeat * len(section["bars"])
+                sections.append({
+                    "section": f"{section['section']}_{repeat}",
+                    "bars": [{"bar": bar["bar"] + bar_offset, "events": copy.deepcopy(bar["events"])} for bar in section["bars"]],
+                })
+        channels.append({"channel": channel["channel"], "sections": sections})
+    return {"channels": channels}
+
+
+def split_sections(music_notes: MusicNotes) -> Tuple[List[SectionChannelsResponse], MusicRhythm]:
+    """Per-section results as the notes stage produces them, and a rhythm with the same sections."""
+    names = list(dict.fromkeys(sec.section for channel in music_notes.channels for sec in channel.sections))
+    results, sections = [], []
+    for name in names:
+        channels = [
+            {"channel": channel.channel, "sections": [sec for sec in channel.sections if sec.section == name]}
+            for channel in music_notes.channels
+        ]
+        results.append(SectionChannelsResponse.model_validate({"channels": channels}))
+        bars = max(len(sec.bars) for channel in channels for sec in channel["sections"])
+        sections.append(RhythmSection(
+            section=name, bars=bars, bass=[], perc=[], melody=[], harmony=[], voiceLeading=[], dynamics=[],
+            polyphony="", loop=""
+        ))
+    return results, MusicRhythm(sections=sections)
+
+
+def reference_workload():
+    """Fixed pure-Python work the case timings are divided by, to factor out machine speed."""
+    values = [(i * 7919) % 10007 for i in range(20_000)]
+    return sorted(values), sum(str(value).count("7") for value in values)
+
+
+def best_time(func: Callable[[], object]) -> float:
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < MIN_RUNS or (len(timings) < MAX_RUNS and time.perf_counter() - started < MIN_SECONDS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def build_cases(raw: dict) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """Case name -> (function, items it processes) for one piece."""
+    music_notes = MusicNotes.model_validate(raw)
+    raw_events = [event for channel in raw["channels"] for sec in channel["sections"] for bar in sec["bars"] for event in bar["events"]]
+    pitches = [(event[1], channel["channel"] == "perc") for channel in raw["channels"]
+               for sec in channel["sections"] for bar in sec["bars"] for event in bar["events"]]
+    durations = [event[2] for event in raw_events]
+    section_results, music_rhythm = split_sections(music_notes)
+    notes_service = NotesGenService(llm_service=None)
+
+    def pitches_to_midi():
+        for pitch, is_percussion in pitches:
+            try:
+                pitch_to_midi(pitch, is_percussion)
+            except ValueError:
+                pass
+
+    def durations_to_ticks():
+        for duration in durations:
+            try:
+                duration_to_ticks(duration)
+            except ValueError:
+                pass
+
+    events = len(raw_events)
+    return {
+        "json_to_midi_bytes": (lambda: json_to_midi_bytes(music_notes), events),
+        "pitch_to_midi": (pitches_to_midi, events),
+        "duration_to_ticks": (durations_to_ticks, events),
+        "model_validate": (lambda: MusicNotes.model_validate(raw), events),
+        "model_dump_json": (music_notes.model_dump_json, events),
+        "merge_sections": (lambda: notes_service.collect_music_notes(section_results, music_rhythm), len(section_results)),
+    }
+
+
+def measure(func: Callable[[], object], items: int) -> dict:
+    reference = best_time(reference_workload)
+    seconds = best_time(func)
+    return {
+        "seconds": seconds, "relative": seconds / reference, "reference_seconds": reference, "items": items,
+        "us_per_item": seconds / max(items, 1) * 1e6,
+    }
+
+
+def run(notes_path: str, scales: List[int]) -> dict:
+    with open(notes_path, "r") as f:
+        base = json.load(f)
+    results = {}
+    for factor in scales:
+        raw = scale_notes_json(base, factor)
+        for name, (func, items) in build_cases(raw).items():
+            result = results[f"{name}@x{factor}"] = measure(func, items)
+            print(f"{name:>20} x{factor:<5} {items:>9} items {result['seconds'] * 1000:>10.3f} ms {result['us_per_item']:>9.3f} us/item")
+    return {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(), "notes": os.path.basename(notes_path),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def slowdown(baseline: dict, current: dict, case: str) -> float:
+    """
+    How much slower a case got: the lesser of its slowdown in seconds and relative to the
+    reference workload. A real regression shows in both; jitter in either timing alone does not.
+    """
+    result, expected = current["results"][case], baseline["results"][case]
+    return min(result["seconds"] / expected["seconds"], result["relative"] / expected["relative"])
+
+
+def find_regressions(baseline: dict, current: dict, tolerance: float) -> List[str]:
+    """Cases slower than the baseline (see slowdown) by more than `tolerance` (0.25 = 25%)."""
+    return [
+        case for case in current["results"]
+        if case in baseline["results"] and slowdown(baseline, current, case) > 1 + tolerance
+    ]
+
+
+def confirm_regressions(notes_path: str, baseline: dict, current: dict, tolerance: float, retries: int) -> List[str]:
+    """
+    find_regressions, measuring the regressed cases again up to `retries` times and keeping
+    their best result, so a case fails only if it is slow on every attempt rather than once.
+    """
+    with open(notes_path, "r") as f:
+        base = json.load(f)
+    regressions = find_regressions(baseline, current, tolerance)
+    for _ in range(retries):
+        if not regressions:
+            break
+        for factor in sorted({int(case.rsplit("@x", 1)[1]) for case in regressions}):
+            for name, (func, items) in build_cases(scale_notes_json(base, factor)).items():
+                case = f"{name}@x{factor}"
+                if case in regressions:
+                    retry = {"results": {case: measure(func, items)}}
+                    if slowdown(baseline, retry, case) < slowdown(baseline, current, case):
+                        current["results"][case] = retry["results"][case]
+        regressions = find_regressions(baseline, current, tolerance)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", default="music_notes.json", help="MusicNotes JSON file to scale")
+    parser.add_argument("--scale", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to save or check against")
+    parser.add_argument("--save", action="store_true", help="Record the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="Fail if a case regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing the check")
+    parser.add_argument("--retries", type=int, default=2, help="Times a regressed case is measured again before failing")
+    parser.add_argument("--output", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    current = run(args.notes, args.scale)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if args.check:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = confirm_regressions(args.notes, baseline, current, args.tolerance, args.retries)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for case in regressions:
+                print(f"  {case}: {slowdown(baseline, current, case):.2f}x the baseline ({current['results'][case]['seconds'] * 1000:.3f} ms)")
+            sys.exit(1)
+        print(f"No regression beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
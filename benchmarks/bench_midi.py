@@ -0,0 +1,59 @@
+"""
+Compare the direct MIDI encoder against the mido reference path.
+
+Usage: python -m benchmarks.bench_midi [--scale 1 10 100] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from src.schemas.music import MusicNotes, ChannelNotes, SectionNotes
+from src.services.midi import json_to_midi_bytes, json_to_midi_bytes_mido
+
+
+def scale_music_notes(music_notes: MusicNotes, factor: int) -> MusicNotes:
+    """Repeat every section `factor` times, renumbering bars so the piece gets longer."""
+    channels = []
+    for channel in music_notes.channels:
+        sections = []
+        for repeat in range(factor):
+            for section in channel.sections:
+                bar_offset = repeat * len(section.bars)
+                sections.append(SectionNotes(
+                    section=f"{section.section}_{repeat}",
+                    bars=[bar.model_copy(update={"bar": bar.bar + bar_offset}) for bar in section.bars],
+                ))
+        channels.append(ChannelNotes(channel=channel.channel, sections=sections))
+    return MusicNotes(channels=channels)
+
+
+def best_of(func, music_notes: MusicNotes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(music_notes)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", default="music_notes.json", help="MusicNotes JSON file")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(args.notes, "r") as f:
+        base_notes = MusicNotes.model_validate(json.load(f))
+
+    print(f"{'scale':>6} {'events':>8} {'mido ms':>10} {'direct ms':>10} {'speedup':>8}")
+    for factor in args.scale:
+        music_notes = scale_music_notes(base_notes, factor)
+        events = sum(len(bar.events) for ch in music_notes.channels for sec in ch.sections for bar in sec.bars)
+        assert json_to_midi_bytes(music_notes) == json_to_midi_bytes_mido(music_notes)
+        mido_time = best_of(json_to_midi_bytes_mido, music_notes, args.repeat)
+        direct_time = best_of(json_to_midi_bytes, music_notes, args.repeat)
+        print(f"{factor:>6} {events:>8} {mido_time * 1000:>10.2f} {direct_time * 1000:>10.2f} {mido_time / direct_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Compare the plan modes (staged, fused, fast) on latency, LLM calls, tokens and plan consistency.
+
+Runs plan -> chords -> rhythm against the configured LLM (OPENROUTER_URL, OPENROUTER_API_KEY)
+without the response cache, so every run pays for its calls. Consistency is the share of
+structural checks (see plan_consistency) the plan, chords and rhythm pass together; a fused
+call that drifts between its stages shows up there.
+
+Usage: python -m benchmarks.bench_plan_modes [--description "..."] [--modes staged fast] [--runs 3] [--model M]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+from src.metrics import LLM_REQUESTS, LLM_TOKENS
+from src.schemas.music import MusicPlan, MusicChords, MusicRhythm, PlanMode
+from src.services.circuit_breaker import LlmError
+from src.services.llm import LlmService
+from src.services.music_plan import MusicPlanService
+
+DEFAULT_DESCRIPTIONS = [
+    "Retro 8-bit battle theme, fast and tense",
+    "Calm lo-fi piano loop for studying",
+    "Uplifting orchestral fanfare with a quiet bridge",
+]
+
+
+class RecordingMusicPlanService(MusicPlanService):
+    """MusicPlanService keeping the last plan, chords and rhythm instead of saving them."""
+
+    def save_music_plan(self, run_id, description, music_plan, music_chords, rhythm_response):
+        self.last = (music_plan, music_chords, rhythm_response)
+
+
+def plan_consistency(music_plan: MusicPlan, music_chords: MusicChords, music_rhythm: MusicRhythm) -> Dict[str, bool]:
+    """Structural agreement between the stages, check name -> passed."""
+    plan_bars = [(sec.section, sec.bars) for sec in music_plan.structure]
+    chord_bars = [(sec.name, sec.bars) for sec in music_chords.sections]
+    rhythm_bars = [(sec.section, sec.bars) for sec in music_rhythm.sections]
+    return {
+        "chord_sections": [name for name, _ in chord_bars] == [name for name, _ in plan_bars],
+        "rhythm_sections": [name for name, _ in rhythm_bars] == [name for name, _ in plan_bars],
+        "section_bars": chord_bars == plan_bars and rhythm_bars == plan_bars,
+        "total_bars": sum(bars for _, bars in plan_bars) == music_plan.length_scale.total_bars,
+        "chords_written": bool(chord_bars) and all(sec.chords for sec in music_chords.sections),
+        "rhythm_written": bool(rhythm_bars) and all(
+            sec.bass and sec.perc and sec.melody and sec.harmony for sec in music_rhythm.sections
+        ),
+    }
+
+
+def llm_counters(model: str) -> Dict[str, float]:
+    return {
+        "calls": LLM_REQUESTS.value(model=model, outcome="success"),
+        "prompt_tokens": LLM_TOKENS.value(model=model, kind="prompt"),
+        "completion_tokens": LLM_TOKENS.value(model=model, kind="completion"),
+    }
+
+
+async def run_mode(service: RecordingMusicPlanService, mode: PlanMode, descriptions: List[str], runs: int, model: str):
+    try:
+        return await run_descriptions(service, mode, descriptions, runs, model)
+    finally:
+        # Each mode runs on its own event loop; close the LLM connections opened on it
+        await service.llm_service.client_pool.aclose_async_clients()
+
+
+async def run_descriptions(
+    service: RecordingMusicPlanService, mode: PlanMode, descriptions: List[str], runs: int, model: str
+):
+    results = {"seconds": [], "calls": [], "prompt_tokens": [], "completion_tokens": [], "consistency": [], "failures": 0}
+    for description in descriptions:
+        for _ in range(runs):
+            before = llm_counters(model)
+            start = time.perf_counter()
+            try:
+                await service.generate_music_rhythm_given_description_async(description, model=model, plan_mode=mode)
+            except LlmError as e:
+                print(f"  {mode.value}: {description!r} failed: {e}")
+                results["failures"] += 1
+                continue
+            results["seconds"].append(time.perf_counter() - start)
+            after = llm_counters(model)
+            for key in before:
+                results[key].append(after[key] - before[key])
+            checks = plan_consistency(*service.last)
+            results["consistency"].append(sum(checks.values()) / len(checks))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--description", action="append", help="Description to plan, repeatable")
+    parser.add_argument("--modes", nargs="+", default=[mode.value for mode in PlanMode], choices=[mode.value for mode in PlanMode])
+    parser.add_argument("--runs", type=int, default=3, help="Runs per description and mode")
+    parser.add_argument("--model", default=None, help="LLM model (the default model if omitted)")
+    args = parser.parse_args()
+
+    llm_service = LlmService(llm_provider="openrouter")
+    model = llm_service._resolve_model(args.model)
+    service = RecordingMusicPlanService(llm_service)
+    descriptions = args.description or DEFAULT_DESCRIPTIONS
+
+    print(f"{'mode':>8} {'runs':>5} {'p50 s':>8} {'mean s':>8} {'calls':>6} {'prompt tok':>11} {'compl tok':>10} {'consistency':>12} {'failed':>7}")
+    for mode in map(PlanMode, args.modes):
+        results = asyncio.run(run_mode(service, mode, descriptions, args.runs, model))
+        if not results["seconds"]:
+            print(f"{mode.value:>8} {0:>5} {'-':>8} {'-':>8} {'-':>6} {'-':>11} {'-':>10} {'-':>12} {results['failures']:>7}")
+            continue
+        mean = statistics.mean
+        print(
+            f"{mode.value:>8} {len(results['seconds']):>5} {statistics.median(results['seconds']):>8.2f} "
+            f"{mean(results['seconds']):>8.2f} {mean(results['calls']):>6.1f} {mean(results['prompt_tokens']):>11.0f} "
+            f"{mean(results['completion_tokens']):>10.0f} {mean(results['consistency']):>11.0%} {results['failures']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+Local OpenAI-compatible stand-in for the LLM, to load-test the app offline.
+
+Serves POST /v1/chat/completions, plain and streamed, with schema-valid answers for every
+stage: MusicPlan, MusicChords, MusicRhythm, the fused plan models and SectionChannelsResponse
+(JSON or compact notes). The stage is read from the JSON schema instructor adds to the prompt,
+and chords, rhythm and notes follow the sections of the previous stage found in the prompt.
+Identical prompts get identical answers. Latency (time to first token plus a token rate),
+errors, 429s and malformed JSON are injected at the configured rates. GET /stats reports what
+was served and DELETE /stats resets it between runs.
+
+Usage: python -m benchmarks.fake_llm_server [--port 8001] [--latency lognormal --latency-mean 0.8]
+       [--tokens-per-second 80] [--error-rate 0.02] [--rate-limit-rate 0.05] [--malformed-rate 0.05]
+then start the app with OPENROUTER_URL=http://127.0.0.1:8001/v1 OPENROUTER_API_KEY=fake
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.schemas.music import (
+    MusicPlan, MusicChords, MusicRhythm, MusicChordsRhythm, MusicPlanChordsRhythm, SectionChannelsResponse,
+)
+from src.services.compact_notes import format_compact_notes
+from src.utils import estimate_tokens
+
+LATENCY_DISTRIBUTIONS = ["fixed", "uniform", "exponential", "lognormal"]
+
+FORMS = [
+    [("Intro", 4), ("A", 8), ("B", 8), ("A", 8), ("Outro", 4)],
+    [("Intro", 2), ("Verse", 8), ("Chorus", 8), ("Verse", 8), ("Chorus", 8), ("Outro", 4)],
+    [("A", 8), ("B", 8), ("A", 8)],
+]
+KEYS = [
+    ("C major", ["C", "Am", "F", "G"], ["C", "D", "E", "G", "A"]),
+    ("D minor", ["Dm", "Bb", "F", "C"], ["D", "F", "G", "A", "C"]),
+    ("G major", ["G", "Em", "C", "D"], ["G", "A", "B", "D", "E"]),
+    ("A minor", ["Am", "F", "C", "G"], ["A", "C", "D", "E", "G"]),
+]
+DEFAULT_SECTION_BARS = 4
+
+# Sections of the previous stage as embedded in the prompt (model_dump_json, no spaces); the
+# prompt's own output format examples are Python reprs with single quotes and never match
+_SECTION_BARS = re.compile(r'"(?:section|name)":"([^"]+)","bars":(\d+)')
+_NOTES_SECTION = re.compile(r"for all channels in the (.+?) section only")
+_SCHEMA_MARKER = "json_schema:"
+
+
+class LatencyModel:
+    """
+    Seconds until the first token: `fixed` at the mean, `uniform` within mean +- spread,
+    `exponential` around the mean, or `lognormal` with the mean and a sigma of `spread`.
+    """
+
+    def __init__(self, distribution: str = "fixed", mean: float = 0.0, spread: float = 0.0):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            return max(0.0, rng.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.distribution == "exponential":
+            return rng.expovariate(1 / self.mean)
+        if self.distribution == "lognormal":
+            # mu chosen so the distribution's mean is `mean`
+            return rng.lognormvariate(math.log(self.mean) - self.spread ** 2 / 2, self.spread)
+        return self.mean
+
+
+class FakeLlmConfig:
+    """
+    Behaviour of the fake server; rates are probabilities per request.
+
+    :param tokens_per_second: Completion token rate after the first token; 0 sends at once
+    :param max_in_flight: Requests served at once before answering 429, like a provider quota; None is unlimited
+    :param seed: Seed of the injected latency and failures; answers only depend on the prompt
+    """
+
+    def __init__(
+            self,
+            latency: Optional[LatencyModel] = None,
+            tokens_per_second: float = 0.0,
+            error_rate: float = 0.0,
+            rate_limit_rate: float = 0.0,
+            retry_after: float = 1.0,
+            malformed_rate: float = 0.0,
+            max_in_flight: Optional[int] = None,
+            seed: Optional[int] = None
+    ):
+        self.latency = latency or LatencyModel()
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.max_in_flight = max_in_flight
+        self.seed = seed
+
+
+class FakeLlmStats:
+    def __init__(self):
+        self.requests = 0
+        self.outcomes: Dict[str, int] = {}
+        self.stages: Dict[str, int] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completion_tokens = 0
+        self.started = time.time()
+
+    def count(self, outcome: str):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "outcomes": dict(self.outcomes),
+            "stages": dict(self.stages),
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "completion_tokens": self.completion_tokens,
+            "uptime_seconds": round(time.time() - self.started, 3),
+        }
+
+
+def response_model_name(messages: List[dict]) -> Optional[str]:
+    """Title of the JSON schema instructor put in the messages (JSON mode), or None without one."""
+    for message in messages:
+        content = message.get("content") or ""
+        start = content.find(_SCHEMA_MARKER)
+        if start < 0:
+            continue
+        try:
+            schema, _ = json.JSONDecoder().raw_decode(content[content.index("{", start):])
+        except ValueError:
+            continue
+        # Streamed calls (create_partial) ask for Partial<Model>
+        return schema.get("title", "").removeprefix("Partial") or None
+    return None
+
+
+def prompt_sections(prompt: str) -> List[Tuple[str, int]]:
+    """(name, bars) of the sections of the previous stage embedded in the prompt."""
+    return [(name, int(bars)) for name, bars in _SECTION_BARS.findall(prompt)]
+
+
+class FakeComposer:
+    """Schema-valid, simple but playable answers for every generation stage."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.key, self.progression, self.scale = rng.choice(KEYS)
+
+    def music_plan(self) -> MusicPlan:
+        form = self.rng.choice(FORMS)
+        bpm = self.rng.randrange(80, 161, 4)
+        total_bars = sum(bars for _, bars in form)
+        return MusicPlan(
+            genre_style="Synthetic test groove",
+            mood_emotion=self.rng.choice(["Calm", "Tense", "Uplifting", "Playful"]),
+            tempo_feel={"bpm": bpm, "meter": "4/4", "feel": "Straight"},
+            key_tonality=self.key,
+            instruments=[
+                {"name": "Lead synth", "role": "melody"}, {"name": "Bass", "role": "bass"},
+                {"name": "Pad", "role": "harmony"}, {"name": "Drums", "role": "perc"},
+            ],
+            structure=[{"section": name, "bars": bars, "transition": "Straight cut"} for name, bars in form],
+            motivic_ideas={name: f"{name} motif on {self.scale[0]}" for name, _ in form},
+            dynamic_contour="Builds to the middle, settles at the end",
+            length_scale={"total_bars": total_bars, "duration_seconds": str(round(total_bars * 4 * 60 / bpm))},
+            looping_behavior="Loops from the first section",
+        )
+
+    def music_chords(self, sections: List[Tuple[str, int]]) -> MusicChords:
+        return MusicChords(key=self.key, sections=[
+            {
+                "name": name, "bars": bars,
+                "chords": [self.progression[bar % len(self.progression)] for bar in range(bars)],
+                "motifs": {name: list(range(1, min(bars, 4) + 1))}, "loop": "repeat",
+            }
+            for name, bars in sections
+        ])
+
+    def music_rhythm(self, sections: List[Tuple[str, int]]) -> MusicRhythm:
+        return MusicRhythm(sections=[
+            {
+                "section": name, "bars": bars,
+                "bass": [f"Root quarters bars 1-{bars}"], "perc": [f"Kick on 1+3, snare on 2+4, hihat 8ths bars 1-{bars}"],
+                "melody": [f"Stepwise quarters over {self.scale} bars 1-{bars}"], "harmony": [f"Whole-note triads bars 1-{bars}"],
+                "voiceLeading": ["stepwise"], "dynamics": ["mf (vel 70-90)"], "polyphony": "mono", "loop": "repeat",
+            }
+            for name, bars in sections
+        ])
+
+    def section_notes(self, section: str, bars: int) -> SectionChannelsResponse:
+        def channel(name, events_of_bar):
+            return {"channel": name, "sections": [{
+                "section": section, "bars": [{"bar": bar, "events": events_of_bar(bar)} for bar in range(1, bars + 1)],
+            }]}
+
+        return SectionChannelsResponse(channels=[
+            channel("melody", lambda bar: [
+                [beat, f"{self.rng.choice(self.scale)}{self.rng.choice([4, 5])}", "quarter", self.rng.randrange(70, 100)]
+                for beat in range(1, 5)
+            ]),
+            channel("bass", lambda bar: [[1, f"{self.scale[0]}2", "half", 90], [3, f"{self.scale[3]}2", "half", 85]]),
+            channel("harmony", lambda bar: [[1, f"{pitch}4", "whole", 60] for pitch in self.scale[::2]]),
+            channel("perc", lambda bar: [[1, "kick", "quarter", 80], [2, "snare", "quarter", 70],
+                                         [3, "kick", "quarter", 80], [4, "snare", "quarter", 70]]),
+        ])
+
+    def answer(self, stage: Optional[str], prompt: str) -> str:
+        """The completion text for a stage (a response model name), or for notes in the compact format."""
+        sections = prompt_sections(prompt) or [(name, bars) for name, bars in FORMS[0]]
+        if stage == "MusicPlan":
+            response = self.music_plan()
+        elif stage == "MusicChords":
+            response = self.music_chords(sections)
+        elif stage == "MusicRhythm":
+            response = self.music_rhythm(sections)
+        elif stage == "MusicChordsRhythm":
+            response = MusicChordsRhythm(music_chords=self.music_chords(sections), music_rhythm=self.music_rhythm(sections))
+        elif stage == "MusicPlanChordsRhythm":
+            music_plan = self.music_plan()
+            planned = [(sec.section, sec.bars) for sec in music_plan.structure]
+            response = MusicPlanChordsRhythm(
+                music_plan=music_plan, music_chords=self.music_chords(planned), music_rhythm=self.music_rhythm(planned)
+            )
+        elif stage == "SectionChannelsResponse" or _NOTES_SECTION.search(prompt):
+            match = _NOTES_SECTION.search(prompt)
+            section = match.group(1) if match else sections[0][0]
+            bars = dict(sections).get(section, DEFAULT_SECTION_BARS)
+            response = self.section_notes(section, bars)
+            if stage is None:
+                return format_compact_notes(response)
+        else:
+            return "OK"
+        return response.model_dump_json(by_alias=True)
+
+
+def _completion(completion_id: str, model: str, content: str, usage: dict) -> dict:
+    return {
+        "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason: Optional[str] = None) -> str:
+    chunk = {
+        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def _error(status: int, message: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status, headers=headers,
+        content={"error": {"message": message, "type": "fake_llm_error", "code": status}},
+    )
+
+
+def create_app(config: FakeLlmConfig) -> FastAPI:
+    app = FastAPI(title="Fake LLM")
+    stats = FakeLlmStats()
+    rng = random.Random(config.seed)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "fake")
+        prompt = "\n".join(message.get("content") or "" for message in messages)
+        stage = response_model_name(messages)
+        label = stage or ("compact_notes" if _NOTES_SECTION.search(prompt) else "text")
+        stats.requests += 1
+        stats.stages[label] = stats.stages.get(label, 0) + 1
+
+        if config.max_in_flight is not None and stats.in_flight >= config.max_in_flight:
+            stats.count("rate_limited")
+            return _error(429, "Too many requests in flight", {"Retry-After": str(config.retry_after)})
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            stats.count("rate_limited")
+            return _error(429, "Rate limit exceeded", {"Retry-After": str(config.retry_after)})
+
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                stats.in_flight -= 1
+
+        try:
+            await asyncio.sleep(config.latency.sample(rng))
+            if roll < config.rate_limit_rate + config.error_rate:
+                stats.count("error")
+                release()
+                return _error(500, "Injected upstream error")
+
+            # Answers depend on the prompt only, like a model at temperature 0
+            prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+            content = FakeComposer(random.Random(prompt_hash)).answer(stage, prompt)
+            if rng.random() < config.malformed_rate:
+                stats.count("malformed")
+                content = content[:len(content) // 2] + " <truncated"
+            else:
+                stats.count("ok")
+            completion_tokens = estimate_tokens(content)
+            stats.completion_tokens += completion_tokens
+            usage = {
+                "prompt_tokens": estimate_tokens(prompt),
+                "completion_tokens": completion_tokens,
+                "total_tokens": estimate_tokens(prompt) + completion_tokens,
+            }
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            seconds_per_char = 1 / (4 * config.tokens_per_second) if config.tokens_per_second > 0 else 0.0
+
+            if not body.get("stream"):
+                await asyncio.sleep(len(content) * seconds_per_char)
+                release()
+                return _completion(completion_id, model, content, usage)
+
+            async def stream():
+                try:
+                    yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+                    for start in range(0, len(content), 16):
+                        piece = content[start:start + 16]
+                        await asyncio.sleep(len(piece) * seconds_per_char)
+                        yield _chunk(completion_id, model, {"content": piece})
+                    yield _chunk(completion_id, model, {}, finish_reason="stop")
+                    if (body.get("stream_options") or {}).get("include_usage"):
+                        # Like OpenAI: a last chunk without choices, carrying the usage
+                        usage_chunk = {
+                            "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                            "model": model, "choices": [], "usage": usage,
+                        }
+                        yield f"data: {json.dumps(usage_chunk)}\n\n"
+                    yield "data: [DONE]\n\n"
+                finally:
+                    release()
+
+            return StreamingResponse(stream(), media_type="text/event-stream")
+        except BaseException:
+            release()
+            raise
+
+    @app.get("/stats")
+    def get_stats():
+        return stats.snapshot()
+
+    @app.delete("/stats")
+    def reset_stats():
+        nonlocal stats
+        stats = FakeLlmStats()
+        return stats.snapshot()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Time to first token distribution")
+    parser.add_argument("--latency-mean", type=float, default=0.5, help="Mean seconds to the first token")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="Half width (uniform) or sigma (lognormal)")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Completion tokens per second, 0 for instant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of answers cut off mid-JSON")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Concurrent requests before answering 429")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the injected latency and failures")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = FakeLlmConfig(
+        latency=LatencyModel(args.latency, args.latency_mean, args.latency_spread),
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        malformed_rate=args.malformed_rate,
+        max_in_flight=args.max_in_flight,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
-from typing import Optional
+from typing import Optional, Dict
 
 class Settings(BaseSettings):
     openrouter_url: str = Field(alias="OPENROUTER_URL", default="https://openrouter.ai/api/v1")
@@ -8,6 +8,73 @@ class Settings(BaseSettings):
     openrouter_default_free_model: str = Field(alias="OPENROUTER_DEFAULT_FREE_MODEL", default="openai/gpt-oss-120b:free")
     openrouter_default_model: Optional[str] = Field(None, alias="OPENROUTER_DEFAULT_MODEL")
 
+    # LLM client pool
+    llm_pool_max_clients: int = Field(alias="LLM_POOL_MAX_CLIENTS", default=32)
+    llm_max_connections: int = Field(alias="LLM_MAX_CONNECTIONS", default=100)
+    llm_max_keepalive_connections: int = Field(alias="LLM_MAX_KEEPALIVE_CONNECTIONS", default=20)
+    llm_keepalive_expiry: float = Field(alias="LLM_KEEPALIVE_EXPIRY", default=60.0)
+
+    # Stage result cache
+    llm_cache_enabled: bool = Field(alias="LLM_CACHE_ENABLED", default=True)
+    llm_cache_dir: str = Field(alias="LLM_CACHE_DIR", default=".cache/llm")
+    llm_cache_ttl_seconds: float = Field(alias="LLM_CACHE_TTL_SECONDS", default=7 * 24 * 3600)
+    llm_cache_max_entries: int = Field(alias="LLM_CACHE_MAX_ENTRIES", default=2048)
+
+    # Identical concurrent LLM calls share one in-flight request
+    llm_coalescing_enabled: bool = Field(alias="LLM_COALESCING_ENABLED", default=True)
+
+    # Hedged LLM requests
+    llm_hedging_enabled: bool = Field(alias="LLM_HEDGING_ENABLED", default=False)
+    llm_hedge_quantile: float = Field(alias="LLM_HEDGE_QUANTILE", default=0.9)
+    llm_hedge_min_samples: int = Field(alias="LLM_HEDGE_MIN_SAMPLES", default=20)
+    llm_hedge_max_ratio: float = Field(alias="LLM_HEDGE_MAX_RATIO", default=0.1)
+    llm_hedge_fallback_model: Optional[str] = Field(None, alias="LLM_HEDGE_FALLBACK_MODEL")
+
+    # Per-model circuit breakers
+    llm_breaker_enabled: bool = Field(alias="LLM_BREAKER_ENABLED", default=True)
+    llm_breaker_failure_threshold: int = Field(alias="LLM_BREAKER_FAILURE_THRESHOLD", default=3)
+    llm_breaker_base_backoff: float = Field(alias="LLM_BREAKER_BASE_BACKOFF", default=5.0)
+    llm_breaker_max_backoff: float = Field(alias="LLM_BREAKER_MAX_BACKOFF", default=300.0)
+
+    # Outbound LLM admission: global in-flight cap, per-model requests/tokens per minute (unset = unlimited)
+    llm_max_in_flight: int = Field(alias="LLM_MAX_IN_FLIGHT", default=32)
+    llm_requests_per_minute: Optional[float] = Field(None, alias="LLM_REQUESTS_PER_MINUTE")
+    llm_tokens_per_minute: Optional[float] = Field(None, alias="LLM_TOKENS_PER_MINUTE")
+    # JSON, e.g. {"openai/gpt-4o": {"rpm": 500, "tpm": 30000}}
+    llm_model_rate_limits: Dict[str, Dict[str, float]] = Field(alias="LLM_MODEL_RATE_LIMITS", default_factory=dict)
+
+    # Per-run artifact store
+    artifact_dir: str = Field(alias="ARTIFACT_DIR", default="artifacts")
+    artifact_max_runs: int = Field(alias="ARTIFACT_MAX_RUNS", default=200)
+    artifact_max_age_seconds: float = Field(alias="ARTIFACT_MAX_AGE_SECONDS", default=7 * 24 * 3600)
+
+    # Background generation jobs
+    job_workers: int = Field(alias="JOB_WORKERS", default=4)
+    job_queue_depth: int = Field(alias="JOB_QUEUE_DEPTH", default=32)
+    job_retention: int = Field(alias="JOB_RETENTION", default=256)
+
+    # Plan stages: staged (plan, chords, rhythm calls), fused (plan, then chords+rhythm) or fast (one call)
+    plan_mode: str = Field(alias="PLAN_MODE", default="staged")
+
+    # Notes stage
+    notes_context_slicing: bool = Field(alias="NOTES_CONTEXT_SLICING", default=True)
+    notes_format: str = Field(alias="NOTES_FORMAT", default="json")
+    # Repair near-valid note output (durations, velocities, types) instead of re-prompting
+    notes_repair_enabled: bool = Field(alias="NOTES_REPAIR_ENABLED", default=True)
+    # Generate repeated sections (same name and bars) once and copy their notes to each occurrence
+    notes_dedup_repeats: bool = Field(alias="NOTES_DEDUP_REPEATS", default=True)
+    # Stream the rhythm and start each section's notes as soon as its rhythm is written
+    notes_pipelining: bool = Field(alias="NOTES_PIPELINING", default=True)
+
+    # Tracing
+    trace_export_file: Optional[str] = Field(None, alias="TRACE_EXPORT_FILE")
+    trace_export_url: Optional[str] = Field(None, alias="TRACE_EXPORT_URL")
+    trace_max_recent: int = Field(alias="TRACE_MAX_RECENT", default=200)
+
+    # Batch variations
+    variations_max: int = Field(alias="VARIATIONS_MAX", default=8)
+    variations_max_concurrency: int = Field(alias="VARIATIONS_MAX_CONCURRENCY", default=8)
+
     model_config = SettingsConfigDict(
         env_file="/app/.env",
         env_file_encoding="utf-8",
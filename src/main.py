@@ -1,8 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from .routes import router
+from .routes.responses import llm_error_response
+from .services import llm_service
+from .services.circuit_breaker import LlmError
+from .metrics import HTTP_IN_FLIGHT
+from .tracing import TraceMiddleware
 
-app = FastAPI(title="AnyLLM2Music", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Pooled async LLM connections belong to the server's event loop; close them before it stops
+    await llm_service.client_pool.aclose_async_clients()
+    llm_service.client_pool.close()
+
+
+app = FastAPI(title="AnyLLM2Music", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,5 +27,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compress JSON bodies (music notes, base64 MIDI) for clients sending Accept-Encoding: gzip;
+# text/event-stream is excluded so SSE events are not buffered
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+@app.middleware("http")
+async def track_requests_in_flight(request, call_next):
+    with HTTP_IN_FLIGHT.track_inprogress():
+        return await call_next(request)
+
+
+# Outermost, so the request span covers every other middleware and the whole response body
+app.add_middleware(TraceMiddleware)
+
 
+app.add_exception_handler(LlmError, llm_error_response)
 app.include_router(router)
\ No newline at end of file
@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import inspect
+import threading
+import time
+
+# Seconds; LLM stages range from sub-second cache hits to minutes of reasoning
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base of the thread-safe metrics below; one time series per combination of label values.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. tokens used."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight."""
+
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. latencies, in cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> (per-bucket counts, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels)) or ([0], 0.0)
+            return sum(counts)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics, rendered in the Prometheus text exposition format.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+STAGE_DURATION = metrics_registry.register(Histogram(
+    "anyllm2music_stage_duration_seconds",
+    "Latency of pipeline stages (plan, chords, rhythm, section_notes, notes, midi_encode)",
+    ["stage"],
+))
+STAGE_IN_PROGRESS = metrics_registry.register(Gauge(
+    "anyllm2music_stage_in_progress", "Pipeline stage calls currently running", ["stage"]
+))
+LLM_REQUEST_DURATION = metrics_registry.register(Histogram(
+    "anyllm2music_llm_request_duration_seconds", "Latency of LLM calls including retries", ["model"]
+))
+LLM_REQUESTS = metrics_registry.register(Counter(
+    "anyllm2music_llm_requests_total", "LLM calls by outcome (success, cached, coalesced or the LlmErrorKind of the failure)", ["model", "outcome"]
+))
+LLM_RETRIES = metrics_registry.register(Counter(
+    "anyllm2music_llm_retries_total", "LLM attempts beyond the first, after invalid or failed completions", ["model"]
+))
+LLM_HEDGES = metrics_registry.register(Counter(
+    "anyllm2music_llm_hedges_total", "Hedge requests sent to a model (launched) and hedges that won", ["model", "outcome"]
+))
+LLM_IN_FLIGHT = metrics_registry.register(Gauge(
+    "anyllm2music_llm_requests_in_flight", "LLM calls currently waiting on the provider", ["model"]
+))
+LLM_QUEUE_WAIT = metrics_registry.register(Histogram(
+    "anyllm2music_llm_queue_wait_seconds", "Time LLM calls waited for admission by the rate limiter", ["model"]
+))
+LLM_TOKENS = metrics_registry.register(Counter(
+    "anyllm2music_llm_tokens_total", "Tokens used by kind (prompt, completion, reasoning)", ["model", "kind"]
+))
+NOTE_REPAIRS = metrics_registry.register(Counter(
+    "anyllm2music_note_repairs_total",
+    "Invalid note outputs fixed locally instead of re-prompted (repaired) or still re-prompted (failed)",
+    ["format", "outcome"],
+))
+NOTE_REPAIR_FIXES = metrics_registry.register(Counter(
+    "anyllm2music_note_repair_fixes_total", "Fixes applied by the note repair pass, e.g. duration_snapped", ["fix"]
+))
+NOTE_SECTIONS_REUSED = metrics_registry.register(Counter(
+    "anyllm2music_note_sections_reused_total", "Repeated sections whose notes were copied instead of generated"
+))
+HTTP_IN_FLIGHT = metrics_registry.register(Gauge(
+    "anyllm2music_http_requests_in_flight", "HTTP requests currently being handled"
+))
+
+
+def observe_stage(stage: str):
+    """Decorator recording latency and in-progress count of a pipeline stage (sync or async)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with STAGE_IN_PROGRESS.track_inprogress(stage=stage), STAGE_DURATION.time(stage=stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with STAGE_IN_PROGRESS.track_inprogress(stage=stage), STAGE_DURATION.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
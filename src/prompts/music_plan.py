@@ -155,3 +155,73 @@ Backbone:
 User specified parameters:
 {str(MUSIC_PLAN_USER_PARAMETERS)}
 """
+
+# Fused modes: chords and rhythm (and the plan) in one answer -----------------------------------
+
+FUSED_CHORDS_RHYTHM_OUTPUT_FORMAT = {
+    "music_chords": CHORD_OUTPUT_FORMAT,
+    "music_rhythm": RHYTHM_OUTPUT_FORMAT,
+}
+
+FUSED_RHYTHM_INSTRUCTIONS = """Write `music_chords` first: only the harmonic backbone of every section.
+Then write `music_rhythm`: expand those chords into rhythmic and expressive detail for ALL sections.
+Reference specific pitches from chords and motifs. Include basic patterns for percussion (e.g., kick on beat 1, snare on 2+4).
+Ensure details are sufficient for direct note event creation without further inference—include pitches, durations, and velocities where possible.
+Use the same section names and bar counts in both."""
+
+DEFINE_FUSED_CHORDS_RHYTHM_PROMPT = f"""
+You are a music arranger.
+Given the outline below, output its chords and rhythm in one compact JSON.
+{FUSED_RHYTHM_INSTRUCTIONS}
+
+Output format:
+---------------
+{str(FUSED_CHORDS_RHYTHM_OUTPUT_FORMAT)}
+---------------
+
+Outline:
+{MUSIC_PLAN_INPUT}
+
+User specified parameters:
+{str(MUSIC_PLAN_USER_PARAMETERS)}
+"""
+
+FUSED_MUSIC_PLAN_OUTPUT_FORMAT = {
+    "music_plan": MUSIC_PLAN_OUTPUT_FORMAT,
+    **FUSED_CHORDS_RHYTHM_OUTPUT_FORMAT,
+}
+
+DEFINE_FUSED_MUSIC_PLAN_PROMPT = f"""
+You are a music composer and arranger planning a piece before writing notes.
+Given a text description (e.g., "retro 8-bit battle theme"), output in one compact JSON:
+Write `music_plan` first: a structured outline of the music with concise but specific details.
+If user provide any specified parameters (e.g., tempo, key, duration, genre, mood, instruments, time signature),
+override defaults with these values.
+However, always ensure tempo is 60-200 BPM, duration fits the structure, and instruments match the genre.
+{FUSED_RHYTHM_INSTRUCTIONS} Follow the sections of `music_plan.structure`.
+
+Output format:
+----------------------
+{str(FUSED_MUSIC_PLAN_OUTPUT_FORMAT)}
+----------------------
+Do not generate notes or MIDI tokens yet.
+
+User input for music generic description:
+
+{MUSIC_PLAN_USER_DESCRIPTION}
+
+User input for specific parameters:
+
+{MUSIC_PLAN_USER_PARAMETERS}
+"""
+
+# Retry of a streamed answer whose first part was already passed on --------------------------------
+
+STREAMED_ANSWER_INPUT = """<Nothing was sent from the streamed answer>"""
+
+RESUME_STREAMED_ANSWER_PROMPT = f"""
+The first part of your answer was already sent and can no longer change. Start your answer with
+exactly this JSON, every field unchanged, then complete the rest:
+
+{STREAMED_ANSWER_INPUT}
+"""
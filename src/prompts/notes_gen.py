@@ -1,4 +1,5 @@
 # Step 4: Note Events Generation
+from ..schemas.note_events import COMPACT_DURATION_CODES
 
 NOTE_EVENTS_OUTPUT_FORMAT = {
     "channels": [
@@ -70,3 +71,31 @@ Music Plan:
 Rhythm Plan:
 {rhythm_input}
 """
+
+
+COMPACT_NOTE_EVENTS_OUTPUT_FORMAT = """melody|Intro|1: 1 D4 q 80; 2 F4 e 85; 2.5 A4 e 85
+bass|Intro|1: 1 D2 q 90; 2 r q 0"""
+
+
+def generate_compact_note_events_prompt(section_name: str, rhythm_input: str, music_plan_input: str):
+    return f"""
+You are a symbolic music generator.
+Given the music plan and rhythmic plan, output note events for all channels in the {section_name} section only, in the compact line format below.
+Include melody, bass, perc, and harmony channels.
+
+Write one line per channel and bar: channel|section|bar: followed by the events of that bar separated by ";".
+Each event is "beat pitch duration velocity" separated by spaces. Use r as the pitch of a rest.
+Duration codes: {', '.join(f'{code}={name}' for code, name in COMPACT_DURATION_CODES.items())}
+Output only these lines, no JSON and no commentary.
+
+Output format:
+----------------
+{COMPACT_NOTE_EVENTS_OUTPUT_FORMAT}
+----------------
+
+Music Plan:
+{music_plan_input}
+
+Rhythm Plan:
+{rhythm_input}
+"""
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from ..tracing import tracer
+
+router = APIRouter(prefix="/debug", tags=["Debug"])
+
+
+@router.get("/traces", response_class=PlainTextResponse)
+def list_slow_traces(
+        min_duration_ms: float = Query(default=1000, ge=0, description="Only traces at least this slow"),
+        limit: int = Query(default=10, ge=1, le=100, description="Number of traces"),
+):
+    """
+    Text waterfalls of the slowest recent requests and jobs, slowest first.
+    """
+    traces = tracer.recent(min_duration=min_duration_ms / 1000, limit=limit)
+    if not traces:
+        return f"No traces slower than {min_duration_ms:g}ms among recent requests\n"
+    return "\n\n".join(trace.waterfall() for trace in traces) + "\n"
+
+
+@router.get("/traces/{trace_id}")
+def get_trace(trace_id: str):
+    """
+    All spans of a recent trace, e.g. from a response's X-Trace-Id header or a job id.
+    """
+    trace = tracer.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    return trace.to_dict()
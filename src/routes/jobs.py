@@ -0,0 +1,53 @@
+from fastapi import APIRouter, HTTPException, Request
+from typing import Optional
+from ..services import job_manager
+from ..services.jobs import JobQueueFullError
+from ..schemas.jobs import JobRequest, JobStatus, JobState
+from .responses import wants_midi, midi_response
+import base64
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.post("", status_code=202, response_model=JobStatus)
+def submit_job(request: JobRequest):
+    """
+    Queue a full description -> MIDI generation and return its job id immediately.
+    """
+    try:
+        return job_manager.submit(request)
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    """
+    Poll job state, current pipeline stage and per-section progress.
+    """
+    status = job_manager.get_status(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return status
+
+
+@router.get("/{job_id}/result")
+def get_job_result(job_id: str, request: Request, format: Optional[str] = None):
+    """
+    Fetch the generated MIDI of a completed job, as base64 JSON or as audio/midi when
+    requested with `Accept: audio/midi` or `?format=midi`.
+    """
+    status, midi_bytes = job_manager.get_status_and_result(job_id)
+    if not status:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if status.state != JobState.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {status.state.value}")
+    if midi_bytes is None:
+        raise HTTPException(status_code=404, detail=f"Result of job {job_id} is no longer available")
+
+    if wants_midi(request, format):
+        return midi_response(midi_bytes, f"{job_id}.mid")
+    return {
+        "description": status.description,
+        "midi_data": base64.b64encode(midi_bytes).decode('utf-8')
+    }
@@ -1,8 +1,15 @@
-from ..services import llm_service, music_plan_service, notes_gen_service
-from fastapi import Query
-from typing import Optional
-from ..schemas.music import MusicNotes
+from ..services import llm_service, music_plan_service, notes_gen_service, artifact_store, generation_pipeline
+from fastapi import Query, Request
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+from typing import Optional, List
+from ..config import app_settings
+from ..logger import app_logger
+from ..schemas.music import MusicNotes, NoteFormat, PlanMode
 from ..services.midi import json_to_midi_bytes
+from ..services.circuit_breaker import LlmError
+from .responses import wants_midi, midi_response, model_json_response, llm_error_payload
 
 def llm_health(model: Optional[str] = Query(default=None, description="LLM model to check")):
     """
@@ -12,7 +19,59 @@ def llm_health(model: Optional[str] = Query(default=None, description="LLM model
     """
     return llm_service.health_check(model=model)
 
-def create_music_plan(description: str, model: Optional[str] = None, kwargs: dict = None):
+def llm_pool_stats():
+    """
+    Connection reuse counters of the pooled LLM clients.
+    """
+    return {
+        "clients": len(llm_service.client_pool),
+        **llm_service.client_pool.stats.snapshot(),
+    }
+
+def llm_rate_limit_stats():
+    """
+    Admission counters of the outbound LLM rate limiter: calls in flight, queued and admitted,
+    and total seconds calls waited to be admitted.
+    """
+    if llm_service.rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_service.rate_limiter.snapshot()}
+
+def llm_model_health():
+    """
+    Circuit breaker state of every model called so far: closed (healthy), open (calls shed
+    until retry_in seconds pass) or half_open (one probe call allowed).
+    """
+    if llm_service.circuit_breakers is None:
+        return {"enabled": False}
+    return {"enabled": True, "models": llm_service.circuit_breakers.snapshot()}
+
+def llm_cache_stats():
+    """
+    Hit/miss counters of the stage result cache, per stage.
+    """
+    if llm_service.cache is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "entries": len(llm_service.cache),
+        **llm_service.cache.stats.snapshot(),
+    }
+
+def llm_coalescing_stats():
+    """
+    Counters of in-flight LLM call coalescing: calls run, and calls that got the result of an
+    identical call already in flight instead.
+    """
+    if llm_service.single_flight is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "in_flight": len(llm_service.single_flight),
+        **llm_service.single_flight.stats.snapshot(),
+    }
+
+async def create_music_plan(description: str, model: Optional[str] = None, kwargs: dict = None):
     """
     Create a music plan given a text description.
 
@@ -20,44 +79,68 @@ def create_music_plan(description: str, model: Optional[str] = None, kwargs: dic
     :param model: LLM model to use
     :param kwargs: Additional kwargs for LLM prompting
     """
-    return music_plan_service.generate_music_plan_given_description(
+    return model_json_response(await music_plan_service.generate_music_plan_given_description_async(
         description=description, model=model, kwargs=kwargs
-    )
+    ))
 
-def create_music_rhythm(description: str, model: Optional[str] = None, kwargs: dict = None):
+async def create_music_rhythm(
+        description: str, model: Optional[str] = None, kwargs: dict = None, plan_mode: Optional[PlanMode] = None
+):
     """
     Create music rhythm given music chords.
 
     :param description: Text description of the music piece
     :param model: LLM model to use
     :param kwargs: Additional kwargs for LLM prompting
+    :param plan_mode: LLM calls for plan, chords and rhythm: staged (3), fused (2) or fast (1) (PLAN_MODE if omitted)
     """
-    music_plan, rhythm_response = music_plan_service.generate_music_rhythm_given_description(
-        description=description, model=model, kwargs=kwargs
+    plan_result = await music_plan_service.generate_music_rhythm_given_description_async(
+        description=description, model=model, kwargs=kwargs, plan_mode=plan_mode
+    )
+    if not plan_result:
+        return None
+    music_plan, rhythm_response = plan_result
+    return model_json_response(rhythm_response)
+
+async def _generate_music_notes(
+        description: str,
+        model: Optional[str],
+        kwargs: Optional[dict],
+        run_id: str,
+        note_format: Optional[NoteFormat] = None,
+        plan_mode: Optional[PlanMode] = None
+) -> Optional[MusicNotes]:
+    # Plan, chords and rhythm, with each section's notes starting as soon as its rhythm is written
+    return await generation_pipeline.generate_music_notes_async(
+        description=description, model=model, kwargs=kwargs, run_id=run_id, note_format=note_format,
+        plan_mode=plan_mode
     )
-    return rhythm_response
 
-def create_music_notes(description: str, model: Optional[str] = None, kwargs: dict = None):
+async def create_music_notes(
+        description: str,
+        model: Optional[str] = None,
+        kwargs: dict = None,
+        note_format: Optional[NoteFormat] = None,
+        plan_mode: Optional[PlanMode] = None
+):
     """
     Create music notes given description (generates full plan first).
 
     :param description: Text description of the music piece
     :param model: LLM model to use
     :param kwargs: Additional kwargs for LLM prompting
+    :param note_format: Wire format the LLM writes notes in, json or compact (NOTES_FORMAT if omitted)
+    :param plan_mode: LLM calls for plan, chords and rhythm: staged (3), fused (2) or fast (1) (PLAN_MODE if omitted)
     """
-    # First generate the full plan
-    music_plan, rhythm_response = music_plan_service.generate_music_rhythm_given_description(
-        description=description, model=model, kwargs=kwargs
-    )
-    if not rhythm_response:
-        return None
-
-    return notes_gen_service.generate_all_channel_notes(
-        music_plan=music_plan, music_rhythm=rhythm_response, model=model, kwargs=kwargs
+    return model_json_response(
+        await _generate_music_notes(description, model, kwargs, artifact_store.new_run_id(), note_format, plan_mode)
     )
 
-def create_music_notes_with_cache(
-        model: Optional[str] = None, kwargs: dict = None
+async def create_music_notes_with_cache(
+        model: Optional[str] = None,
+        kwargs: dict = None,
+        run_id: Optional[str] = None,
+        note_format: Optional[NoteFormat] = None
 ):
     """
     Create music notes given description (generates full plan first).
@@ -67,26 +150,35 @@ def create_music_notes_with_cache(
     :param description: Text description of the music piece
     :param model: LLM model to use
     :param kwargs: Additional kwargs for LLM prompting
+    :param run_id: Reuse the music plan recorded by this run instead of music_plan.json
+    :param note_format: Wire format the LLM writes notes in, json or compact (NOTES_FORMAT if omitted)
     """
-    import json
     from ..schemas.music import MusicPlanResponse
-    with open("music_plan.json", "r") as f:
-        music_plan_full_content: dict = json.load(f)
+    if run_id:
+        music_plan_full_content = artifact_store.load(run_id, "music_plan")
+        if not music_plan_full_content:
+            return {"error": f"No music plan recorded for run {run_id}"}
+    else:
+        with open("music_plan.json", "r") as f:
+            music_plan_full_content: dict = json.load(f)
     music_plan_response: MusicPlanResponse = MusicPlanResponse.model_validate(music_plan_full_content)
 
-    return notes_gen_service.generate_all_channel_notes(
+    return model_json_response(await notes_gen_service.generate_all_channel_notes_async(
         music_plan=music_plan_response.music_plan,
         music_rhythm=music_plan_response.music_rhythm,
-        model=model, kwargs=kwargs
-    )
+        model=model, kwargs=kwargs, note_format=note_format
+    ))
 
-def generate_midi_from_cache(model: Optional[str] = None, kwargs: dict = None):
+def generate_midi_from_cache(
+        request: Request, model: Optional[str] = None, kwargs: dict = None, format: Optional[str] = None
+):
     """
     Generate MIDI using cached music_notes.json.
     Only used for testing the MIDI generation part.
 
     :param model: LLM model to use (not used here)
     :param kwargs: Additional kwargs (not used here)
+    :param format: `midi` for a binary audio/midi response (same as `Accept: audio/midi`)
     """
     import json
     import base64
@@ -96,10 +188,20 @@ def generate_midi_from_cache(model: Optional[str] = None, kwargs: dict = None):
     music_notes = MusicNotes.model_validate(music_notes_dict)
 
     midi_bytes = json_to_midi_bytes(music_notes)
+    if wants_midi(request, format):
+        return midi_response(midi_bytes, "music_notes.mid")
     midi_b64 = base64.b64encode(midi_bytes).decode('utf-8')
     return {"midi_data": midi_b64}
 
-def generate_midi_from_description(description: str, model: Optional[str] = None, kwargs: dict = None):
+async def generate_midi_from_description(
+        request: Request,
+        description: str,
+        model: Optional[str] = None,
+        kwargs: dict = None,
+        format: Optional[str] = None,
+        note_format: Optional[NoteFormat] = None,
+        plan_mode: Optional[PlanMode] = None
+):
     """
     Final endpoint: Generate music notes from description and generate MIDI.
     Pierces through all components: plan -> rhythm -> notes -> MIDI.
@@ -107,16 +209,170 @@ def generate_midi_from_description(description: str, model: Optional[str] = None
     :param description: Text description of the music piece
     :param model: LLM model to use
     :param kwargs: Additional kwargs for LLM prompting
+    :param format: `midi` for a binary audio/midi response (same as `Accept: audio/midi`)
+    :param note_format: Wire format the LLM writes notes in, json or compact (NOTES_FORMAT if omitted)
+    :param plan_mode: LLM calls for plan, chords and rhythm: staged (3), fused (2) or fast (1) (PLAN_MODE if omitted)
     """
     import base64
 
-    music_notes = create_music_notes(description, model, kwargs)
+    run_id = artifact_store.new_run_id()
+    music_notes = await _generate_music_notes(description, model, kwargs, run_id, note_format, plan_mode)
     if not music_notes:
         return {"error": "Failed to generate music notes"}
 
-    midi_bytes = json_to_midi_bytes(music_notes)
+    # MIDI encoding is CPU bound; keep it off the event loop
+    midi_bytes = await asyncio.to_thread(json_to_midi_bytes, music_notes)
+    if wants_midi(request, format):
+        return midi_response(midi_bytes, f"{run_id}.mid", headers={"X-Run-Id": run_id})
     midi_b64 = base64.b64encode(midi_bytes).decode('utf-8')
     return {
         "description": description,
+        "run_id": run_id,
         "midi_data": midi_b64
         }
+
+async def generate_midi_variations(
+        description: str,
+        n: int = Query(default=3, ge=1, description="Number of variations"),
+        model: Optional[str] = None,
+        kwargs: dict = None,
+        seed: Optional[int] = Query(default=None, description="Seed of the first variation; the rest use seed + i"),
+        temperatures: Optional[List[float]] = Query(default=None, description="Temperatures cycled across variations"),
+        note_format: Optional[NoteFormat] = None,
+        plan_mode: Optional[PlanMode] = None,
+):
+    """
+    Generate several MIDI takes of one description.
+    Plan, chords and rhythm are generated once and shared; only the notes stage runs per variation,
+    with every section call of every variation under one concurrency budget.
+
+    :param description: Text description of the music piece
+    :param n: Number of variations, at most VARIATIONS_MAX
+    :param model: LLM model to use
+    :param kwargs: Additional kwargs for LLM prompting
+    :param seed: Seed of the first variation
+    :param temperatures: Sampling temperatures, cycled across variations
+    :param note_format: Wire format the LLM writes notes in, json or compact (NOTES_FORMAT if omitted)
+    :param plan_mode: LLM calls for plan, chords and rhythm: staged (3), fused (2) or fast (1) (PLAN_MODE if omitted)
+    """
+    import base64
+
+    if n > app_settings.variations_max:
+        return {"error": f"At most {app_settings.variations_max} variations can be requested"}
+
+    run_id = artifact_store.new_run_id()
+    plan_result = await music_plan_service.generate_music_rhythm_given_description_async(
+        description=description, model=model, kwargs=kwargs, run_id=run_id, plan_mode=plan_mode
+    )
+    if not plan_result or not plan_result[1]:
+        return {"error": "Failed to generate music rhythm"}
+    music_plan, music_rhythm = plan_result
+
+    variation_kwargs = notes_gen_service.variation_kwargs(kwargs, n, seed, temperatures)
+    variations_notes = await notes_gen_service.generate_variations_async(
+        music_plan=music_plan,
+        music_rhythm=music_rhythm,
+        variation_kwargs=variation_kwargs,
+        model=model,
+        max_concurrency=app_settings.variations_max_concurrency,
+        run_id=run_id,
+        note_format=note_format,
+    )
+    if not any(variations_notes):
+        return {"error": "Failed to generate music notes"}
+
+    variations = []
+    for index, (variation, music_notes) in enumerate(zip(variation_kwargs, variations_notes)):
+        result = {"index": index, "seed": variation["seed"], "temperature": variation.get("temperature")}
+        if music_notes:
+            midi_bytes = await asyncio.to_thread(json_to_midi_bytes, music_notes)
+            result["midi_data"] = base64.b64encode(midi_bytes).decode('utf-8')
+        else:
+            result["error"] = "Failed to generate music notes"
+        variations.append(result)
+    return {"description": description, "run_id": run_id, "variations": variations}
+
+def _sse_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def stream_midi_from_description(
+        description: str,
+        model: Optional[str] = None,
+        kwargs: dict = None,
+        note_format: Optional[NoteFormat] = None,
+        plan_mode: Optional[PlanMode] = None
+):
+    """
+    Server-sent events version of generate_midi_from_description.
+    Emits `plan` (music plan and rhythm), then one `section` event per section as soon as it is
+    generated, then `midi` with the assembled MIDI. Failures are sent as `error` events, with the
+    LLM error `kind` and `retry_after` when the plan stages fail.
+
+    :param description: Text description of the music piece
+    :param model: LLM model to use
+    :param kwargs: Additional kwargs for LLM prompting
+    :param note_format: Wire format the LLM writes notes in, json or compact (NOTES_FORMAT if omitted)
+    :param plan_mode: LLM calls for plan, chords and rhythm: staged (3), fused (2) or fast (1) (PLAN_MODE if omitted)
+    """
+    import base64
+
+    run_id = artifact_store.new_run_id()
+
+    async def event_stream():
+        section_results = {}
+        music_rhythm = None
+        try:
+            async for event, payload in generation_pipeline.iter_events_async(
+                description=description, model=model, kwargs=kwargs, run_id=run_id, note_format=note_format,
+                plan_mode=plan_mode
+            ):
+                if event == "rhythm":
+                    music_plan, music_rhythm = payload
+                    yield _sse_event(
+                        "plan",
+                        f'{{"run_id": "{run_id}", "music_plan": {music_plan.model_dump_json()}, '
+                        f'"music_rhythm": {music_rhythm.model_dump_json()}}}'
+                    )
+                    continue
+                index, section_name, section_result = payload
+                section_results[index] = section_result
+                if section_result:
+                    yield _sse_event(
+                        "section",
+                        f'{{"section": {json.dumps(section_name)}, "notes": {section_result.model_dump_json()}}}'
+                    )
+                else:
+                    yield _sse_event(
+                        "error",
+                        json.dumps({"section": section_name, "error": "Failed to generate section notes"})
+                    )
+
+            if music_rhythm is None:
+                yield _sse_event("error", json.dumps({"error": "Failed to generate music rhythm"}))
+                return
+            music_notes = notes_gen_service.collect_music_notes(
+                [section_results.get(index) for index in range(len(music_rhythm.sections))], music_rhythm
+            )
+            if not music_notes:
+                yield _sse_event("error", json.dumps({"error": "Failed to generate music notes"}))
+                return
+            notes_gen_service.save_music_notes(music_notes, run_id)
+
+            midi_bytes = await asyncio.to_thread(json_to_midi_bytes, music_notes)
+            yield _sse_event("midi", json.dumps({
+                "description": description,
+                "midi_data": base64.b64encode(midi_bytes).decode('utf-8')
+            }))
+        except LlmError as e:
+            yield _sse_event("error", json.dumps(llm_error_payload(e)))
+        except Exception as e:
+            # The response has started; failures can only reach the client as an event
+            app_logger.error(f"Streamed generation {run_id} failed: {e}")
+            yield _sse_event("error", json.dumps({"error": "Failed to generate music"}))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Disable nginx response buffering so events reach the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
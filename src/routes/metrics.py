@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from ..metrics import metrics_registry
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Stage latency, LLM token usage, retries and in-flight gauges in the Prometheus text format.
+    """
+    return Response(content=metrics_registry.render(), media_type=metrics_registry.content_type)
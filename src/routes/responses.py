@@ -0,0 +1,67 @@
+from typing import Optional
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from ..services.circuit_breaker import LlmError, LlmErrorKind
+
+MIDI_MEDIA_TYPE = "audio/midi"
+
+
+def wants_midi(request: Request, format: Optional[str] = None) -> bool:
+    """
+    Whether the client asked for raw MIDI instead of base64-in-JSON.
+
+    :param request: Incoming request; `Accept: audio/midi` selects MIDI
+    :param format: Explicit `?format=midi` override for clients that cannot set headers
+    """
+    if format:
+        return format.lower() == "midi"
+    return MIDI_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def midi_response(midi_bytes: bytes, filename: str, headers: Optional[dict] = None) -> Response:
+    """
+    Binary `audio/midi` response, downloaded as `filename`.
+    """
+    return Response(
+        content=midi_bytes,
+        media_type=MIDI_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', **(headers or {})},
+    )
+
+
+def model_json_response(model: Optional[BaseModel]) -> Response:
+    """
+    Serialize a model straight to JSON with pydantic-core, skipping FastAPI's
+    jsonable_encoder + json.dumps round trip, which dominates for large MusicNotes.
+    """
+    content = model.model_dump_json() if model is not None else "null"
+    return Response(content=content, media_type="application/json")
+
+
+_LLM_ERROR_STATUS = {
+    LlmErrorKind.RATE_LIMITED: 429,
+    LlmErrorKind.CIRCUIT_OPEN: 503,
+    LlmErrorKind.UNAVAILABLE: 503,
+    LlmErrorKind.TIMEOUT: 504,
+}
+
+
+def llm_error_payload(error: LlmError) -> dict:
+    return {
+        "error": error.message,
+        "kind": error.kind.value,
+        "model": error.model,
+        "retry_after": error.retry_after,
+    }
+
+
+async def llm_error_response(request: Request, error: LlmError) -> Response:
+    """
+    Exception handler telling the client why an LLM stage failed; 429/503/504 responses
+    carry Retry-After when the model's backoff is known, other failures are 502.
+    """
+    headers = {"Retry-After": str(max(int(error.retry_after + 0.999), 1))} if error.retry_after else None
+    return JSONResponse(
+        llm_error_payload(error), status_code=_LLM_ERROR_STATUS.get(error.kind, 502), headers=headers
+    )
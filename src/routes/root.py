@@ -1,7 +1,15 @@
 from fastapi import APIRouter
 from .llm import *
+from .jobs import router as jobs_router
+from .runs import router as runs_router
+from .metrics import router as metrics_router
+from .debug import router as debug_router
 
 router = APIRouter()
+router.include_router(jobs_router)
+router.include_router(runs_router)
+router.include_router(metrics_router)
+router.include_router(debug_router)
 
 @router.get("/")
 def read_root():
@@ -13,12 +21,19 @@ def health_check():
 
 for r in [
     llm_health,
+    llm_pool_stats,
+    llm_model_health,
+    llm_rate_limit_stats,
+    llm_cache_stats,
+    llm_coalescing_stats,
     create_music_plan,
     create_music_rhythm,
     create_music_notes,
     create_music_notes_with_cache,
     generate_midi_from_cache,
-    generate_midi_from_description
+    generate_midi_from_description,
+    generate_midi_variations,
+    stream_midi_from_description
     ]:
     router.add_api_route(
         path="/" + r.__name__,
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException
+from ..services import artifact_store
+
+router = APIRouter(prefix="/runs", tags=["Runs"])
+
+
+@router.get("")
+def list_runs():
+    """
+    Run ids with recorded artifacts, newest first.
+    """
+    return {"runs": artifact_store.list_runs()}
+
+
+@router.get("/{run_id}")
+def list_run_artifacts(run_id: str):
+    """
+    Artifact names recorded for a run.
+    """
+    try:
+        artifacts = artifact_store.list_artifacts(run_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not artifacts:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+    return {"run_id": run_id, "artifacts": artifacts}
+
+
+@router.get("/{run_id}/{name}")
+def get_run_artifact(run_id: str, name: str):
+    """
+    Content of one artifact of a run, e.g. music_plan or music_notes.
+    """
+    try:
+        artifact = artifact_store.load(run_id, name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if artifact is None:
+        raise HTTPException(status_code=404, detail=f"Artifact {name} not found for run {run_id}")
+    return artifact
@@ -0,0 +1,45 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
+from enum import Enum
+from .music import NoteFormat, PlanMode
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class JobStage(str, Enum):
+    QUEUED = "queued"
+    PLAN = "plan"
+    CHORDS = "chords"
+    RHYTHM = "rhythm"
+    NOTES = "notes"
+    MIDI = "midi"
+    DONE = "done"
+
+
+class JobRequest(BaseModel):
+    description: str = Field(..., description="Text description of the music piece")
+    model: Optional[str] = Field(None, description="LLM model to use")
+    kwargs: Optional[Dict[str, Any]] = Field(None, description="Additional kwargs for LLM prompting")
+    note_format: Optional[NoteFormat] = Field(None, description="Wire format the LLM writes notes in, json or compact")
+    plan_mode: Optional[PlanMode] = Field(None, description="LLM calls for plan, chords and rhythm: staged, fused or fast")
+
+
+class JobProgress(BaseModel):
+    sections_total: int = Field(0, description="Number of sections to generate notes for")
+    sections_done: int = Field(0, description="Number of sections with notes generated")
+
+
+class JobStatus(BaseModel):
+    job_id: str = Field(..., description="Job identifier")
+    state: JobState = Field(..., description="Overall job state")
+    stage: JobStage = Field(..., description="Pipeline stage currently running")
+    progress: JobProgress = Field(default_factory=JobProgress, description="Per-section progress")
+    description: str = Field(..., description="Text description of the music piece")
+    created_at: float = Field(..., description="Unix timestamp when the job was submitted")
+    updated_at: float = Field(..., description="Unix timestamp of the last status change")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
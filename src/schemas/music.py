@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional
+from enum import Enum
+from .note_events import NoteEvents
 
 
 # Models for Music Plan Service
@@ -83,10 +85,33 @@ class MusicRhythm(BaseModel):
     sections: List[RhythmSection] = Field(..., description="Rhythm sections")
 
 
+# Models for the fused plan modes, several stages answered by one LLM call
+class PlanMode(str, Enum):
+    STAGED = "staged"  # plan, chords and rhythm in three sequential calls
+    FUSED = "fused"  # plan, then chords and rhythm in one call
+    FAST = "fast"  # plan, chords and rhythm in one call
+
+
+class MusicChordsRhythm(BaseModel):
+    music_chords: MusicChords = Field(..., description="Chord progression plan")
+    music_rhythm: MusicRhythm = Field(..., description="Rhythm and arrangement plan, expanding the chords")
+
+
+class MusicPlanChordsRhythm(BaseModel):
+    music_plan: MusicPlan = Field(..., description="Detailed music plan")
+    music_chords: MusicChords = Field(..., description="Chord progression plan, following the plan structure")
+    music_rhythm: MusicRhythm = Field(..., description="Rhythm and arrangement plan, expanding the chords")
+
+
 # Models for Notes Generation Service
+class NoteFormat(str, Enum):
+    JSON = "json"  # nested SectionChannelsResponse JSON
+    COMPACT = "compact"  # one `channel|section|bar: beat pitch duration velocity; ...` line per bar
+
+
 class BarNotes(BaseModel):
     bar: int = Field(..., description="Bar number")
-    events: List[List[Union[float, str, str, int]]] = Field(..., description="List of note events in this bar, each as [beat, pitch, duration, velocity]")
+    events: NoteEvents = Field(..., description="List of note events in this bar, each as [beat, pitch, duration, velocity]")
 
 
 class SectionNotes(BaseModel):
@@ -0,0 +1,458 @@
+from array import array
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+from pydantic import GetCoreSchemaHandler, GetJsonSchemaHandler
+from pydantic_core import core_schema
+
+TICKS_PER_BEAT = 480  # Standard MIDI ticks per beat
+
+# Pitch to MIDI note mapping
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+LETTER_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+ACCIDENTALS = {'': 0, '#': 1, '##': 2, 'x': 2, '\u266f': 1, 'b': -1, 'bb': -2, '\u266d': -1}
+OCTAVES = range(-1, 10)  # C-1 = 0 .. G9 = 127
+
+# Percussion mapping (MIDI note numbers for GM percussion)
+PERCUSSION_MAP = {
+    'acoustic_bass_drum': 35,
+    'kick': 36,    # Bass Drum 1
+    'side_stick': 37,
+    'snare': 38,   # Acoustic Snare
+    'hand_clap': 39,
+    'electric_snare': 40,
+    'low_floor_tom': 41,
+    'hihat': 42,   # Closed Hi-Hat
+    'high_floor_tom': 43,
+    'pedal_hihat': 44,
+    'low_tom': 45,
+    'open_hihat': 46,
+    'low_mid_tom': 47,
+    'hi_mid_tom': 48,
+    'crash': 49,   # Crash Cymbal 1
+    'high_tom': 50,
+    'ride': 51,    # Ride Cymbal 1
+    'chinese_cymbal': 52,
+    'ride_bell': 53,
+    'tambourine': 54,
+    'splash_cymbal': 55,
+    'cowbell': 56,
+    'crash_cymbal_2': 57,
+    'vibraslap': 58,
+    'ride_cymbal_2': 59,
+    'hi_bongo': 60,
+    'low_bongo': 61,
+    'mute_hi_conga': 62,
+    'open_hi_conga': 63,
+    'low_conga': 64,
+    'high_timbale': 65,
+    'low_timbale': 66,
+    'high_agogo': 67,
+    'low_agogo': 68,
+    'cabasa': 69,
+    'maracas': 70,
+    'short_whistle': 71,
+    'long_whistle': 72,
+    'short_guiro': 73,
+    'long_guiro': 74,
+    'claves': 75,
+    'hi_wood_block': 76,
+    'low_wood_block': 77,
+    'mute_cuica': 78,
+    'open_cuica': 79,
+    'mute_triangle': 80,
+    'open_triangle': 81,
+    # Aliases
+    'bass_drum': 36,
+    'bass_drum_1': 36,
+    'bd': 36,
+    'rimshot': 37,
+    'rim': 37,
+    'acoustic_snare': 38,
+    'sd': 38,
+    'clap': 39,
+    'hi_hat': 42,
+    'hat': 42,
+    'hh': 42,
+    'closed_hat': 42,
+    'closed_hihat': 42,
+    'closed_hi_hat': 42,
+    'pedal_hat': 44,
+    'open_hat': 46,
+    'open_hi_hat': 46,
+    'crash_cymbal': 49,
+    'crash_cymbal_1': 49,
+    'ride_cymbal': 51,
+    'ride_cymbal_1': 51,
+    'china': 52,
+    'splash': 55,
+    'shaker': 70,
+    'conga': 63,
+    'bongo': 60,
+    'woodblock': 76,
+    'triangle': 81,
+    'floor_tom': 41,
+    'mid_tom': 47,
+    'tom1': 41,    # Low Floor Tom
+    'tom2': 43,    # High Floor Tom
+    'tom3': 45,    # Low Tom
+    'tom4': 47,    # Low-Mid Tom
+    'tom5': 48,    # Hi-Mid Tom
+    'tom6': 50,    # High Tom
+}
+DEFAULT_PERCUSSION_PITCH = PERCUSSION_MAP['kick']
+
+# Duration in beats, assuming 4/4 time with quarter note = 1 beat
+DURATION_BEATS = {
+    'whole': 4,
+    'dotted_whole': 6,
+    'half': 2,
+    'dotted_half': 3,
+    'quarter': 1,
+    'dotted_quarter': 1.5,
+    'eighth': 0.5,
+    'dotted_eighth': 0.75,
+    'sixteenth': 0.25,
+    'dotted_sixteenth': 0.375,
+    'thirty-second': 0.125,
+    # Aliases, parsed but never emitted
+    '8th': 0.5,
+    'dotted_8th': 0.75,
+    '16th': 0.25,
+    'dotted_16th': 0.375,
+    '32nd': 0.125,
+}
+
+# Duration codes of the compact notes format; a trailing '.' dots the note
+COMPACT_DURATION_CODES = {
+    'w': 'whole',
+    'w.': 'dotted_whole',
+    'h': 'half',
+    'h.': 'dotted_half',
+    'q': 'quarter',
+    'q.': 'dotted_quarter',
+    'e': 'eighth',
+    'e.': 'dotted_eighth',
+    's': 'sixteenth',
+    's.': 'dotted_sixteenth',
+    't': 'thirty-second',
+}
+# Pitch of a rest in the compact notes format
+COMPACT_REST = 'r'
+
+# Pitch code of a rest, and of a pitch token nothing in the tables matches; never valid MIDI notes
+REST_PITCH = 0xFF
+UNKNOWN_PITCH = 0xFE
+
+
+def _separator_variants(name: str) -> List[str]:
+    """'dotted_quarter' -> dotted_quarter, dotted-quarter, dotted quarter, dottedquarter."""
+    base = _normalize_token(name)
+    return [name, base, base.replace('_', '-'), base.replace('_', ' '), base.replace('_', '')]
+
+
+def _normalize_token(token: str) -> str:
+    return token.strip().lower().replace('-', '_').replace(' ', '_')
+
+
+def _build_pitch_codes() -> Dict[Any, int]:
+    codes: Dict[Any, int] = {midi_note: midi_note for midi_note in range(128)}
+    for letter, semitone in LETTER_SEMITONES.items():
+        for accidental, shift in ACCIDENTALS.items():
+            for octave in OCTAVES:
+                # The octave number belongs to the letter, so B#3 is C4 and Cb4 is B3
+                midi_note = (octave + 1) * 12 + semitone + shift
+                if 0 <= midi_note <= 127:
+                    codes[f"{letter}{accidental}{octave}"] = midi_note
+                    codes[f"{letter.lower()}{accidental}{octave}"] = midi_note
+    for name, midi_note in PERCUSSION_MAP.items():
+        for variant in _separator_variants(name):
+            codes[variant] = midi_note
+    codes['rest'] = REST_PITCH
+    return codes
+
+
+def _build_duration_ticks() -> Dict[str, int]:
+    durations = {}
+    for name, beats in DURATION_BEATS.items():
+        for variant in _separator_variants(name):
+            durations.setdefault(variant, int(beats * TICKS_PER_BEAT))
+    return durations
+
+
+# Every legal pitch spelling, percussion name and duration token, so parsing is one dict lookup per event
+PITCH_CODES = _build_pitch_codes()
+DURATION_TICKS = _build_duration_ticks()
+# Canonical name per tick count; the first spelling listed above wins
+DURATION_NAMES = {int(beats * TICKS_PER_BEAT): name for name, beats in reversed(DURATION_BEATS.items())}
+
+# Spelling id of an event without a recorded spelling, serialized from its resolved value
+NO_SPELLING = 0xFFFF
+
+
+class Spellings:
+    """
+    Tokens numbered in first-seen order with the value each resolves to, so an event keeps the
+    token its pitch or duration was written with ('Eb4' rather than 'D#4' or 63, 'bd' rather
+    than 'kick') in two bytes, and parsing resolves both with one lookup. Seeded with every
+    spelling of a table; tokens only the slow path resolves (odd casing, separators) are added
+    as they are first seen, up to NO_SPELLING of them.
+    """
+
+    def __init__(self, table: Dict[Any, int]):
+        self.tokens: List[Any] = list(table)
+        self.values: List[int] = list(table.values())
+        self.ids: Dict[Any, int] = {token: index for index, token in enumerate(self.tokens)}
+        self._lock = threading.Lock()
+
+    def id(self, token: Any, value: int) -> int:
+        spelling = self.ids.get(token)
+        if spelling is not None:
+            return spelling
+        with self._lock:
+            spelling = self.ids.get(token)
+            if spelling is None:
+                if len(self.tokens) >= NO_SPELLING:
+                    return NO_SPELLING
+                # Listed before it is looked up, for readers outside the lock
+                self.tokens.append(token)
+                self.values.append(value)
+                spelling = self.ids[token] = len(self.tokens) - 1
+            return spelling
+
+
+PITCH_SPELLINGS = Spellings(PITCH_CODES)
+DURATION_SPELLINGS = Spellings(DURATION_TICKS)
+
+
+def pitch_code(token: Union[int, str]) -> int:
+    """
+    Pitch code of a raw event pitch: a MIDI note number, REST_PITCH for a rest or
+    UNKNOWN_PITCH for a string no table matches.
+
+    :raises ValueError: if the pitch is neither a string nor a MIDI note number in 0..127
+    """
+    code = PITCH_CODES.get(token)
+    if code is not None:
+        return code
+    if isinstance(token, str):
+        # Slow path for odd casing and separators, e.g. 'Closed Hat'
+        return PITCH_CODES.get(_normalize_token(token), UNKNOWN_PITCH)
+    raise ValueError(f"pitch must be a note name or a MIDI note number in 0..127, got {token!r}")
+
+
+def duration_ticks(token: str) -> int:
+    """
+    Ticks of a duration token.
+
+    :raises ValueError: if the duration is unknown
+    """
+    ticks = DURATION_TICKS.get(token) if isinstance(token, str) else None
+    if ticks is None and isinstance(token, str):
+        ticks = DURATION_TICKS.get(_normalize_token(token))
+    if ticks is None:
+        raise ValueError(f"unknown duration {token!r}, expected one of {', '.join(DURATION_NAMES.values())}")
+    return ticks
+
+
+class NoteEvent(NamedTuple):
+    beat: float
+    pitch: int  # MIDI note number, REST_PITCH or UNKNOWN_PITCH
+    duration: int  # ticks
+    velocity: int
+
+
+class NoteEvents:
+    """
+    Note events of one bar stored as parallel typed arrays.
+
+    Columns are beat (float32), pitch (uint8, REST_PITCH for rests), duration in ticks
+    (uint32) and velocity (uint8), plus the spelling ids (uint16, see Spellings) of the pitch
+    and duration tokens they were parsed from. Validated from and serialized to the
+    `[beat, pitch, duration, velocity]` lists the LLM produces, with pitches and durations
+    spelled as they came in, so the JSON schema and wire format stay the same while each event
+    takes 14 bytes instead of a list of objects. Pitch strings no table knows are stored as
+    UNKNOWN_PITCH and kept in `unknown_pitches` (event index -> token) so they can be reported
+    and serialized back unchanged.
+    """
+
+    __slots__ = (
+        'beats', 'pitches', 'durations', 'velocities', 'pitch_spellings', 'duration_spellings', 'unknown_pitches'
+    )
+
+    def __init__(
+            self,
+            beats: array = None,
+            pitches: array = None,
+            durations: array = None,
+            velocities: array = None,
+            unknown_pitches: Optional[Dict[int, str]] = None,
+            pitch_spellings: array = None,
+            duration_spellings: array = None
+    ):
+        self.beats = beats if beats is not None else array('f')
+        self.pitches = pitches if pitches is not None else array('B')
+        self.durations = durations if durations is not None else array('I')
+        self.velocities = velocities if velocities is not None else array('B')
+        self.unknown_pitches = unknown_pitches
+        self.pitch_spellings = pitch_spellings if pitch_spellings is not None else array('H', [NO_SPELLING]) * len(self.beats)
+        self.duration_spellings = (
+            duration_spellings if duration_spellings is not None else array('H', [NO_SPELLING]) * len(self.beats)
+        )
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any]) -> "NoteEvents":
+        """
+        Parse raw `[beat, pitch, duration, velocity]` events.
+
+        :raises ValueError: naming the first invalid event
+        """
+        events = list(events)
+        try:
+            return cls._from_events_fast(events)
+        except (TypeError, ValueError, KeyError, OverflowError):
+            # Slow path only to report exactly which event is wrong
+            return cls._from_events_checked(events)
+
+    @classmethod
+    def _from_events_fast(cls, events: List[Any]) -> "NoteEvents":
+        if not events:
+            return cls()
+        if any(len(event) != 4 for event in events):
+            raise ValueError("malformed event")
+        beats, pitches, durations, velocities = zip(*events)
+        unknown_pitches = None
+        try:
+            # Spelling ids, then codes by id: one hash lookup per token
+            pitch_spellings = array('H', map(PITCH_SPELLINGS.ids.__getitem__, pitches))
+            pitch_codes = array('B', map(PITCH_SPELLINGS.values.__getitem__, pitch_spellings))
+        except KeyError:
+            pitch_codes = array('B', map(pitch_code, pitches))
+            pitch_spellings = array('H', [
+                NO_SPELLING if code == UNKNOWN_PITCH else PITCH_SPELLINGS.id(pitch, code)
+                for pitch, code in zip(pitches, pitch_codes)
+            ])
+            unknown_pitches = {
+                index: pitches[index] for index, code in enumerate(pitch_codes) if code == UNKNOWN_PITCH
+            } or None
+        duration_spellings = array('H', map(DURATION_SPELLINGS.ids.__getitem__, durations))
+        velocity_column = array('B', velocities)
+        if max(velocity_column) > 127:
+            raise ValueError("invalid velocity")
+        return cls(
+            array('f', beats),
+            pitch_codes,
+            array('I', map(DURATION_SPELLINGS.values.__getitem__, duration_spellings)),
+            velocity_column,
+            unknown_pitches,
+            pitch_spellings,
+            duration_spellings,
+        )
+
+    @classmethod
+    def _from_events_checked(cls, events: List[Any]) -> "NoteEvents":
+        note_events = cls()
+        for index, event in enumerate(events):
+            if not isinstance(event, (list, tuple)) or len(event) != 4:
+                raise ValueError(f"event {index} must be [beat, pitch, duration, velocity], got {event!r}")
+            beat, pitch, duration, velocity = event
+            if isinstance(beat, bool) or not isinstance(beat, (int, float)):
+                raise ValueError(f"event {index}: beat must be a number, got {beat!r}")
+            try:
+                code = pitch_code(pitch)
+                ticks = duration_ticks(duration)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"event {index}: {e}")
+            if type(velocity) is not int or not 0 <= velocity <= 127:
+                raise ValueError(f"event {index}: velocity must be an int in 0..127, got {velocity!r}")
+            if code == UNKNOWN_PITCH:
+                if note_events.unknown_pitches is None:
+                    note_events.unknown_pitches = {}
+                note_events.unknown_pitches[index] = pitch
+                pitch = None
+            note_events.append(beat, code, ticks, velocity, pitch, duration)
+        return note_events
+
+    def append(
+            self, beat: float, pitch: int, duration: int, velocity: int,
+            pitch_token: Any = None, duration_token: Optional[str] = None
+    ):
+        """
+        Append an already resolved event (pitch code, duration in ticks), with the tokens it was
+        written with if they are to be serialized back as such.
+        """
+        self.beats.append(beat)
+        self.pitches.append(pitch)
+        self.durations.append(duration)
+        self.velocities.append(velocity)
+        self.pitch_spellings.append(NO_SPELLING if pitch_token is None else PITCH_SPELLINGS.id(pitch_token, pitch))
+        self.duration_spellings.append(
+            NO_SPELLING if duration_token is None else DURATION_SPELLINGS.id(duration_token, duration)
+        )
+
+    def __len__(self) -> int:
+        return len(self.beats)
+
+    def __iter__(self) -> Iterator[NoteEvent]:
+        return map(NoteEvent._make, zip(self.beats, self.pitches, self.durations, self.velocities))
+
+    def __getitem__(self, index: int) -> NoteEvent:
+        return NoteEvent(self.beats[index], self.pitches[index], self.durations[index], self.velocities[index])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, NoteEvents):
+            return NotImplemented
+        # Same notes, however they were spelled
+        return (self.beats == other.beats and self.pitches == other.pitches
+                and self.durations == other.durations and self.velocities == other.velocities
+                and self.unknown_pitches == other.unknown_pitches)
+
+    def __repr__(self) -> str:
+        return f"NoteEvents({self.to_list()!r})"
+
+    def to_list(self) -> List[list]:
+        """Serialize back to `[beat, pitch, duration, velocity]` lists, spelled as parsed."""
+        duration_names, pitch_tokens, duration_tokens = DURATION_NAMES, PITCH_SPELLINGS.tokens, DURATION_SPELLINGS.tokens
+        events = [
+            [
+                # Binary fractions like 2.5 are exact in float32; round the rest (1.333) back to what was parsed
+                round(beat, 6) if beat * 1024 % 1 else beat,
+                pitch_tokens[pitch_spelling] if pitch_spelling != NO_SPELLING else 'rest' if pitch == REST_PITCH else pitch,
+                duration_tokens[duration_spelling] if duration_spelling != NO_SPELLING else duration_names.get(duration, duration),
+                velocity,
+            ]
+            for beat, pitch, duration, velocity, pitch_spelling, duration_spelling in zip(
+                self.beats.tolist(), self.pitches.tolist(), self.durations.tolist(), self.velocities.tolist(),
+                self.pitch_spellings.tolist(), self.duration_spellings.tolist()
+            )
+        ]
+        if self.unknown_pitches:
+            for index, token in self.unknown_pitches.items():
+                events[index][1] = token
+        return events
+
+    @classmethod
+    def _validate(cls, value: Any) -> "NoteEvents":
+        if isinstance(value, NoteEvents):
+            return value
+        if not isinstance(value, (list, tuple)):
+            raise ValueError(f"events must be a list of [beat, pitch, duration, velocity], got {type(value).__name__}")
+        return cls.from_events(value)
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls._validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(cls.to_list),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, schema: core_schema.CoreSchema, handler: GetJsonSchemaHandler) -> Dict[str, Any]:
+        # Same schema the LLM has always been given for List[List[Union[float, str, int]]]
+        return {
+            "items": {
+                "items": {"anyOf": [{"type": "number"}, {"type": "string"}, {"type": "integer"}]},
+                "type": "array",
+            },
+            "type": "array",
+        }
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any, Union, Type
+from typing import Optional, List, Dict, Any, Union, Type, Callable
 
 
 class BasePromptMessages(BaseModel):
@@ -24,6 +24,7 @@ class CompletionKwargs(BaseModel):
     presence_penalty: Optional[float] = Field(
         None, description="Presence penalty")
     stop: Optional[List[str]] = Field(None, description="Stop sequences")
+    seed: Optional[int] = Field(None, description="Sampling seed, for providers that support it")
     extra_body: Optional[Dict] = Field(None, description="Extra params")
 
 
@@ -42,3 +43,7 @@ class PromptRequest(BaseModel):
         default_factory=CompletionKwargs, description="Optional extra kwargs for completion")
     response_format: Optional[Union[dict, Type[BaseModel]]] = Field(
         None, description="Response format as a Pydantic BaseModel class for structured output")
+    response_parser: Optional[Callable[[str], BaseModel]] = Field(
+        None, exclude=True,
+        description="Parses a plain-text completion into response_format instead of using JSON mode; "
+                    "raises ValueError on malformed text")
@@ -1,3 +1,6 @@
 from .llm import llm_service
+from .artifacts import artifact_store
 from .music_plan import music_plan_service
-from .notes_gen import notes_gen_service
\ No newline at end of file
+from .notes_gen import notes_gen_service
+from .pipeline import generation_pipeline
+from .jobs import job_manager
\ No newline at end of file
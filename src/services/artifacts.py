@@ -0,0 +1,134 @@
+from typing import List, Optional, Union
+import concurrent.futures
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pydantic import BaseModel
+from ..config import app_settings
+from ..logger import app_logger
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class ArtifactStore:
+    """
+    Run-scoped store of intermediate generation results.
+
+    Every run gets its own directory `<root_dir>/<run_id>/` holding one compact JSON file
+    per artifact (e.g. music_plan, music_notes). Writes are serialized on a single
+    background thread so they never block the request path, and only the newest
+    `max_runs` runs younger than `max_age_seconds` are retained.
+    """
+
+    def __init__(self, root_dir: str, max_runs: int = 200, max_age_seconds: float = 7 * 24 * 3600):
+        self.root_dir = root_dir
+        self.max_runs = max_runs
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._writer = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="artifact-writer"
+        )
+
+    @classmethod
+    def from_settings(cls) -> "ArtifactStore":
+        return cls(
+            root_dir=app_settings.artifact_dir,
+            max_runs=app_settings.artifact_max_runs,
+            max_age_seconds=app_settings.artifact_max_age_seconds,
+        )
+
+    @staticmethod
+    def new_run_id() -> str:
+        return uuid.uuid4().hex
+
+    def _run_dir(self, run_id: str) -> str:
+        if not _SAFE_NAME.match(run_id):
+            raise ValueError(f"Invalid run id: {run_id}")
+        return os.path.join(self.root_dir, run_id)
+
+    def _artifact_path(self, run_id: str, name: str) -> str:
+        if not _SAFE_NAME.match(name):
+            raise ValueError(f"Invalid artifact name: {name}")
+        return os.path.join(self._run_dir(run_id), f"{name}.json")
+
+    def save(self, run_id: str, name: str, payload: Union[BaseModel, dict]) -> concurrent.futures.Future:
+        """
+        Queue an artifact write for a run; returns immediately.
+
+        :param run_id: Run identifier
+        :param name: Artifact name, e.g. "music_plan"
+        :param payload: Pydantic model or JSON serializable dict
+        :return: Future resolving once the artifact is on disk
+        """
+        path = self._artifact_path(run_id, name)
+        return self._writer.submit(self._write, path, payload)
+
+    def _write(self, path: str, payload: Union[BaseModel, dict]):
+        try:
+            if isinstance(payload, BaseModel):
+                content = payload.model_dump_json()
+            else:
+                content = json.dumps(payload, separators=(",", ":"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            self.evict()
+        except Exception as e:
+            app_logger.error(f"Failed to write artifact {path}: {e}")
+            raise
+
+    def load(self, run_id: str, name: str) -> Optional[dict]:
+        """
+        Load an artifact of a run, or None if it does not exist.
+        """
+        path = self._artifact_path(run_id, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def list_artifacts(self, run_id: str) -> List[str]:
+        run_dir = self._run_dir(run_id)
+        if not os.path.isdir(run_dir):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(run_dir) if name.endswith(".json"))
+
+    def list_runs(self) -> List[str]:
+        """
+        Run ids currently stored, newest first.
+        """
+        if not os.path.isdir(self.root_dir):
+            return []
+        run_dirs = [
+            entry for entry in os.scandir(self.root_dir) if entry.is_dir()
+        ]
+        run_dirs.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        return [entry.name for entry in run_dirs]
+
+    def evict(self):
+        """
+        Remove runs beyond max_runs or older than max_age_seconds.
+        """
+        with self._lock:
+            now = time.time()
+            for index, run_id in enumerate(self.list_runs()):
+                run_dir = os.path.join(self.root_dir, run_id)
+                too_old = now - os.path.getmtime(run_dir) > self.max_age_seconds
+                if index >= self.max_runs or too_old:
+                    shutil.rmtree(run_dir, ignore_errors=True)
+                    app_logger.debug(f"Evicted artifacts of run {run_id}")
+
+    def flush(self):
+        """
+        Block until every queued write has finished.
+        """
+        self._writer.submit(lambda: None).result()
+
+
+artifact_store = ArtifactStore.from_settings()
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Type
+import hashlib
+import json
+import os
+import threading
+import time
+from pydantic import BaseModel
+from ..config import app_settings
+from ..logger import app_logger
+from ..schemas.openrouter import PromptRequest
+
+# Bump to invalidate every cached entry after a change in how responses are produced
+CACHE_FORMAT_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def schema_version(response_model: Type[BaseModel]) -> str:
+    """Short hash of a response model's JSON schema; changes whenever the schema does."""
+    schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+class StageCacheStats:
+    def __init__(self):
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class StageCache:
+    """
+    Content-addressed disk cache of structured LLM responses.
+
+    Entries are keyed by a hash of (rendered prompt, model, completion kwargs, response
+    schema version), expire after `ttl_seconds` and are evicted least recently used
+    first once more than `max_entries` are stored. Stats are tracked per stage, where
+    the stage is the response model name (MusicPlan, MusicChords, ...).
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 2048):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = StageCacheStats()
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, str]" = OrderedDict()
+        self._load_index()
+
+    @classmethod
+    def from_settings(cls) -> "StageCache":
+        return cls(
+            directory=app_settings.llm_cache_dir,
+            ttl_seconds=app_settings.llm_cache_ttl_seconds,
+            max_entries=app_settings.llm_cache_max_entries,
+        )
+
+    @staticmethod
+    def make_key(prompt_request: PromptRequest, model: str) -> Optional[str]:
+        """
+        Build the cache key of a prompt, or None when its response is not cacheable.
+
+        :param prompt_request: Prompt Request body
+        :param model: Resolved model name
+        """
+        response_model = prompt_request.response_format
+        if not (isinstance(response_model, type) and issubclass(response_model, BaseModel)):
+            return None
+        payload = json.dumps(
+            {
+                "version": CACHE_FORMAT_VERSION,
+                "user": prompt_request.user_messages,
+                "system": prompt_request.system_messages,
+                "model": model,
+                "kwargs": prompt_request.kwargs.model_dump(exclude_unset=True),
+                "schema": f"{response_model.__name__}:{schema_version(response_model)}",
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    entries.append((os.path.getmtime(path), name[:-len(".json")], path))
+        # Oldest first so the OrderedDict front is the LRU end
+        for _, key, path in sorted(entries):
+            self._index[key] = path
+
+    def _remove(self, key: str):
+        path = self._index.pop(key, None)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def get(self, key: str, response_model: Type[BaseModel]) -> Optional[BaseModel]:
+        stage = response_model.__name__
+        with self._lock:
+            path = self._index.get(key)
+            entry = None
+            if path:
+                try:
+                    with open(path, "r") as f:
+                        entry = json.load(f)
+                except (OSError, ValueError) as e:
+                    app_logger.error(f"Dropping unreadable cache entry {key}: {e}")
+                    self._remove(key)
+
+            if entry and time.time() - entry["created_at"] > self.ttl_seconds:
+                self.stats.expirations += 1
+                self._remove(key)
+                entry = None
+
+            if not entry:
+                self.stats.misses[stage] = self.stats.misses.get(stage, 0) + 1
+                return None
+
+            self._index.move_to_end(key)
+            # Persist recency so LRU order survives restarts
+            os.utime(path)
+            self.stats.hits[stage] = self.stats.hits.get(stage, 0) + 1
+        app_logger.debug(f"Cache hit for {stage} ({key[:12]})")
+        return response_model.model_validate(entry["value"])
+
+    def set(self, key: str, response: BaseModel):
+        path = self._path(key)
+        entry = {
+            "created_at": time.time(),
+            "stage": type(response).__name__,
+            "value": response.model_dump(mode="json"),
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+            self._index[key] = path
+            self._index.move_to_end(key)
+
+            while len(self._index) > self.max_entries:
+                evicted_key = next(iter(self._index))
+                self._remove(evicted_key)
+                self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
@@ -0,0 +1,218 @@
+from enum import Enum
+from json import JSONDecodeError
+from typing import Callable, Dict, Optional
+import random
+import threading
+import time
+import openai
+from instructor.core.exceptions import InstructorRetryException, ValidationError as InstructorValidationError
+from ..config import app_settings
+
+
+class LlmErrorKind(str, Enum):
+    RATE_LIMITED = "rate_limited"  # 429 from the provider
+    UNAVAILABLE = "unavailable"  # 5xx or connection failure
+    TIMEOUT = "timeout"
+    REJECTED = "rejected"  # other 4xx: bad request, auth, credits, unknown model
+    VALIDATION = "validation"  # the model answered but the output never matched the schema
+    CIRCUIT_OPEN = "circuit_open"  # shed without calling the model
+    ERROR = "error"  # anything else
+
+
+# Kinds that say nothing about the health of the model itself
+HEALTHY_KINDS = (LlmErrorKind.VALIDATION, LlmErrorKind.CIRCUIT_OPEN)
+
+
+class LlmError(Exception):
+    """
+    A failed LLM call, classified so callers can tell a bad answer from an unreachable model.
+
+    :param retry_after: Seconds after which the model may accept calls again, when known
+    """
+
+    def __init__(self, kind: LlmErrorKind, model: str, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.model = model
+        self.message = message
+        self.retry_after = retry_after
+
+    def __str__(self) -> str:
+        return f"{self.kind.value} from {self.model}: {self.message}"
+
+    @classmethod
+    def from_exception(cls, model: str, error: Exception) -> "LlmError":
+        if isinstance(error, LlmError):
+            return error
+        return cls(classify_error(error), model, str(error) or type(error).__name__, _retry_after(error))
+
+
+def classify_error(error: Exception) -> LlmErrorKind:
+    # Parse errors (pydantic and JSONDecodeError are ValueErrors) and exhausted re-asks
+    if isinstance(error, (InstructorRetryException, InstructorValidationError, ValueError, JSONDecodeError)):
+        return LlmErrorKind.VALIDATION
+    if isinstance(error, openai.RateLimitError):
+        return LlmErrorKind.RATE_LIMITED
+    if isinstance(error, openai.APITimeoutError):
+        return LlmErrorKind.TIMEOUT
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError)):
+        return LlmErrorKind.UNAVAILABLE
+    if isinstance(error, openai.APIStatusError):
+        return LlmErrorKind.UNAVAILABLE if error.status_code >= 500 else LlmErrorKind.REJECTED
+    return LlmErrorKind.ERROR
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Health state of one model.
+
+    Closed, calls go through. After `failure_threshold` consecutive failures, or a single
+    rate-limit response, the circuit opens and calls fail fast with CIRCUIT_OPEN for a backoff
+    that doubles with every consecutive trip from `base_backoff` up to `max_backoff`, with
+    jitter so models and processes do not retry in lockstep, and never shorter than the
+    provider's Retry-After. Then one probe call is let through (half open): success closes
+    the circuit, failure opens it again for longer. Validation errors mean the model answered,
+    so they count as success here.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        failure_threshold: int = 3,
+        base_backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        jitter: Callable[[], float] = random.random,
+    ):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._jitter = jitter
+        self._lock = threading.Lock()
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.last_error: Optional[LlmErrorKind] = None
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """
+        :raises LlmError: CIRCUIT_OPEN while the circuit is open or a probe is already running
+        """
+        with self._lock:
+            if self.state == CircuitState.OPEN:
+                remaining = self.open_until - self._clock()
+                if remaining > 0:
+                    raise LlmError(
+                        LlmErrorKind.CIRCUIT_OPEN, self.model,
+                        f"circuit open after {self.last_error.value if self.last_error else 'failures'}, "
+                        f"retry in {remaining:.1f}s",
+                        retry_after=remaining,
+                    )
+                self.state = CircuitState.HALF_OPEN
+            if self.state == CircuitState.HALF_OPEN:
+                if self._probe_in_flight:
+                    raise LlmError(LlmErrorKind.CIRCUIT_OPEN, self.model, "circuit half open, probe call running")
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CircuitState.CLOSED
+            self.consecutive_failures = 0
+            self.trips = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, kind: LlmErrorKind, retry_after: Optional[float] = None):
+        if kind in HEALTHY_KINDS:
+            self.record_success()
+            return
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = kind
+            if (self.state == CircuitState.HALF_OPEN or kind == LlmErrorKind.RATE_LIMITED
+                    or self.consecutive_failures >= self.failure_threshold):
+                self._trip(retry_after)
+
+    def release(self):
+        """
+        Give back a probe slot of a call that was cancelled before it could tell anything.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _trip(self, retry_after: Optional[float]):
+        self.trips += 1
+        backoff = min(self.base_backoff * 2 ** (self.trips - 1), self.max_backoff)
+        # Equal jitter: at least half the backoff, so a flapping model still gets a real pause
+        backoff = backoff / 2 + self._jitter() * backoff / 2
+        if retry_after:
+            backoff = max(backoff, retry_after)
+        self.state = CircuitState.OPEN
+        self.open_until = self._clock() + backoff
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self.state.value,
+                "consecutive_failures": self.consecutive_failures,
+                "trips": self.trips,
+                "retry_in": round(max(self.open_until - self._clock(), 0.0), 3)
+                if self.state == CircuitState.OPEN else 0.0,
+                "last_error": self.last_error.value if self.last_error else None,
+            }
+
+
+class CircuitBreakerRegistry:
+    """
+    One CircuitBreaker per model, created on first use.
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_backoff: float = 5.0, max_backoff: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_settings(cls) -> "CircuitBreakerRegistry":
+        return cls(
+            failure_threshold=app_settings.llm_breaker_failure_threshold,
+            base_backoff=app_settings.llm_breaker_base_backoff,
+            max_backoff=app_settings.llm_breaker_max_backoff,
+        )
+
+    def get(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(
+                    model, self.failure_threshold, self.base_backoff, self.max_backoff
+                )
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.model: breaker.snapshot() for breaker in breakers}
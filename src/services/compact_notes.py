@@ -0,0 +1,181 @@
+import re
+from collections import Counter
+from typing import Dict, Union
+from ..schemas.music import SectionChannelsResponse, ChannelNotes, SectionNotes, BarNotes, MusicNotes
+from ..schemas.note_events import (
+    NoteEvents, COMPACT_DURATION_CODES, COMPACT_REST, DURATION_TICKS, PITCH_CODES, REST_PITCH, UNKNOWN_PITCH,
+    pitch_code, duration_ticks,
+)
+from .note_repair import repair_duration, repair_velocity, record_repair
+
+COMPACT_DURATION_TICKS = {code: DURATION_TICKS[name] for code, name in COMPACT_DURATION_CODES.items()}
+_COMPACT_DURATION_OF_NAME = {name: code for code, name in COMPACT_DURATION_CODES.items()}
+
+# channel|section|bar: events; the section name may itself contain '|' or ':'
+_BAR_LINE = re.compile(r"^([^|]+)\|(.+)\|\s*(\d+)\s*:(.*)$")
+
+
+def _compact_pitch_code(token: str) -> int:
+    code = PITCH_CODES.get(token)
+    if code is not None:
+        return code
+    if token == COMPACT_REST:
+        return REST_PITCH
+    return pitch_code(int(token) if token.isdigit() else token)
+
+
+def _compact_pitch(pitch: Union[int, str], code: int) -> Union[int, str]:
+    if pitch == 'rest':
+        return COMPACT_REST
+    # Spellings with separators ('closed hat') would split the event; the MIDI number cannot
+    if isinstance(pitch, str) and len(pitch.split()) != 1 and code != UNKNOWN_PITCH:
+        return code
+    return pitch
+
+
+class CompactNotesParser:
+    """
+    Incremental parser of the compact notes format, one line per channel and bar:
+
+        melody|A|3: 1 D4 q 80; 2 F4 e 85
+
+    that is `channel|section|bar: beat pitch duration velocity; ...`, with the duration codes
+    of COMPACT_DURATION_CODES (full names are accepted too) and `r` for a rest. Text can be
+    fed in arbitrary chunks as it streams in; each complete line is parsed straight into
+    NoteEvents columns. Blank lines, `#` comments and markdown fences are skipped.
+
+    :param repair: Snap unknown durations, clamp velocities and default missing ones instead of
+        rejecting the line; the fixes are counted in `fixes`
+    """
+
+    def __init__(self, repair: bool = False):
+        self.repair = repair
+        self.fixes = Counter()
+        self._buffer = ""
+        self._line_number = 0
+        # channel -> section -> bar -> events, in order of first appearance
+        self._channels: Dict[str, Dict[str, Dict[int, NoteEvents]]] = {}
+
+    def feed(self, text: str):
+        """
+        Parse every line completed by `text`; a trailing partial line waits for the next chunk.
+
+        :raises ValueError: naming the line number of the first malformed line
+        """
+        lines = (self._buffer + text).split("\n")
+        self._buffer = lines.pop()
+        for line in lines:
+            self._parse_line(line)
+
+    def close(self) -> SectionChannelsResponse:
+        """
+        Parse the last line and build the response.
+
+        :raises ValueError: if a line is malformed or no bar lines were found
+        """
+        if self._buffer:
+            self._parse_line(self._buffer)
+            self._buffer = ""
+        if not self._channels:
+            raise ValueError("no bar lines found, expected `channel|section|bar: beat pitch duration velocity; ...`")
+        return SectionChannelsResponse(channels=[
+            ChannelNotes(channel=channel, sections=[
+                SectionNotes(section=section, bars=[BarNotes(bar=bar, events=events) for bar, events in bars.items()])
+                for section, bars in sections.items()
+            ])
+            for channel, sections in self._channels.items()
+        ])
+
+    def _parse_line(self, line: str):
+        self._line_number += 1
+        line = line.strip()
+        if not line or line.startswith(("#", "```")):
+            return
+        match = _BAR_LINE.match(line)
+        if match is None:
+            raise ValueError(f"line {self._line_number}: expected `channel|section|bar: events`, got {line!r}")
+        channel, section, bar, body = match.groups()
+        bars = self._channels.setdefault(channel.strip(), {}).setdefault(section.strip(), {})
+        events = bars.get(int(bar))
+        if events is None:
+            events = bars[int(bar)] = NoteEvents()
+        try:
+            self._parse_events(body, events)
+        except ValueError as e:
+            raise ValueError(f"line {self._line_number}: {e}") from None
+
+    def _parse_events(self, body: str, events: NoteEvents):
+        for chunk in body.split(";"):
+            fields = chunk.split()
+            if not fields:
+                continue
+            if self.repair and len(fields) == 3:
+                fields.append(None)
+            if len(fields) != 4:
+                raise ValueError(f"expected `beat pitch duration velocity`, got {chunk.strip()!r}")
+            beat, pitch, duration, velocity = fields
+            code = _compact_pitch_code(pitch)
+            ticks = COMPACT_DURATION_TICKS.get(duration)
+            if self.repair:
+                fixes = []
+                if ticks is None:
+                    ticks = duration_ticks(repair_duration(duration, fixes))
+                velocity = repair_velocity(int(velocity) if velocity and velocity.isdigit() else velocity, fixes)
+                self.fixes.update(fixes)
+            else:
+                ticks = ticks or duration_ticks(duration)
+                velocity = int(velocity)
+                if not 0 <= velocity <= 127:
+                    raise ValueError(f"velocity must be in 0..127, got {velocity}")
+            if code == UNKNOWN_PITCH:
+                if events.unknown_pitches is None:
+                    events.unknown_pitches = {}
+                events.unknown_pitches[len(events)] = pitch
+            # Note names serialize to JSON as written; rests, MIDI numbers and the compact
+            # duration codes by their JSON format values
+            spelled = code not in (REST_PITCH, UNKNOWN_PITCH) and not pitch.isdigit()
+            events.append(float(beat), code, ticks, velocity, pitch if spelled else None)
+
+
+def parse_compact_notes(text: str, repair: bool = False) -> SectionChannelsResponse:
+    """
+    Parse a complete compact notes completion, see CompactNotesParser.
+
+    :param repair: Repair near-valid events instead of rejecting them, counting the outcome
+    :raises ValueError: naming the line number of the first malformed line
+    """
+    parser = CompactNotesParser(repair=repair)
+    try:
+        parser.feed(text)
+        response = parser.close()
+    except ValueError:
+        if repair:
+            record_repair("compact", "failed")
+        raise
+    if parser.fixes:
+        record_repair("compact", "repaired", parser.fixes)
+    return response
+
+
+def repair_compact_notes(text: str) -> SectionChannelsResponse:
+    """
+    parse_compact_notes with repair, so only lines that cannot be fixed cost a re-prompt.
+    """
+    return parse_compact_notes(text, repair=True)
+
+
+def format_compact_notes(notes: Union[SectionChannelsResponse, MusicNotes]) -> str:
+    """
+    Encode notes in the compact notes format, one line per channel and bar.
+    """
+    lines = []
+    for channel in notes.channels:
+        for section in channel.sections:
+            for bar in section.bars:
+                events = "; ".join(
+                    f"{beat:g} {_compact_pitch(pitch, code)} "
+                    f"{_COMPACT_DURATION_OF_NAME.get(duration, duration)} {velocity}"
+                    for (beat, pitch, duration, velocity), code in zip(bar.events.to_list(), bar.events.pitches)
+                )
+                lines.append(f"{channel.channel}|{section.section}|{bar.bar}: {events}")
+    return "\n".join(lines)
@@ -0,0 +1,101 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import threading
+from ..config import app_settings
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful call latencies per model.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def count(self, model: str) -> int:
+        with self._lock:
+            return len(self._latencies.get(model, ()))
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        """
+        Latency below which a fraction `q` of the recent calls finished, or None without samples.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if not latencies:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+
+class HedgePolicy:
+    """
+    When and how often to hedge an LLM call.
+
+    A call still running after the `quantile` latency of its model gets a duplicate request,
+    to `fallback_model` if set or else to the same model. Until `min_samples` calls of a model
+    have been timed it is never hedged. At most `max_ratio` of all calls are hedged, which caps
+    the extra spend: with the default p90 trigger and 0.1 ratio, about one call in ten.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.9,
+        min_samples: int = 20,
+        max_ratio: float = 0.1,
+        fallback_model: Optional[str] = None,
+        window: int = 200,
+    ):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.fallback_model = fallback_model
+        self.latencies = LatencyTracker(window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+
+    @classmethod
+    def from_settings(cls) -> "HedgePolicy":
+        return cls(
+            quantile=app_settings.llm_hedge_quantile,
+            min_samples=app_settings.llm_hedge_min_samples,
+            max_ratio=app_settings.llm_hedge_max_ratio,
+            fallback_model=app_settings.llm_hedge_fallback_model,
+        )
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """
+        Seconds to wait before hedging a new call to `model`, or None to never hedge it;
+        counts the call towards the hedge budget.
+        """
+        with self._lock:
+            self.calls += 1
+        if self.latencies.count(model) < self.min_samples:
+            return None
+        return self.latencies.quantile(model, self.quantile)
+
+    def hedge_model(self, model: str) -> str:
+        return self.fallback_model or model
+
+    def try_acquire(self) -> bool:
+        """
+        Reserve one hedge if the budget of max_ratio hedges per call allows it.
+        """
+        with self._lock:
+            if self.hedges + 1 > self.max_ratio * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {"calls": self.calls, "hedges": self.hedges}
@@ -0,0 +1,184 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import concurrent.futures
+import threading
+import time
+import uuid
+from ..config import app_settings
+from ..logger import app_logger
+from ..tracing import tracer
+from ..schemas.jobs import JobRequest, JobStatus, JobState, JobStage, JobProgress
+from .music_plan import music_plan_service, MusicPlanService
+from .notes_gen import notes_gen_service, NotesGenService
+from .midi import json_to_midi_bytes
+
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue has reached its configured depth."""
+
+
+class Job:
+    def __init__(self, request: JobRequest):
+        now = time.time()
+        self.request = request
+        self.status = JobStatus(
+            job_id=uuid.uuid4().hex,
+            state=JobState.QUEUED,
+            stage=JobStage.QUEUED,
+            description=request.description,
+            created_at=now,
+            updated_at=now,
+        )
+        self.midi_bytes: Optional[bytes] = None
+
+
+class JobManager:
+    """
+    Runs full generation pipelines in a bounded in-process worker pool.
+
+    At most `max_workers` jobs run at once and at most `queue_depth` jobs wait for a
+    worker; further submissions are rejected. Finished jobs are kept for polling until
+    more than `retention` of them have accumulated, oldest evicted first.
+    """
+
+    def __init__(
+        self,
+        music_plan_service: MusicPlanService,
+        notes_gen_service: NotesGenService,
+        max_workers: int = 4,
+        queue_depth: int = 32,
+        retention: int = 256,
+    ):
+        self.music_plan_service = music_plan_service
+        self.notes_gen_service = notes_gen_service
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queued = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="generation-job"
+        )
+
+    def submit(self, request: JobRequest) -> JobStatus:
+        """
+        Queue a generation job and return immediately.
+
+        :param request: Job request body
+        :return: Initial job status
+        :raises JobQueueFullError: if queue_depth jobs are already waiting
+        """
+        job = Job(request)
+        with self._lock:
+            if self._queued >= self.queue_depth:
+                raise JobQueueFullError(f"Job queue is full ({self.queue_depth} jobs waiting)")
+            self._queued += 1
+            self._jobs[job.status.job_id] = job
+            self._evict_finished()
+            status = job.status.model_copy(deep=True)
+        self._executor.submit(self._run, job)
+        app_logger.info(f"Queued generation job {status.job_id}")
+        return status
+
+    def get_status(self, job_id: str) -> Optional[JobStatus]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.status.model_copy(deep=True) if job else None
+
+    def get_result(self, job_id: str) -> Optional[bytes]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.midi_bytes if job else None
+
+    def get_status_and_result(self, job_id: str) -> Tuple[Optional[JobStatus], Optional[bytes]]:
+        """
+        Status and MIDI bytes of a job read together, so a job evicted in between cannot pair
+        a completed status with missing bytes.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None, None
+            return job.status.model_copy(deep=True), job.midi_bytes
+
+    def _evict_finished(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status.state in (JobState.COMPLETED, JobState.FAILED)
+        ]
+        for job_id in finished[:max(len(finished) - self.retention, 0)]:
+            del self._jobs[job_id]
+
+    def _update(self, job: Job, **changes):
+        with self._lock:
+            for field, value in changes.items():
+                setattr(job.status, field, value)
+            job.status.updated_at = time.time()
+
+    def _on_section_complete(self, job: Job, section_name: str, result):
+        with self._lock:
+            job.status.progress.sections_done += 1
+            job.status.updated_at = time.time()
+
+    def _run(self, job: Job):
+        # A job outlives the request that queued it, so it gets its own trace, keyed by job id
+        with tracer.span("generation_job", new_trace=True, trace_id=job.status.job_id):
+            self._run_pipeline(job)
+
+    def _run_pipeline(self, job: Job):
+        with self._lock:
+            self._queued -= 1
+        self._update(job, state=JobState.RUNNING)
+        request = job.request
+        try:
+            plan_result = self.music_plan_service.generate_music_rhythm_given_description(
+                description=request.description,
+                model=request.model,
+                kwargs=request.kwargs,
+                on_stage=lambda stage: self._update(job, stage=JobStage(stage)),
+                run_id=job.status.job_id,
+                plan_mode=request.plan_mode,
+            )
+            if not plan_result:
+                self._update(job, state=JobState.FAILED, error="Failed to generate music rhythm")
+                return
+            music_plan, music_rhythm = plan_result
+
+            self._update(
+                job,
+                stage=JobStage.NOTES,
+                progress=JobProgress(sections_total=len(music_rhythm.sections)),
+            )
+            music_notes = self.notes_gen_service.generate_all_channel_notes(
+                music_plan=music_plan,
+                music_rhythm=music_rhythm,
+                model=request.model,
+                kwargs=request.kwargs,
+                on_section_complete=lambda section, result: self._on_section_complete(job, section, result),
+                run_id=job.status.job_id,
+                note_format=request.note_format,
+            )
+            if not music_notes:
+                self._update(job, state=JobState.FAILED, error="Failed to generate music notes")
+                return
+
+            self._update(job, stage=JobStage.MIDI)
+            job.midi_bytes = json_to_midi_bytes(music_notes)
+            self._update(job, state=JobState.COMPLETED, stage=JobStage.DONE)
+            app_logger.info(f"Generation job {job.status.job_id} completed")
+        except Exception as e:
+            app_logger.error(f"Generation job {job.status.job_id} failed: {e}")
+            self._update(job, state=JobState.FAILED, error=str(e))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_manager = JobManager(
+    music_plan_service=music_plan_service,
+    notes_gen_service=notes_gen_service,
+    max_workers=app_settings.job_workers,
+    queue_depth=app_settings.job_queue_depth,
+    retention=app_settings.job_retention,
+)
@@ -1,38 +1,77 @@
-from openai import OpenAI
-from openai.types.chat import ChatCompletion
+from openai import OpenAI, AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from ..config import app_settings
 from ..prompts.base import HEALTH_CHECK_PROMPT
 from ..logger import app_logger
+from ..tracing import tracer, traced, current_span
+from ..metrics import (
+    LLM_REQUEST_DURATION, LLM_REQUESTS, LLM_RETRIES, LLM_IN_FLIGHT, LLM_TOKENS, LLM_HEDGES, LLM_QUEUE_WAIT,
+)
+from ..utils import estimate_tokens
 from ..schemas.openrouter import PromptRequest
-from typing import Optional, Union
+from .llm_pool import LlmClientPool
+from .cache import StageCache
+from .hedging import HedgePolicy
+from .circuit_breaker import CircuitBreakerRegistry, LlmError
+from .rate_limit import LlmRateLimiter, Permit
+from .single_flight import SingleFlight
+from typing import Any, Awaitable, Optional, Union, Callable, Tuple, Type
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from json import JSONDecodeError
 import instructor
+from instructor.core.hooks import Hooks
+from instructor.core.exceptions import ValidationError as InstructorValidationError
+from pydantic import ValidationError
+from tenacity import Retrying, AsyncRetrying, stop_after_attempt, retry_if_exception_type
 from pydantic import BaseModel
 
 
+# Completion tokens charged to the token budget for calls without max_tokens
+DEFAULT_COMPLETION_TOKENS = 1024
+
+
 class LlmService:
-    def __init__(self, llm_provider: str):
+    def __init__(
+        self,
+        llm_provider: str,
+        client_pool: Optional[LlmClientPool] = None,
+        cache: Optional[StageCache] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        rate_limiter: Optional[LlmRateLimiter] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
         # Init LLM Client
         self.free_model_only = False if app_settings.openrouter_default_model else True
         self.llm_provider = llm_provider
         if self.llm_provider != "openrouter":
             raise ValueError(f"Unsupported LLM provider: {self.llm_provider}")
-        self.client = None
-
-    def prompt_llm(
-        self,
-        prompt_request: PromptRequest,
-    ) -> Optional[BaseModel]:
-        """
-        Prompt LLM with Request body, optional to return everything in response
-
-        :param prompt_request: Prompt Request body
-        :param return_full_response: Return additional info from response body or not
-        :return: Response text only or full completion
-        """
-
-        # Define Model
-        model = prompt_request.model
+        # Clients are pooled and shared across calls/threads instead of rebuilt per prompt
+        self.client_pool = client_pool if client_pool is not None else LlmClientPool.from_settings()
+        # Structured responses are served from cache when an identical prompt was answered before
+        self.cache = cache
+        # Slow calls are duplicated per this policy to cut tail latency; None disables hedging
+        self.hedge_policy = hedge_policy
+        self._hedge_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=app_settings.llm_max_connections, thread_name_prefix="llm-hedge"
+        ) if hedge_policy is not None else None
+        # One slot per hedge executor thread, held until the call ends, losing hedges included
+        self._hedge_slots = threading.BoundedSemaphore(
+            app_settings.llm_max_connections
+        ) if hedge_policy is not None else None
+        # Per-model health; calls to a failing model are shed instead of re-sent. None disables it
+        self.circuit_breakers = circuit_breakers
+        # Process-wide admission of outbound calls (in-flight cap, per-model rpm/tpm). None disables it
+        self.rate_limiter = rate_limiter
+        # Identical concurrent calls share one in-flight request. None disables coalescing
+        self.single_flight = single_flight
 
+    def _resolve_model(self, model: Optional[str]) -> str:
         app_logger.debug(f"Prompting LLM with model: {model}")
         if not model:
             if self.free_model_only:
@@ -45,7 +84,9 @@ class LlmService:
                 app_logger.debug(
                     f"No model specified, using default model: {model}"
                 )
+        return model
 
+    def _completion_params(self, prompt_request: PromptRequest, model: str) -> dict:
         if self.llm_provider != "openrouter":
             raise ValueError(f"Unsupported LLM provider: {self.llm_provider}")
 
@@ -55,39 +96,586 @@ class LlmService:
         # Other params
         kwargs_dict = prompt_request.kwargs.model_dump(exclude_unset=True)
 
-        # Init client
-        # self.client = OpenAI(
-        #     api_key=app_settings.openrouter_api_key,
-        #     base_url=app_settings.openrouter_url
-        # )
+        return dict(
+            model=model,
+            messages=[
+                {"role": "user", "content": prompt_request.user_messages},
+                {"role": "system", "content": prompt_request.system_messages},
+            ],
+            response_model=response_format,
+            **kwargs_dict,
+            max_retries=3,
+            hooks=self._retry_hooks(model),
+            # tools=None
+        )
+
+    @staticmethod
+    def _reask_retrying(attempts: int, is_async: bool = False) -> Union[Retrying, AsyncRetrying]:
+        """
+        Instructor retry policy re-asking only invalid answers. An int max_retries would also
+        re-send the prompt at once on rate limits and outages; those are left to the OpenAI
+        client's own backoff and the circuit breaker.
+        """
+        retrying = AsyncRetrying if is_async else Retrying
+        return retrying(
+            stop=stop_after_attempt(attempts),
+            retry=retry_if_exception_type((ValidationError, JSONDecodeError, InstructorValidationError)),
+        )
+
+    @contextmanager
+    def _guarded_call(self, model: str):
+        """
+        Run an LLM call under the model's circuit breaker, raising failures as classified LlmErrors.
+        """
+        breaker = self.circuit_breakers.get(model) if self.circuit_breakers is not None else None
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            yield
+        except Exception as e:
+            error = LlmError.from_exception(model, e)
+            if breaker is not None:
+                breaker.record_failure(error.kind, error.retry_after)
+            raise error from e
+        except BaseException:
+            # Cancelled, e.g. a losing hedge; says nothing about the model
+            if breaker is not None:
+                breaker.release()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+
+    @staticmethod
+    def _estimate_call_tokens(prompt_request: PromptRequest) -> int:
+        """
+        Tokens a call may use, charged to the model's token budget until its actual usage is known.
+        """
+        prompt_tokens = estimate_tokens(prompt_request.user_messages) + estimate_tokens(prompt_request.system_messages)
+        return prompt_tokens + (prompt_request.kwargs.max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+    @staticmethod
+    def _fairness_key() -> str:
+        # Calls of one request or job share a trace, and so a fair-queueing slot
+        span = current_span()
+        return span.trace.trace_id if span is not None else "default"
+
+    @staticmethod
+    def _record_admission(model: str, permit: Permit):
+        LLM_QUEUE_WAIT.observe(permit.waited, model=model)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("queued_ms", round(permit.waited * 1000, 1))
+
+    def _admit(self, prompt_request: PromptRequest, model: str) -> Union[Permit, nullcontext]:
+        """
+        Wait until the rate limiter admits a call to `model`; the permit is released on exit.
+        """
+        if self.rate_limiter is None:
+            return nullcontext()
+        permit = self.rate_limiter.acquire(model, self._estimate_call_tokens(prompt_request), self._fairness_key())
+        self._record_admission(model, permit)
+        return permit
 
-        # Wrap with instructor client
-        self.client: instructor.Instructor = instructor.from_provider(
-            model="openrouter/" + model,
-            api_key=app_settings.openrouter_api_key,
+    async def _admit_async(self, prompt_request: PromptRequest, model: str) -> Union[Permit, nullcontext]:
+        if self.rate_limiter is None:
+            return nullcontext()
+        permit = await self.rate_limiter.acquire_async(
+            model, self._estimate_call_tokens(prompt_request), self._fairness_key()
+        )
+        self._record_admission(model, permit)
+        return permit
+
+    @staticmethod
+    def _retry_hooks(model: str) -> Hooks:
+        """
+        Per-call instructor hooks counting every attempt after the first as a retry.
+        """
+        attempts = 0
+
+        def on_attempt(*args, **kwargs):
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1:
+                LLM_RETRIES.inc(model=model)
+
+        hooks = Hooks()
+        hooks.on("completion:kwargs", on_attempt)
+        return hooks
+
+    @staticmethod
+    def _record_usage(model: str, completion: ChatCompletion) -> Optional[int]:
+        """
+        Count the tokens of a completion; returns its total tokens if reported.
+        """
+        usage = getattr(completion, "usage", None)
+        details = getattr(usage, "completion_tokens_details", None)
+        span = current_span()
+        for kind, tokens in (
+            ("prompt", getattr(usage, "prompt_tokens", None)),
+            ("completion", getattr(usage, "completion_tokens", None)),
+            ("reasoning", getattr(details, "reasoning_tokens", None)),
+        ):
+            if isinstance(tokens, int) and tokens > 0:
+                LLM_TOKENS.inc(tokens, model=model, kind=kind)
+                if span is not None:
+                    span.set_attribute(f"{kind}_tokens", tokens)
+        total_tokens = getattr(usage, "total_tokens", None)
+        return total_tokens if isinstance(total_tokens, int) else None
+
+    @staticmethod
+    def _text_completion_params(params: dict) -> Tuple[dict, int, Hooks]:
+        """
+        Plain chat completion params from instructor ones, the number of attempts and the hooks.
+        """
+        params = dict(params)
+        params.pop("response_model")
+        return params, params.pop("max_retries"), params.pop("hooks")
+
+    @staticmethod
+    def _reask_messages(messages: list, text: str, error: Exception) -> list:
+        return [
+            *messages,
+            {"role": "assistant", "content": text},
+            {"role": "user", "content": f"Your answer could not be parsed: {error}\n"
+                                        f"Answer again, using exactly the requested format."},
+        ]
+
+    def _create_with_parser(
+        self, client: OpenAI, params: dict, parser: Callable[[str], BaseModel]
+    ) -> Tuple[BaseModel, ChatCompletion]:
+        """
+        Plain-text completion parsed by `parser`; like instructor does for JSON, a
+        completion that fails to parse is re-asked with the error until max_retries.
+        """
+        params, attempts, hooks = self._text_completion_params(params)
+        for attempt in range(1, attempts + 1):
+            hooks.emit_completion_arguments(**params)
+            completion = client.chat.completions.create(**params)
+            text = completion.choices[0].message.content or ""
+            try:
+                return parser(text), completion
+            except ValueError as e:
+                if attempt == attempts:
+                    raise
+                app_logger.warning(f"Failed to parse LLM response (attempt {attempt}/{attempts}): {e}")
+                params["messages"] = self._reask_messages(params["messages"], text, e)
+
+    async def _create_with_parser_async(
+        self, client: AsyncOpenAI, params: dict, parser: Callable[[str], BaseModel]
+    ) -> Tuple[BaseModel, ChatCompletion]:
+        params, attempts, hooks = self._text_completion_params(params)
+        for attempt in range(1, attempts + 1):
+            hooks.emit_completion_arguments(**params)
+            completion = await client.chat.completions.create(**params)
+            text = completion.choices[0].message.content or ""
+            try:
+                return parser(text), completion
+            except ValueError as e:
+                if attempt == attempts:
+                    raise
+                app_logger.warning(f"Failed to parse LLM response (attempt {attempt}/{attempts}): {e}")
+                params["messages"] = self._reask_messages(params["messages"], text, e)
+
+    async def _create_partial_async(
+        self, client: AsyncOpenAI, params: dict, response_format: Type[BaseModel], on_partial: Callable[[BaseModel], None]
+    ) -> Tuple[BaseModel, Optional[ChatCompletionChunk]]:
+        """
+        instructor's create_partial in JSON mode, on the underlying client so the stream can ask
+        for its usage: returns the last partial object and the final chunk carrying the usage,
+        if the provider sent one.
+        """
+        params, _, hooks = self._text_completion_params(params)
+        partial_model, params = instructor.handle_response_model(
+            instructor.Partial[response_format], mode=instructor.Mode.JSON, **params
+        )
+        hooks.emit_completion_arguments(**params)
+        stream = await client.chat.completions.create(**params, stream=True, stream_options={"include_usage": True})
+        usage_chunk = None
+
+        async def chunks():
+            nonlocal usage_chunk
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage_chunk = chunk
+                yield chunk
+
+        partial = None
+        async for partial in partial_model.from_streaming_response_async(chunks(), mode=instructor.Mode.JSON):
+            on_partial(partial)
+        return partial, usage_chunk
+
+    def _complete(
+        self,
+        prompt_request: PromptRequest,
+        model: str,
+        on_admitted: Optional[Callable[[], None]] = None,
+        abandoned: Optional[threading.Event] = None,
+    ) -> Tuple[BaseModel, ChatCompletion]:
+        """
+        One LLM call against `model`, including its re-asks; raises on failure. `on_admitted` is
+        called once the rate limiter lets the call through; its latency is timed from there and
+        not recorded if `abandoned` is set by then, as for a hedge that lost the race.
+        """
+        params = self._completion_params(prompt_request, model)
+        # Reuse pooled instructor client (keep-alive connections)
+        client: instructor.Instructor = self.client_pool.get_client(
+            model=model,
             base_url=app_settings.openrouter_url,
-            async_client=False,
             mode=instructor.Mode.JSON           # Enforce json otherwise may give excess messages
         )
+        with tracer.span("llm_call", model=model), self._guarded_call(model), \
+                self._admit(prompt_request, model) as permit, \
+                LLM_IN_FLIGHT.track_inprogress(model=model), LLM_REQUEST_DURATION.time(model=model):
+            start = time.perf_counter()
+            if on_admitted is not None:
+                on_admitted()
+            if prompt_request.response_parser is not None:
+                # Custom text format; the underlying OpenAI client skips instructor's JSON mode
+                response, chat_completion_message = self._create_with_parser(
+                    client.client, params, prompt_request.response_parser
+                )
+            else:
+                response, chat_completion_message = client.create_with_completion(
+                    **{**params, "max_retries": self._reask_retrying(params["max_retries"])}
+                )
+            used_tokens = self._record_usage(model, chat_completion_message)
+            if permit is not None:
+                permit.used_tokens = used_tokens
+        if self.hedge_policy is not None and not (abandoned is not None and abandoned.is_set()):
+            self.hedge_policy.latencies.record(model, time.perf_counter() - start)
+        return response, chat_completion_message
 
-        try:
-            response, chat_completion_message = self.client.create_with_completion(
-                model=model,
-                messages=[
-                    {"role": "user", "content": prompt_request.user_messages},
-                    {"role": "system", "content": prompt_request.system_messages},
-                ],
-                response_model=response_format,
-                **kwargs_dict,
-                max_retries=3,
-                # tools=None
+    async def _complete_async(
+        self, prompt_request: PromptRequest, model: str, on_admitted: Optional[Callable[[], None]] = None
+    ) -> Tuple[BaseModel, ChatCompletion]:
+        params = self._completion_params(prompt_request, model)
+        client: instructor.AsyncInstructor = self.client_pool.get_async_client(
+            model=model,
+            base_url=app_settings.openrouter_url,
+            mode=instructor.Mode.JSON
+        )
+        with tracer.span("llm_call", model=model), self._guarded_call(model), \
+                await self._admit_async(prompt_request, model) as permit, \
+                LLM_IN_FLIGHT.track_inprogress(model=model), LLM_REQUEST_DURATION.time(model=model):
+            start = time.perf_counter()
+            if on_admitted is not None:
+                on_admitted()
+            if prompt_request.response_parser is not None:
+                response, chat_completion_message = await self._create_with_parser_async(
+                    client.client, params, prompt_request.response_parser
+                )
+            else:
+                response, chat_completion_message = await client.create_with_completion(
+                    **{**params, "max_retries": self._reask_retrying(params["max_retries"], is_async=True)}
+                )
+            used_tokens = self._record_usage(model, chat_completion_message)
+            if permit is not None:
+                permit.used_tokens = used_tokens
+        if self.hedge_policy is not None:
+            self.hedge_policy.latencies.record(model, time.perf_counter() - start)
+        return response, chat_completion_message
+
+    async def _complete_streaming_async(
+        self, prompt_request: PromptRequest, model: str, on_partial: Callable[[BaseModel], None]
+    ) -> BaseModel:
+        """
+        One streamed LLM call against `model`, passing each partial object to `on_partial`;
+        raises on failure. A stream cannot be re-asked without replaying it, so it gets one attempt.
+        """
+        params = self._completion_params(prompt_request, model)
+        client: instructor.AsyncInstructor = self.client_pool.get_async_client(
+            model=model,
+            base_url=app_settings.openrouter_url,
+            mode=instructor.Mode.JSON
+        )
+        with tracer.span("llm_call", model=model, stream=True), self._guarded_call(model), \
+                await self._admit_async(prompt_request, model) as permit, \
+                LLM_IN_FLIGHT.track_inprogress(model=model), LLM_REQUEST_DURATION.time(model=model):
+            start = time.perf_counter()
+            partial, usage_chunk = await self._create_partial_async(
+                client.client, params, prompt_request.response_format, on_partial
             )
+            if partial is None:
+                raise ValueError("LLM stream ended without a response")
+            response = prompt_request.response_format.model_validate(partial.model_dump())
+            used_tokens = self._record_usage(model, usage_chunk)
+            if permit is not None:
+                permit.used_tokens = used_tokens
+        if self.hedge_policy is not None:
+            self.hedge_policy.latencies.record(model, time.perf_counter() - start)
+        return response
+
+    def _submit_hedged(self, *args) -> concurrent.futures.Future:
+        """Run _complete(*args) on the hedge executor, in a hedge slot already taken for it."""
+        future = self._hedge_executor.submit(contextvars.copy_context().run, self._complete, *args)
+        future.add_done_callback(lambda _: self._hedge_slots.release())
+        return future
+
+    def _complete_hedged(self, prompt_request: PromptRequest, model: str) -> Tuple[BaseModel, ChatCompletion]:
+        """
+        _complete, duplicated to the hedge model once the call outlives the hedge delay after
+        the rate limiter admitted it; the first valid response wins. A losing call cannot be
+        interrupted in a thread: it runs to the end, holding its rate limiter permit, and its
+        result and latency are discarded. Each call on the hedge executor holds one of its
+        llm_max_connections slots until it ends, so losers cannot pile up there: without a free
+        slot the call runs inline and unhedged, and a slow call is not hedged.
+        """
+        delay = self.hedge_policy.hedge_delay(model)
+        if delay is None or not self._hedge_slots.acquire(blocking=False):
+            return self._complete(prompt_request, model)
+
+        admitted = concurrent.futures.Future()
+        primary_abandoned = threading.Event()
+        primary = self._submit_hedged(prompt_request, model, lambda: admitted.set_result(None), primary_abandoned)
+        # The delay runs from the primary's admission: a call queued in the rate limiter has not
+        # reached the model yet, and hedging it would only add to the queue
+        concurrent.futures.wait({primary, admitted}, return_when=concurrent.futures.FIRST_COMPLETED)
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+        if not self._hedge_slots.acquire(blocking=False):
+            return primary.result()
+        if not self.hedge_policy.try_acquire():
+            self._hedge_slots.release()
+            return primary.result()
+
+        hedge_model = self.hedge_policy.hedge_model(model)
+        app_logger.info(f"LLM call to {model} slower than {delay:.1f}s, hedging with {hedge_model}")
+        LLM_HEDGES.inc(model=hedge_model, outcome="launched")
+        hedge_abandoned = threading.Event()
+        hedge = self._submit_hedged(prompt_request, hedge_model, None, hedge_abandoned)
+        abandoned = {primary: primary_abandoned, hedge: hedge_abandoned}
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        LLM_HEDGES.inc(model=hedge_model, outcome="won")
+                    for other in pending:
+                        abandoned[other].set()
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def _complete_hedged_async(
+        self, prompt_request: PromptRequest, model: str
+    ) -> Tuple[BaseModel, ChatCompletion]:
+        """
+        Async version of _complete_hedged; the losing call is cancelled.
+        """
+        delay = self.hedge_policy.hedge_delay(model)
+        if delay is None:
+            return await self._complete_async(prompt_request, model)
+
+        admitted = asyncio.get_running_loop().create_future()
+        primary = asyncio.create_task(
+            self._complete_async(prompt_request, model, lambda: admitted.done() or admitted.set_result(None))
+        )
+        pending = {primary}
+        try:
+            # As in _complete_hedged, the delay runs from the primary's admission
+            await asyncio.wait({primary, admitted}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self.hedge_policy.try_acquire():
+                return await primary
+
+            hedge_model = self.hedge_policy.hedge_model(model)
+            app_logger.info(f"LLM call to {model} slower than {delay:.1f}s, hedging with {hedge_model}")
+            LLM_HEDGES.inc(model=hedge_model, outcome="launched")
+            hedge = asyncio.create_task(self._complete_async(prompt_request, hedge_model))
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            LLM_HEDGES.inc(model=hedge_model, outcome="won")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _call_key(self, prompt_request: PromptRequest, model: str) -> Optional[str]:
+        """Key identifying a call's response for the cache and for coalescing; None if neither applies."""
+        if self.cache is None and self.single_flight is None:
+            return None
+        return StageCache.make_key(prompt_request, model)
+
+    def _coalesced(self, call_key: Optional[str], fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        fn(), or the result of the identical call already in flight; returns (result, shared).
+        """
+        if call_key is None or self.single_flight is None:
+            return fn(), False
+        return self.single_flight.do(call_key, fn)
+
+    async def _coalesced_async(self, call_key: Optional[str], fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        if call_key is None or self.single_flight is None:
+            return await fn(), False
+        return await self.single_flight.do_async(call_key, fn)
+
+    @staticmethod
+    def _record_coalesced(model: str, response: BaseModel) -> BaseModel:
+        """Count a response shared from another caller's call; callers get their own copy."""
+        LLM_REQUESTS.inc(model=model, outcome="coalesced")
+        current_span().set_attribute("coalesced", True)
+        return response.model_copy(deep=True)
+
+    @traced()
+    def prompt_llm(
+        self,
+        prompt_request: PromptRequest,
+        raise_errors: bool = False,
+    ) -> Optional[BaseModel]:
+        """
+        Prompt LLM with Request body, optional to return everything in response
+
+        :param prompt_request: Prompt Request body
+        :param raise_errors: Raise failures as LlmError, carrying the reason, instead of returning None
+        :return: Parsed response, or None on failure
+        :raises LlmError: on failure, if raise_errors
+        """
+        model = self._resolve_model(prompt_request.model)
+        current_span().set_attribute("model", model)
+
+        call_key = self._call_key(prompt_request, model)
+        if call_key and self.cache is not None:
+            cached = self.cache.get(call_key, prompt_request.response_format)
+            if cached is not None:
+                LLM_REQUESTS.inc(model=model, outcome="cached")
+                current_span().set_attribute("cached", True)
+                return cached
+
+        def complete():
+            if self.hedge_policy is not None:
+                return self._complete_hedged(prompt_request, model)
+            return self._complete(prompt_request, model)
+
+        try:
+            (response, chat_completion_message), shared = self._coalesced(call_key, complete)
+            if shared:
+                return self._record_coalesced(model, response)
             app_logger.debug(f"LLM response: {response}")
             app_logger.debug(
                 f"LLM resource usage: {chat_completion_message.usage}")
+            LLM_REQUESTS.inc(model=model, outcome="success")
+            if call_key and self.cache is not None:
+                self.cache.set(call_key, response)
+            return response
+        except Exception as e:
+            error = LlmError.from_exception(model, e)
+            app_logger.error(f"LLM call failed: {error}")
+            LLM_REQUESTS.inc(model=model, outcome=error.kind.value)
+            if raise_errors:
+                raise error from e
+            return None
+
+    @traced()
+    async def prompt_llm_async(
+        self,
+        prompt_request: PromptRequest,
+        raise_errors: bool = False,
+    ) -> Optional[BaseModel]:
+        """
+        Async version of prompt_llm, awaiting the LLM without holding a thread
+
+        :param prompt_request: Prompt Request body
+        :param raise_errors: Raise failures as LlmError instead of returning None
+        :return: Parsed response or None on failure
+        """
+        model = self._resolve_model(prompt_request.model)
+        current_span().set_attribute("model", model)
+
+        call_key = self._call_key(prompt_request, model)
+        if call_key and self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, call_key, prompt_request.response_format)
+            if cached is not None:
+                LLM_REQUESTS.inc(model=model, outcome="cached")
+                current_span().set_attribute("cached", True)
+                return cached
+
+        def complete():
+            if self.hedge_policy is not None:
+                return self._complete_hedged_async(prompt_request, model)
+            return self._complete_async(prompt_request, model)
+
+        try:
+            (response, chat_completion_message), shared = await self._coalesced_async(call_key, complete)
+            if shared:
+                return self._record_coalesced(model, response)
+            app_logger.debug(f"LLM response: {response}")
+            app_logger.debug(
+                f"LLM resource usage: {chat_completion_message.usage}")
+            LLM_REQUESTS.inc(model=model, outcome="success")
+            if call_key and self.cache is not None:
+                await asyncio.to_thread(self.cache.set, call_key, response)
+            return response
+        except Exception as e:
+            error = LlmError.from_exception(model, e)
+            app_logger.error(f"LLM call failed: {error}")
+            LLM_REQUESTS.inc(model=model, outcome=error.kind.value)
+            if raise_errors:
+                raise error from e
+            return None
+
+    @traced()
+    async def prompt_llm_streaming_async(
+        self,
+        prompt_request: PromptRequest,
+        on_partial: Callable[[BaseModel], None],
+        raise_errors: bool = False,
+    ) -> Optional[BaseModel]:
+        """
+        prompt_llm_async streaming the structured output: `on_partial` gets a partial
+        response_format object, with the fields written so far, as each chunk arrives, so
+        callers can start on the parts that are already complete. Streamed calls are not
+        hedged; a cached response, or one shared from an identical stream already in flight, is
+        passed to `on_partial` once.
+
+        :param prompt_request: Prompt Request body; response_format must be a model class
+        :param on_partial: Called with every partial response
+        :param raise_errors: Raise failures as LlmError instead of returning None
+        :return: Validated response or None on failure
+        """
+        model = self._resolve_model(prompt_request.model)
+        current_span().set_attribute("model", model)
+
+        call_key = self._call_key(prompt_request, model)
+        if call_key and self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, call_key, prompt_request.response_format)
+            if cached is not None:
+                LLM_REQUESTS.inc(model=model, outcome="cached")
+                current_span().set_attribute("cached", True)
+                on_partial(cached)
+                return cached
+
+        async def complete():
+            # Same (response, completion) shape as the plain calls, which may coalesce with it
+            return await self._complete_streaming_async(prompt_request, model, on_partial), None
+
+        try:
+            (response, _), shared = await self._coalesced_async(call_key, complete)
+            if shared:
+                response = self._record_coalesced(model, response)
+                on_partial(response)
+                return response
+            app_logger.debug(f"LLM response: {response}")
+            LLM_REQUESTS.inc(model=model, outcome="success")
+            if call_key and self.cache is not None:
+                await asyncio.to_thread(self.cache.set, call_key, response)
             return response
         except Exception as e:
-            app_logger.error(f"Error parsing LLM response: {e}")
+            error = LlmError.from_exception(model, e)
+            app_logger.error(f"LLM call failed: {error}")
+            LLM_REQUESTS.inc(model=model, outcome=error.kind.value)
+            if raise_errors:
+                raise error from e
             return None
 
     def health_check(self, model: Optional[str] = None):
@@ -104,4 +692,11 @@ class LlmService:
             return {"model": model, "status": "unhealthy", "error": str(e)}
 
 
-llm_service = LlmService(llm_provider="openrouter")
+llm_service = LlmService(
+    llm_provider="openrouter",
+    cache=StageCache.from_settings() if app_settings.llm_cache_enabled else None,
+    hedge_policy=HedgePolicy.from_settings() if app_settings.llm_hedging_enabled else None,
+    circuit_breakers=CircuitBreakerRegistry.from_settings() if app_settings.llm_breaker_enabled else None,
+    rate_limiter=LlmRateLimiter.from_settings(),
+    single_flight=SingleFlight() if app_settings.llm_coalescing_enabled else None,
+)
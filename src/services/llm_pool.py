@@ -0,0 +1,220 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+import instructor
+from openai import OpenAI, AsyncOpenAI
+from ..config import app_settings
+from ..logger import app_logger
+
+
+class ConnectionStats:
+    """Thread-safe counters of outbound HTTP requests and newly opened connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    @property
+    def reused_connections(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(self.requests - self.new_connections, 0),
+            }
+
+
+class LlmClientPool:
+    """
+    Pool of instructor clients keyed by (model, base_url, mode) with LRU eviction.
+
+    All clients pointing at the same base_url share one keep-alive httpx client,
+    so evicting an instructor client never drops warm connections.
+    Async clients are bound to the event loop that created them, so they are
+    pooled per running loop and closed with aclose_async_clients before it ends.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_clients: int = 32,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+    ):
+        self.api_key = api_key
+        self.max_clients = max_clients
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.stats = ConnectionStats()
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[Tuple[str, str, str], instructor.Instructor]" = OrderedDict()
+        self._http_clients: Dict[str, httpx.Client] = {}
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OrderedDict]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._async_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @classmethod
+    def from_settings(cls) -> "LlmClientPool":
+        return cls(
+            api_key=app_settings.openrouter_api_key,
+            max_clients=app_settings.llm_pool_max_clients,
+            max_connections=app_settings.llm_max_connections,
+            max_keepalive_connections=app_settings.llm_max_keepalive_connections,
+            keepalive_expiry=app_settings.llm_keepalive_expiry,
+        )
+
+    def _trace(self, event_name: str, info: dict):
+        # httpcore reports every freshly opened TCP connection through this hook
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.record_new_connection()
+
+    def _on_request(self, request: httpx.Request):
+        self.stats.record_request()
+        request.extensions["trace"] = self._trace
+
+    async def _async_trace(self, event_name: str, info: dict):
+        self._trace(event_name, info)
+
+    async def _on_async_request(self, request: httpx.Request):
+        self.stats.record_request()
+        request.extensions["trace"] = self._async_trace
+
+    def _get_http_client(self, base_url: str) -> httpx.Client:
+        http_client = self._http_clients.get(base_url)
+        if http_client is None:
+            http_client = httpx.Client(
+                limits=self.limits,
+                timeout=httpx.Timeout(600.0, connect=10.0),
+                event_hooks={"request": [self._on_request]},
+            )
+            self._http_clients[base_url] = http_client
+        return http_client
+
+    def get_client(
+        self, model: str, base_url: str, mode: instructor.Mode = instructor.Mode.JSON
+    ) -> instructor.Instructor:
+        """
+        Get a pooled instructor client, creating it on first use.
+
+        :param model: Model name the client is bound to
+        :param base_url: OpenAI compatible API base url
+        :param mode: Instructor parsing mode
+        :return: Instructor client
+        """
+        key = (model, base_url, mode.value)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            # What instructor.from_provider("openrouter/...") builds, which takes no http_client
+            openai_client = OpenAI(
+                api_key=self.api_key or os.environ.get("OPENROUTER_API_KEY"),
+                base_url=base_url,
+                http_client=self._get_http_client(base_url),
+            )
+            client = instructor.from_openai(openai_client, mode=mode)
+            self._clients[key] = client
+            app_logger.debug(f"Created pooled LLM client for {key}")
+
+            while len(self._clients) > self.max_clients:
+                evicted_key, _ = self._clients.popitem(last=False)
+                app_logger.debug(f"Evicted pooled LLM client for {evicted_key}")
+            return client
+
+    def _get_async_http_client(
+        self, loop: asyncio.AbstractEventLoop, base_url: str
+    ) -> httpx.AsyncClient:
+        http_clients = self._async_http_clients.setdefault(loop, {})
+        http_client = http_clients.get(base_url)
+        if http_client is None:
+            http_client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=httpx.Timeout(600.0, connect=10.0),
+                event_hooks={"request": [self._on_async_request]},
+            )
+            http_clients[base_url] = http_client
+        return http_client
+
+    def get_async_client(
+        self, model: str, base_url: str, mode: instructor.Mode = instructor.Mode.JSON
+    ) -> instructor.AsyncInstructor:
+        """
+        Get a pooled async instructor client for the running event loop.
+
+        :param model: Model name the client is bound to
+        :param base_url: OpenAI compatible API base url
+        :param mode: Instructor parsing mode
+        :return: Async instructor client
+        """
+        loop = asyncio.get_running_loop()
+        key = (model, base_url, mode.value)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, OrderedDict())
+            client = clients.get(key)
+            if client is not None:
+                clients.move_to_end(key)
+                return client
+
+            openai_client = AsyncOpenAI(
+                api_key=self.api_key or os.environ.get("OPENROUTER_API_KEY"),
+                base_url=base_url,
+                http_client=self._get_async_http_client(loop, base_url),
+            )
+            client = instructor.from_openai(openai_client, mode=mode)
+            clients[key] = client
+            app_logger.debug(f"Created pooled async LLM client for {key}")
+
+            while len(clients) > self.max_clients:
+                evicted_key, _ = clients.popitem(last=False)
+                app_logger.debug(f"Evicted pooled async LLM client for {evicted_key}")
+            return client
+
+    async def aclose_async_clients(self):
+        """
+        Drop the async clients of the running event loop and close their connections; call it
+        before the loop ends (the app does on shutdown), as httpx cannot close them afterwards.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._async_clients.pop(loop, None)
+            http_clients = self._async_http_clients.pop(loop, {})
+        for http_client in http_clients.values():
+            await http_client.aclose()
+
+    def __len__(self) -> int:
+        return len(self._clients) + sum(len(clients) for clients in self._async_clients.values())
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+            for http_client in self._http_clients.values():
+                http_client.close()
+            self._http_clients.clear()
+            # Async http clients can only be closed on their loop, see aclose_async_clients
+            self._async_clients.clear()
+            self._async_http_clients.clear()
@@ -1,107 +1,42 @@
 import os
 import logging
+import struct
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 from mido import MidiFile, MidiTrack, Message, MetaMessage, bpm2tempo
+from src.metrics import observe_stage
+from src.tracing import traced
 from src.schemas.music import MusicNotes, ChannelNotes, SectionNotes, BarNotes
+from src.schemas.note_events import (
+    TICKS_PER_BEAT, DEFAULT_PERCUSSION_PITCH, DURATION_TICKS, REST_PITCH, UNKNOWN_PITCH, pitch_code
+)
 
 # Constants
-TICKS_PER_BEAT = 480  # Standard MIDI ticks per beat
 DEFAULT_BPM = 120
 
-# Pitch to MIDI note mapping
-NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-
-# Percussion mapping (MIDI note numbers for GM percussion)
-PERCUSSION_MAP = {
-    'kick': 36,    # Bass Drum 1
-    'snare': 38,   # Acoustic Snare
-    'hihat': 42,   # Closed Hi-Hat
-    'crash': 49,   # Crash Cymbal 1
-    'ride': 51,    # Ride Cymbal 1
-    'tom1': 41,    # Low Floor Tom
-    'tom2': 43,    # High Floor Tom
-    'tom3': 45,    # Low Tom
-    'tom4': 47,    # Low-Mid Tom
-    'tom5': 48,    # Hi-Mid Tom
-    'tom6': 50,    # High Tom
-}
-
 def pitch_to_midi(pitch_str, is_percussion: bool = False) -> int:
     """Convert pitch string like 'C4' or 'Eb4' to MIDI note number, or return int if already MIDI."""
     if isinstance(pitch_str, int):
         return pitch_str
 
-    if pitch_str == 'rest':
+    midi_note = pitch_code(pitch_str)
+    if midi_note == REST_PITCH:
         return -1  # Special case for rest
-
-    if is_percussion:
-        return PERCUSSION_MAP.get(pitch_str.lower(), 36)  # Default to kick
-
-    # Parse note name and octave
-    note_name = ''
-    octave = 0
-    for char in pitch_str:
-        if char.isalpha() or char in ['#', 'b']:
-            note_name += char
-        else:
-            octave = int(char)
-            break
-
-    # Convert flats to sharps for canonical representation
-    flat_to_sharp = {
-        'Cb': 'B',  # Cb is B
-        'Db': 'C#',
-        'Eb': 'D#',
-        'Fb': 'E',  # Fb is E
-        'Gb': 'F#',
-        'Ab': 'G#',
-        'Bb': 'A#',
-        'C#': 'C#',
-        'D#': 'D#',
-        'F#': 'F#',
-        'G#': 'G#',
-        'A#': 'A#',
-        'C': 'C',
-        'D': 'D',
-        'E': 'E',
-        'F': 'F',
-        'G': 'G',
-        'A': 'A',
-        'B': 'B'
-    }
-
-    canonical_note = flat_to_sharp.get(note_name, note_name)
-
-    # Find note index
-    note_index = NOTE_NAMES.index(canonical_note)
-    midi_note = (octave + 1) * 12 + note_index
+    if midi_note == UNKNOWN_PITCH:
+        if is_percussion:
+            return DEFAULT_PERCUSSION_PITCH  # Default to kick
+        raise ValueError(f"Unknown pitch: {pitch_str}")
     return midi_note
 
 def duration_to_ticks(duration_str: str, bpm: int = DEFAULT_BPM) -> int:
     """Convert duration string to MIDI ticks."""
     # Assuming 4/4 time, quarter note = 1 beat
-    duration_map = {
-        'whole': 4,
-        'dotted_whole': 6,
-        'half': 2,
-        'dotted_half': 3,
-        'quarter': 1,
-        'dotted_quarter': 1.5,
-        'eighth': 0.5,
-        'dotted_eighth': 0.75,
-        '16th': 0.25,
-        'sixteenth': 0.25,
-        'dotted_sixteenth': 0.375,
-        '32nd': 0.125,
-        'thirty-second': 0.125
-    }
-
-    if duration_str not in duration_map:
+    ticks = DURATION_TICKS.get(duration_str)
+    if ticks is None:
         logging.error(f"Unknown duration: {duration_str}")
         raise ValueError(f"Unknown duration: {duration_str}")
-
-    beats = duration_map[duration_str]
-    # Ticks = beats * ticks_per_beat
-    return int(beats * TICKS_PER_BEAT)
+    return ticks
 
 def beat_to_ticks(beat: float, bpm: int = DEFAULT_BPM) -> int:
     """Convert beat position to ticks."""
@@ -115,8 +50,8 @@ def json_to_midi(music_notes: MusicNotes, bpm: int = DEFAULT_BPM, output_path: s
         f.write(midi_bytes)
     return output_path
 
-def json_to_midi_bytes(music_notes: MusicNotes, bpm: int = DEFAULT_BPM) -> bytes:
-    """Convert MusicNotes JSON to MIDI bytes."""
+def json_to_midi_bytes_mido(music_notes: MusicNotes, bpm: int = DEFAULT_BPM) -> bytes:
+    """Convert MusicNotes JSON to MIDI bytes through mido messages (reference implementation)."""
     mid = MidiFile()
     tempo = bpm2tempo(bpm)
     mid.ticks_per_beat = TICKS_PER_BEAT
@@ -164,15 +99,16 @@ def json_to_midi_bytes(music_notes: MusicNotes, bpm: int = DEFAULT_BPM) -> bytes
             for bar in section.bars:
                 bar_num = bar.bar
                 for event in bar.events:
-                    beat, pitch, duration, velocity = event
+                    # Pitch and duration were resolved to a MIDI note and ticks on validation
+                    beat, midi_note, duration_ticks, velocity = event
                     # Calculate absolute beat position
                     absolute_beat = (bar_num - 1) * 4 + beat
                     start_ticks = int((absolute_beat - 1) * TICKS_PER_BEAT)
-                    duration_ticks = duration_to_ticks(duration, bpm)
 
                     is_perc = (channel_name == 'perc')
-                    midi_note = pitch_to_midi(pitch, is_perc)
-                    if midi_note >= 0:  # Not a rest
+                    if is_perc and midi_note == UNKNOWN_PITCH:
+                        midi_note = DEFAULT_PERCUSSION_PITCH  # Default to kick
+                    if midi_note <= 127:  # Not a rest or unknown pitch
                         # Adjust velocity for percussion to prevent overwhelming
                         adjusted_velocity = min(velocity, 80) if is_perc else velocity
                         events.append((start_ticks, 'note_on', midi_note, adjusted_velocity))
@@ -197,3 +133,181 @@ def json_to_midi_bytes(music_notes: MusicNotes, bpm: int = DEFAULT_BPM) -> bytes
     mid.save(file=buffer)
     buffer.seek(0)
     return buffer.read()
+
+
+# Direct Standard MIDI File encoder ---------------------------------------------
+
+NOTE_ON_STATUS = 0x90
+NOTE_OFF_STATUS = 0x80
+
+
+def _write_vlq(out: bytearray, value: int):
+    """Append a variable-length quantity (MIDI delta time) to out."""
+    if value < 0x80:
+        out.append(value)
+        return
+    buffer = [value & 0x7F]
+    value >>= 7
+    while value:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.extend(reversed(buffer))
+
+
+def _write_meta(out: bytearray, meta_type: int, data: bytes):
+    out.append(0)  # delta time
+    out.append(0xFF)
+    out.append(meta_type)
+    _write_vlq(out, len(data))
+    out.extend(data)
+
+
+def _collect_channel_columns(channel_data: ChannelNotes) -> Tuple[array, array, array, array]:
+    """Flatten a channel into columnar (tick, status, note, velocity) arrays, unsorted."""
+    ticks = array('l')
+    statuses = array('B')
+    notes = array('B')
+    velocities = array('B')
+    is_perc = (channel_data.channel == 'perc')
+    # Unknown percussion tokens play as a kick, like pitch_to_midi; other unknown pitches are skipped
+    unknown_note = DEFAULT_PERCUSSION_PITCH if is_perc else UNKNOWN_PITCH
+
+    for section in channel_data.sections:
+        for bar in section.bars:
+            bar_offset = (bar.bar - 1) * 4
+            events = bar.events
+            for beat, midi_note, duration_ticks, velocity in zip(
+                    events.beats, events.pitches, events.durations, events.velocities
+            ):
+                if midi_note == UNKNOWN_PITCH:
+                    midi_note = unknown_note
+                if midi_note > 127:  # Rest or unknown pitch
+                    continue
+                start_ticks = int((bar_offset + beat - 1) * TICKS_PER_BEAT)
+                # Adjust velocity for percussion to prevent overwhelming
+                adjusted_velocity = min(velocity, 80) if is_perc else velocity
+                ticks.append(start_ticks)
+                statuses.append(NOTE_ON_STATUS)
+                notes.append(midi_note)
+                velocities.append(adjusted_velocity)
+                ticks.append(start_ticks + duration_ticks)
+                statuses.append(NOTE_OFF_STATUS)
+                notes.append(midi_note)
+                velocities.append(0)
+    return ticks, statuses, notes, velocities
+
+
+def _encode_channel_events(
+        out: bytearray, columns: Tuple[array, array, array, array], channel_num: int, running_status: int
+) -> int:
+    """Sort columnar events by tick and append them to a track body; returns the running status."""
+    ticks, statuses, notes, velocities = columns
+    # Stable argsort by tick, so note_on/note_off at the same tick keep insertion order. About a
+    # tenth of the encode; sorting (tick << k) | index ints instead is slower overall in CPython,
+    # as packing and unpacking the keys costs more per event than the cheaper comparisons save
+    order = sorted(range(len(ticks)), key=ticks.__getitem__)
+
+    current_time = 0
+    for index in order:
+        event_time = ticks[index]
+        delta_time = event_time - current_time
+        if delta_time < 0:
+            raise ValueError(f"Event starts before the beginning of the track (tick {event_time})")
+        _write_vlq(out, delta_time)
+        status_byte = statuses[index] | channel_num
+        if status_byte != running_status:
+            out.append(status_byte)
+            running_status = status_byte
+        out.append(notes[index])
+        out.append(velocities[index])
+        current_time = event_time
+    return running_status
+
+
+def collect_unknown_pitches(music_notes: MusicNotes, percussion: Optional[bool] = None) -> Dict[str, int]:
+    """
+    Count the pitch tokens no table recognised, per token, across the whole piece.
+
+    :param percussion: Only count the perc channel (True) or only the other channels (False);
+        None counts every channel
+    """
+    unknown = Counter()
+    for channel_data in music_notes.channels:
+        if percussion is not None and (channel_data.channel == 'perc') != percussion:
+            continue
+        for section in channel_data.sections:
+            for bar in section.bars:
+                if bar.events.unknown_pitches:
+                    unknown.update(bar.events.unknown_pitches.values())
+    return dict(unknown)
+
+
+@traced()
+@observe_stage("midi_encode")
+def json_to_midi_bytes(music_notes: MusicNotes, bpm: int = DEFAULT_BPM) -> bytes:
+    """
+    Convert MusicNotes JSON to MIDI bytes.
+
+    Encodes the Standard MIDI File directly from columnar event arrays instead of building a
+    mido Message per event; output is byte-identical to json_to_midi_bytes_mido. Events with
+    unknown pitches are skipped, or played as a kick on the perc channel, and reported in a
+    single warning.
+    """
+    tempo = bpm2tempo(bpm)
+
+    # Assign tracks and MIDI channels exactly like the mido path
+    track_bodies: List[bytearray] = []
+    track_running_status: List[int] = []
+    channel_tracks = {}
+    channel_numbers = {}
+    percussion_channel = 9
+    next_channel = 0
+
+    for channel_data in music_notes.channels:
+        channel_name = channel_data.channel
+        if channel_name == 'perc':
+            channel_num = percussion_channel
+        else:
+            channel_num = next_channel
+            next_channel += 1
+            if next_channel == 9:  # Skip percussion channel
+                next_channel = 10
+        if not 0 <= channel_num <= 15:
+            raise ValueError(f"Too many channels: MIDI channel {channel_num} is out of range")
+
+        body = bytearray()
+        _write_meta(body, 0x03, channel_name.encode('latin1'))  # track_name
+        channel_tracks[channel_name] = len(track_bodies)
+        channel_numbers[channel_name] = channel_num
+        track_bodies.append(body)
+        track_running_status.append(-1)
+
+    if track_bodies:
+        _write_meta(track_bodies[0], 0x51, tempo.to_bytes(3, 'big'))  # set_tempo
+
+    for channel_data in music_notes.channels:
+        track_index = channel_tracks[channel_data.channel]
+        columns = _collect_channel_columns(channel_data)
+        track_running_status[track_index] = _encode_channel_events(
+            track_bodies[track_index], columns,
+            channel_numbers[channel_data.channel], track_running_status[track_index]
+        )
+
+    out = bytearray(b'MThd')
+    out.extend(struct.pack('>Lhhh', 6, 1, len(track_bodies), TICKS_PER_BEAT))
+    for body in track_bodies:
+        _write_meta(body, 0x2F, b'')  # end_of_track
+        out.extend(b'MTrk')
+        out.extend(struct.pack('>L', len(body)))
+        out.extend(body)
+
+    skipped = collect_unknown_pitches(music_notes, percussion=False)
+    defaulted = collect_unknown_pitches(music_notes, percussion=True)
+    reports = []
+    if skipped:
+        reports.append(f"Skipped {sum(skipped.values())} events with unknown pitches: {skipped}")
+    if defaulted:
+        reports.append(f"Played {sum(defaulted.values())} unknown percussion events as kick: {defaulted}")
+    if reports:
+        logging.warning("; ".join(reports))
+    return bytes(out)
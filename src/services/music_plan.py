@@ -1,28 +1,51 @@
+import json
 from .llm import llm_service, LlmService
 from ..prompts.music_plan import *
 from ..prompts.base import BASE_CONTEXT_PROMPT
-from typing import Optional
+from typing import Optional, Callable, List
 from openai.types.chat import ChatCompletion
+from pydantic import BaseModel, create_model, model_validator
 from ..logger import app_logger
 from ..schemas.openrouter import PromptRequest, CompletionKwargs
-from ..schemas.music import MusicPlan, MusicChords, MusicRhythm
-import json
+from ..schemas.music import (
+    MusicPlan, MusicChords, MusicRhythm, RhythmSection, MusicPlanResponse, PlanMode,
+    MusicChordsRhythm, MusicPlanChordsRhythm,
+)
+from .artifacts import artifact_store, ArtifactStore
+from .circuit_breaker import LlmError
+from ..config import app_settings
 from ..utils import timeit
 
 
 class MusicPlanService:
-    def __init__(self, llm_service: LlmService):
+    """
+    Plan, chords and rhythm stages. Every later stage depends on these, so a failed LLM call
+    raises LlmError with its reason (rate limited, model down, invalid answer) instead of
+    returning None.
+
+    The stages run as three sequential calls by default; `plan_mode` can fuse chords and rhythm
+    (PlanMode.FUSED) or all three (PlanMode.FAST) into one call with a combined schema, which
+    saves the round trips and the re-serialized stage outputs in the next prompt.
+    """
+
+    def __init__(
+        self,
+        llm_service: LlmService,
+        artifact_store: Optional[ArtifactStore] = None,
+        plan_mode: PlanMode = PlanMode.STAGED
+    ):
         self.llm_service = llm_service
+        self.artifact_store = artifact_store
+        # Plan mode of requests that do not pick one
+        self.plan_mode = plan_mode
 
-    @timeit
-    def generate_music_plan_given_description(
+    def _build_music_plan_request(
         self,
         description: str,
         music_parameters: Optional[dict] = None,
         model: str = None,
         kwargs: dict = None,
-    ) -> Optional[MusicPlan]:
-        app_logger.info("Generating music plan from description")
+    ) -> PromptRequest:
         if not description:
             description = MUSIC_PLAN_USER_DESCRIPTION
         if not music_parameters:
@@ -41,11 +64,61 @@ class MusicPlanService:
             response_format=MusicPlan,
             kwargs=completion_kwargs
         )
-        response = self.llm_service.prompt_llm(prompt_request)
+        return prompt_request
+
+    @timeit(stage="plan")
+    def generate_music_plan_given_description(
+        self,
+        description: str,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None,
+    ) -> Optional[MusicPlan]:
+        app_logger.info("Generating music plan from description")
+        prompt_request = self._build_music_plan_request(description, music_parameters, model, kwargs)
+        response = self.llm_service.prompt_llm(prompt_request, raise_errors=True)
         app_logger.info("Music plan generation completed")
         return response
 
-    @timeit
+    @timeit(stage="plan")
+    async def generate_music_plan_given_description_async(
+        self,
+        description: str,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None,
+    ) -> Optional[MusicPlan]:
+        app_logger.info("Generating music plan from description")
+        prompt_request = self._build_music_plan_request(description, music_parameters, model, kwargs)
+        response = await self.llm_service.prompt_llm_async(prompt_request, raise_errors=True)
+        app_logger.info("Music plan generation completed")
+        return response
+
+    def _build_music_chords_request(
+        self,
+        music_plan: MusicPlan,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> PromptRequest:
+        if not music_parameters:
+            music_parameters = MUSIC_PLAN_USER_PARAMETERS
+        prompt = DEFINE_CHORD_PROMPT.replace(MUSIC_PLAN_INPUT, music_plan.model_dump_json()).replace(
+            MUSIC_PLAN_USER_PARAMETERS, str(music_parameters)
+        )
+        completion_kwargs = CompletionKwargs(
+            **(kwargs or {})
+        )
+        prompt_request = PromptRequest(
+            user_messages=prompt,
+            system_messages=BASE_CONTEXT_PROMPT,
+            model=model,
+            response_format=MusicChords,
+            kwargs=completion_kwargs
+        )
+        return prompt_request
+
+    @timeit(stage="chords")
     def generate_music_chords_given_plan(
         self, 
         music_plan: MusicPlan, 
@@ -54,9 +127,35 @@ class MusicPlanService:
         kwargs: dict = None
     ) -> Optional[MusicChords]:
         app_logger.info("Generating music chords from music plan")
+        prompt_request = self._build_music_chords_request(music_plan, music_parameters, model, kwargs)
+        response = self.llm_service.prompt_llm(prompt_request, raise_errors=True)
+        app_logger.info("Music chords generation completed")
+        return response
+
+    @timeit(stage="chords")
+    async def generate_music_chords_given_plan_async(
+        self,
+        music_plan: MusicPlan,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> Optional[MusicChords]:
+        app_logger.info("Generating music chords from music plan")
+        prompt_request = self._build_music_chords_request(music_plan, music_parameters, model, kwargs)
+        response = await self.llm_service.prompt_llm_async(prompt_request, raise_errors=True)
+        app_logger.info("Music chords generation completed")
+        return response
+
+    def _build_music_rhythm_request(
+        self,
+        music_chords: MusicChords,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> PromptRequest:
         if not music_parameters:
             music_parameters = MUSIC_PLAN_USER_PARAMETERS
-        prompt = DEFINE_CHORD_PROMPT.replace(MUSIC_PLAN_INPUT, music_plan.model_dump_json()).replace(
+        prompt = DEFINE_RHYTHM_PROMPT.replace(MUSIC_CHORDS_INPUT, music_chords.model_dump_json()).replace(
             MUSIC_PLAN_USER_PARAMETERS, str(music_parameters)
         )
         completion_kwargs = CompletionKwargs(
@@ -66,14 +165,12 @@ class MusicPlanService:
             user_messages=prompt,
             system_messages=BASE_CONTEXT_PROMPT,
             model=model,
-            response_format=MusicChords,
-            kwargs=completion_kwargs
+            response_format=MusicRhythm,
+            kwargs=completion_kwargs,
         )
-        response = self.llm_service.prompt_llm(prompt_request)
-        app_logger.info("Music chords generation completed")
-        return response
+        return prompt_request
 
-    @timeit
+    @timeit(stage="rhythm")
     def generate_music_rhythm_given_chords(
         self, 
         music_chords: MusicChords, 
@@ -82,11 +179,108 @@ class MusicPlanService:
         kwargs: dict = None
     ) -> Optional[MusicRhythm]:
         app_logger.info("Generating music rhythm from music chords")
+        prompt_request = self._build_music_rhythm_request(music_chords, music_parameters, model, kwargs)
+        response = self.llm_service.prompt_llm(prompt_request, raise_errors=True)
+        app_logger.info("Music rhythm generation completed")
+        return response
+
+    @timeit(stage="rhythm")
+    async def generate_music_rhythm_given_chords_async(
+        self,
+        music_chords: MusicChords,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> Optional[MusicRhythm]:
+        app_logger.info("Generating music rhythm from music chords")
+        prompt_request = self._build_music_rhythm_request(music_chords, music_parameters, model, kwargs)
+        response = await self.llm_service.prompt_llm_async(prompt_request, raise_errors=True)
+        app_logger.info("Music rhythm generation completed")
+        return response
+
+    @timeit(stage="rhythm")
+    async def stream_music_rhythm_given_chords_async(
+        self,
+        music_chords: MusicChords,
+        on_section: Callable[[RhythmSection], None],
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> MusicRhythm:
+        """
+        generate_music_rhythm_given_chords_async streaming the answer: `on_section` is called with
+        each rhythm section as soon as the LLM has moved on to the next one, so later stages can
+        start while the rest of the rhythm is still being written. If streaming fails, the rhythm
+        is requested again without streaming; answers that do not start with the sections already
+        emitted are re-asked, and only the sections after them are emitted.
+
+        :raises LlmError: if the rhythm could not be generated
+        """
+        app_logger.info("Streaming music rhythm from music chords")
+        prompt_request = self._build_music_rhythm_request(music_chords, music_parameters, model, kwargs)
+        sent: List[RhythmSection] = []
+
+        def emit(section: RhythmSection):
+            sent.append(section)
+            on_section(section)
+
+        def on_partial(partial):
+            _emit_complete_sections(getattr(partial, "sections", None), len(sent), emit)
+
+        try:
+            response = await self.llm_service.prompt_llm_streaming_async(prompt_request, on_partial, raise_errors=True)
+        except LlmError as e:
+            app_logger.warning(f"Streaming the music rhythm failed ({e}), retrying without streaming")
+            if sent:
+                prompt_request = _resume_request(
+                    prompt_request, MusicRhythm(sections=sent).model_dump(),
+                    lambda rhythm: _check_sent_sections(rhythm, sent)
+                )
+            response = await self.llm_service.prompt_llm_async(prompt_request, raise_errors=True)
+        for section in response.sections[len(sent):]:
+            on_section(section)
+        app_logger.info("Music rhythm generation completed")
+        return response
+
+    async def generate_music_chords_given_description_async(
+        self,
+        description: str,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> tuple[MusicPlan, MusicChords]:
+        """
+        Run plan -> chords, the stages before the rhythm.
+
+        :raises LlmError: if either stage fails
+        """
+        music_plan = await self.generate_music_plan_given_description_async(
+            description=description, music_parameters=music_parameters, model=model, kwargs=kwargs
+        )
+        music_chords = await self.generate_music_chords_given_plan_async(
+            music_plan=music_plan, music_parameters=music_parameters, model=model, kwargs=kwargs
+        )
+        return music_plan, music_chords
+
+    def _build_fused_request(
+        self,
+        description: str,
+        music_plan: Optional[MusicPlan] = None,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> PromptRequest:
         if not music_parameters:
             music_parameters = MUSIC_PLAN_USER_PARAMETERS
-        prompt = DEFINE_RHYTHM_PROMPT.replace(MUSIC_CHORDS_INPUT, music_chords.model_dump_json()).replace(
-            MUSIC_PLAN_USER_PARAMETERS, str(music_parameters)
-        )
+        if music_plan is not None:
+            prompt = DEFINE_FUSED_CHORDS_RHYTHM_PROMPT.replace(MUSIC_PLAN_INPUT, music_plan.model_dump_json())
+            response_format = MusicChordsRhythm
+        else:
+            prompt = DEFINE_FUSED_MUSIC_PLAN_PROMPT.replace(
+                MUSIC_PLAN_USER_DESCRIPTION, description or MUSIC_PLAN_USER_DESCRIPTION
+            )
+            response_format = MusicPlanChordsRhythm
+        prompt = prompt.replace(MUSIC_PLAN_USER_PARAMETERS, str(music_parameters))
         completion_kwargs = CompletionKwargs(
             **(kwargs or {})
         )
@@ -94,20 +288,157 @@ class MusicPlanService:
             user_messages=prompt,
             system_messages=BASE_CONTEXT_PROMPT,
             model=model,
-            response_format=MusicRhythm,
+            response_format=response_format,
             kwargs=completion_kwargs,
         )
-        response = self.llm_service.prompt_llm(prompt_request)
-        app_logger.info("Music rhythm generation completed")
-        return response
+        return prompt_request
+
+    @timeit(stage="fused")
+    def generate_fused_music_plan(
+        self,
+        description: str,
+        music_plan: Optional[MusicPlan] = None,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> tuple[MusicPlan, MusicChords, MusicRhythm]:
+        """
+        Chords and rhythm in one LLM call, and the plan as well unless `music_plan` is given.
+
+        :raises LlmError: if the call fails
+        """
+        app_logger.info("Generating fused music " + ("chords and rhythm" if music_plan else "plan, chords and rhythm"))
+        prompt_request = self._build_fused_request(description, music_plan, music_parameters, model, kwargs)
+        response = self.llm_service.prompt_llm(prompt_request, raise_errors=True)
+        app_logger.info("Fused music plan generation completed")
+        return music_plan or response.music_plan, response.music_chords, response.music_rhythm
+
+    @timeit(stage="fused")
+    async def generate_fused_music_plan_async(
+        self,
+        description: str,
+        music_plan: Optional[MusicPlan] = None,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> tuple[MusicPlan, MusicChords, MusicRhythm]:
+        app_logger.info("Generating fused music " + ("chords and rhythm" if music_plan else "plan, chords and rhythm"))
+        prompt_request = self._build_fused_request(description, music_plan, music_parameters, model, kwargs)
+        response = await self.llm_service.prompt_llm_async(prompt_request, raise_errors=True)
+        app_logger.info("Fused music plan generation completed")
+        return music_plan or response.music_plan, response.music_chords, response.music_rhythm
+
+    @timeit(stage="fused")
+    async def stream_fused_music_plan_async(
+        self,
+        description: str,
+        on_plan: Callable[[MusicPlan, MusicChords], None],
+        on_section: Callable[[RhythmSection], None],
+        music_plan: Optional[MusicPlan] = None,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None
+    ) -> tuple[MusicPlan, MusicChords, MusicRhythm]:
+        """
+        generate_fused_music_plan_async streaming the answer: `on_plan` is called with the plan
+        and chords once the LLM starts on the rhythm, then `on_section` with each rhythm section
+        as in stream_music_rhythm_given_chords_async, including its retry without streaming.
+
+        :raises LlmError: if the call fails
+        """
+        app_logger.info("Streaming fused music plan")
+        prompt_request = self._build_fused_request(description, music_plan, music_parameters, model, kwargs)
+        plan_sent: Optional[tuple[MusicPlan, MusicChords]] = None
+        sent: List[RhythmSection] = []
+
+        def send_plan(plan: MusicPlan, chords: MusicChords):
+            nonlocal plan_sent
+            plan_sent = plan, chords
+            on_plan(plan, chords)
+
+        def emit(section: RhythmSection):
+            sent.append(section)
+            on_section(section)
+
+        def on_partial(partial):
+            rhythm = getattr(partial, "music_rhythm", None)
+            # Fields not reached yet are None or an empty dict placeholder, not a partial model
+            if not isinstance(rhythm, BaseModel):
+                return
+            # Plan and chords are written before the rhythm, so they are complete by now
+            if not plan_sent:
+                send_plan(
+                    music_plan or MusicPlan.model_validate(partial.music_plan.model_dump()),
+                    MusicChords.model_validate(partial.music_chords.model_dump()),
+                )
+            _emit_complete_sections(getattr(rhythm, "sections", None), len(sent), emit)
+
+        def check_sent(response: BaseModel):
+            plan, chords = plan_sent
+            if music_plan is None and response.music_plan != plan:
+                raise ValueError("music_plan must be the one already sent, unchanged")
+            if response.music_chords != chords:
+                raise ValueError("music_chords must be the ones already sent, unchanged")
+            _check_sent_sections(response.music_rhythm, sent)
+
+        try:
+            response = await self.llm_service.prompt_llm_streaming_async(prompt_request, on_partial, raise_errors=True)
+        except LlmError as e:
+            app_logger.warning(f"Streaming the fused music plan failed ({e}), retrying without streaming")
+            if plan_sent:
+                answer = {
+                    "music_chords": plan_sent[1].model_dump(),
+                    "music_rhythm": MusicRhythm(sections=sent).model_dump(),
+                }
+                if music_plan is None:
+                    answer = {"music_plan": plan_sent[0].model_dump(), **answer}
+                prompt_request = _resume_request(prompt_request, answer, check_sent)
+            response = await self.llm_service.prompt_llm_async(prompt_request, raise_errors=True)
+        result = music_plan or response.music_plan, response.music_chords, response.music_rhythm
+        if not plan_sent:
+            send_plan(result[0], result[1])
+        for section in response.music_rhythm.sections[len(sent):]:
+            on_section(section)
+        app_logger.info("Fused music plan generation completed")
+        return result
 
     def generate_music_rhythm_given_description(
         self, 
         description: str, 
         music_parameters: Optional[dict] = None, 
         model: str = None, 
-        kwargs: dict = None
+        kwargs: dict = None,
+        on_stage: Optional[Callable[[str], None]] = None,
+        run_id: Optional[str] = None,
+        plan_mode: Optional[PlanMode] = None
     ) -> tuple[Optional[MusicPlan], Optional[MusicRhythm]]:
+        """
+        Run plan -> chords -> rhythm sequentially.
+
+        :param on_stage: Optional callback invoked with the stage name ("plan", "chords", "rhythm")
+            before each stage starts; a fused call reports the first stage it covers
+        :param run_id: Run id to record the plan artifact under; a new one is used if omitted
+        :param plan_mode: Stages per LLM call; the service default if omitted
+        """
+        plan_mode = plan_mode or self.plan_mode
+        if plan_mode != PlanMode.STAGED:
+            music_plan = None
+            if plan_mode == PlanMode.FUSED:
+                if on_stage:
+                    on_stage("plan")
+                music_plan = self.generate_music_plan_given_description(
+                    description=description, music_parameters=music_parameters, model=model, kwargs=kwargs
+                )
+            if on_stage:
+                on_stage("chords" if music_plan else "plan")
+            music_plan, music_chords, rhythm_response = self.generate_fused_music_plan(
+                description, music_plan, music_parameters=music_parameters, model=model, kwargs=kwargs
+            )
+            self.save_music_plan(run_id, description, music_plan, music_chords, rhythm_response)
+            return music_plan, rhythm_response
+
+        if on_stage:
+            on_stage("plan")
         music_plan = self.generate_music_plan_given_description(
             description=description, music_parameters=music_parameters, model=model, kwargs=kwargs
         )
@@ -115,6 +446,8 @@ class MusicPlanService:
             app_logger.error(
                 "Failed to generate music plan; cannot proceed to rhythm generation")
             return None
+        if on_stage:
+            on_stage("chords")
         music_chords = self.generate_music_chords_given_plan(
             music_plan=music_plan, music_parameters=music_parameters, model=model, kwargs=kwargs
         )
@@ -122,6 +455,8 @@ class MusicPlanService:
             app_logger.error(
                 "Failed to generate music chords; cannot proceed to rhythm generation")
             return None
+        if on_stage:
+            on_stage("rhythm")
         rhythm_response = self.generate_music_rhythm_given_chords(
             music_chords=music_chords, music_parameters=music_parameters, model=model, kwargs=kwargs
         )
@@ -129,19 +464,123 @@ class MusicPlanService:
             app_logger.error("Failed to generate music rhythm")
             return None
 
-        with open("music_plan.json", "w") as f:
-            json.dump(
-                {
-                    "description": description,
-                    # Load json string to dict/list
-                    "music_plan": music_plan.model_dump(),
-                    "music_chords": music_chords.model_dump(),
-                    "music_rhythm": rhythm_response.model_dump()
-                },
-                f,
-                indent=4,
+        self.save_music_plan(run_id, description, music_plan, music_chords, rhythm_response)
+        return music_plan, rhythm_response
+
+    async def generate_music_rhythm_given_description_async(
+        self,
+        description: str,
+        music_parameters: Optional[dict] = None,
+        model: str = None,
+        kwargs: dict = None,
+        run_id: Optional[str] = None,
+        plan_mode: Optional[PlanMode] = None
+    ) -> tuple[Optional[MusicPlan], Optional[MusicRhythm]]:
+        plan_mode = plan_mode or self.plan_mode
+        if plan_mode != PlanMode.STAGED:
+            music_plan = None
+            if plan_mode == PlanMode.FUSED:
+                music_plan = await self.generate_music_plan_given_description_async(
+                    description=description, music_parameters=music_parameters, model=model, kwargs=kwargs
+                )
+            music_plan, music_chords, rhythm_response = await self.generate_fused_music_plan_async(
+                description, music_plan, music_parameters=music_parameters, model=model, kwargs=kwargs
             )
+            self.save_music_plan(run_id, description, music_plan, music_chords, rhythm_response)
+            return music_plan, rhythm_response
+
+        music_plan = await self.generate_music_plan_given_description_async(
+            description=description, music_parameters=music_parameters, model=model, kwargs=kwargs
+        )
+        if not music_plan:
+            app_logger.error(
+                "Failed to generate music plan; cannot proceed to rhythm generation")
+            return None
+        music_chords = await self.generate_music_chords_given_plan_async(
+            music_plan=music_plan, music_parameters=music_parameters, model=model, kwargs=kwargs
+        )
+        if not music_chords:
+            app_logger.error(
+                "Failed to generate music chords; cannot proceed to rhythm generation")
+            return None
+        rhythm_response = await self.generate_music_rhythm_given_chords_async(
+            music_chords=music_chords, music_parameters=music_parameters, model=model, kwargs=kwargs
+        )
+        if not rhythm_response:
+            app_logger.error("Failed to generate music rhythm")
+            return None
+
+        self.save_music_plan(run_id, description, music_plan, music_chords, rhythm_response)
         return music_plan, rhythm_response
 
+    def save_music_plan(
+        self,
+        run_id: Optional[str],
+        description: str,
+        music_plan: MusicPlan,
+        music_chords: MusicChords,
+        rhythm_response: MusicRhythm
+    ):
+        """
+        Record the plan, chords and rhythm as the music_plan artifact of a run, in the background.
+        """
+        if not self.artifact_store:
+            return
+        self.artifact_store.save(
+            run_id or self.artifact_store.new_run_id(),
+            "music_plan",
+            MusicPlanResponse(
+                description=description,
+                music_plan=music_plan,
+                music_chords=music_chords,
+                music_rhythm=rhythm_response
+            )
+        )
+
+
+def _emit_complete_sections(
+    sections: Optional[List], emitted: int, on_section: Callable[[RhythmSection], None]
+) -> int:
+    """
+    Pass the streamed rhythm sections not emitted yet to `on_section`, except the last one, which
+    may still be incomplete; returns the new count of emitted sections.
+    """
+    sections = sections or []
+    while emitted < len(sections) - 1:
+        on_section(RhythmSection.model_validate(sections[emitted].model_dump()))
+        emitted += 1
+    return emitted
+
+
+def _check_sent_sections(rhythm: MusicRhythm, sent: List[RhythmSection]):
+    """Raise ValueError unless `rhythm` starts with the sections already emitted."""
+    if rhythm.sections[:len(sent)] != sent:
+        raise ValueError(f"the first {len(sent)} sections must be the ones already sent, unchanged")
+
+
+def _resume_request(
+    prompt_request: PromptRequest, sent: dict, check: Callable[[BaseModel], None]
+) -> PromptRequest:
+    """
+    The non-streamed retry of a streamed call whose first part `sent` was already passed on: the
+    prompt asks to start with it, and `check` runs as a validator of the answer, so answers that
+    changed it are re-asked like any other invalid answer.
+    """
+    def starts_with_sent(response):
+        check(response)
+        return response
+
+    response_format = create_model(
+        prompt_request.response_format.__name__,
+        __base__=prompt_request.response_format,
+        __validators__={"starts_with_sent": model_validator(mode="after")(starts_with_sent)},
+    )
+    prompt = prompt_request.user_messages + RESUME_STREAMED_ANSWER_PROMPT.replace(
+        STREAMED_ANSWER_INPUT, json.dumps(sent)
+    )
+    return prompt_request.model_copy(update={"user_messages": prompt, "response_format": response_format})
+
 
-music_plan_service = MusicPlanService(llm_service=llm_service)
+music_plan_service = MusicPlanService(
+    llm_service=llm_service, artifact_store=artifact_store, plan_mode=PlanMode(app_settings.plan_mode)
+)
@@ -0,0 +1,219 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ConfigDict, model_validator
+from ..logger import app_logger
+from ..metrics import NOTE_REPAIRS, NOTE_REPAIR_FIXES
+from ..prompts.notes_gen import ALLOWED_DURATIONS
+from ..schemas.music import SectionChannelsResponse
+from ..schemas.note_events import DURATION_BEATS, duration_ticks
+from ..tracing import current_span
+
+# Velocity of events the LLM gave none
+DEFAULT_VELOCITY = 80
+
+# Note value words in beats, for durations outside DURATION_BEATS such as `32nd-triplet`
+_NOTE_VALUE_BEATS = {
+    'whole': 4, 'half': 2, 'quarter': 1, 'crotchet': 1, 'eighth': 0.5, '8th': 0.5, 'quaver': 0.5,
+    'sixteenth': 0.25, '16th': 0.25, 'semiquaver': 0.25, '32nd': 0.125, '64th': 0.0625,
+}
+_NOTE_VALUE_MODIFIERS = {'dotted': 1.5, 'triplet': 2 / 3}
+_FRACTION = re.compile(r"^(\d+)/(\d+)$")
+
+
+def duration_beats(token: Any) -> Optional[float]:
+    """
+    Length in beats of a duration the tables do not know: a number of beats, a fraction of a
+    whole note (`1/8`) or note value words with modifiers (`32nd-triplet`, `dotted 8th note`).
+    None if nothing can be made of it.
+    """
+    if isinstance(token, bool):
+        return None
+    if isinstance(token, (int, float)):
+        return float(token) if token > 0 else None
+    if not isinstance(token, str):
+        return None
+    text = token.strip().lower().replace('-', '_').replace(' ', '_')
+    text = text.replace('thirty_second', '32nd').replace('sixty_fourth', '64th')
+    try:
+        beats = float(text)
+        return beats if beats > 0 else None
+    except ValueError:
+        pass
+    fraction = _FRACTION.match(text)
+    if fraction:
+        numerator, denominator = map(int, fraction.groups())
+        return 4 * numerator / denominator if numerator and denominator else None
+    beats, factor = None, 1.0
+    for word in filter(None, re.split(r"[_.]+", text)):
+        if word in _NOTE_VALUE_BEATS and beats is None:
+            beats = _NOTE_VALUE_BEATS[word]
+        elif word in _NOTE_VALUE_MODIFIERS:
+            factor *= _NOTE_VALUE_MODIFIERS[word]
+        elif word not in ('note', 'notes'):
+            return None
+    return beats * factor if beats is not None else None
+
+
+def snap_duration(token: Any) -> Optional[str]:
+    """
+    Nearest allowed duration (by ratio) to a duration token, or None if it is not a duration.
+    """
+    beats = duration_beats(token)
+    if beats is None:
+        return None
+    return min(ALLOWED_DURATIONS, key=lambda name: abs(math.log(beats / DURATION_BEATS[name])))
+
+
+def repair_velocity(velocity: Any, fixes: List[str]) -> int:
+    """
+    Velocity as an int in 0..127: missing ones get DEFAULT_VELOCITY, numbers and numeric strings
+    are rounded and clamped.
+
+    :raises ValueError: if it is not a number
+    """
+    if velocity is None:
+        fixes.append("missing_velocity")
+        return DEFAULT_VELOCITY
+    if type(velocity) is not int:
+        if isinstance(velocity, bool):
+            raise ValueError(f"velocity must be a number, got {velocity!r}")
+        velocity = round(float(velocity))
+        fixes.append("velocity_type")
+    if not 0 <= velocity <= 127:
+        fixes.append("velocity_clamped")
+        velocity = min(max(velocity, 0), 127)
+    return velocity
+
+
+def repair_duration(duration: Any, fixes: List[str]) -> str:
+    """
+    :raises ValueError: if the duration cannot be read as a length
+    """
+    if isinstance(duration, str):
+        try:
+            duration_ticks(duration)
+            return duration
+        except ValueError:
+            pass
+    snapped = snap_duration(duration)
+    if snapped is None:
+        raise ValueError(f"unknown duration {duration!r}")
+    fixes.append("duration_snapped")
+    return snapped
+
+
+def repair_event(event: Any) -> Tuple[list, List[str]]:
+    """
+    Repair one raw `[beat, pitch, duration, velocity]` event.
+
+    Accepts `{"beat", "pitch", "duration", "velocity"}` objects and a missing velocity, parses
+    stringified numbers, snaps durations to ALLOWED_DURATIONS and clamps velocities.
+
+    :return: The event and the names of the fixes applied, empty if it was valid
+    :raises ValueError: if the event cannot be repaired
+    """
+    fixes = []
+    if isinstance(event, dict):
+        event = [event.get(key) for key in ("beat", "pitch", "duration", "velocity")]
+        fixes.append("event_object")
+    if not isinstance(event, (list, tuple)) or not 3 <= len(event) <= 5:
+        raise ValueError(f"event must be [beat, pitch, duration, velocity], got {event!r}")
+    if len(event) == 5:
+        fixes.append("extra_field")
+    beat, pitch, duration = event[:3]
+    velocity = event[3] if len(event) > 3 else None
+
+    if isinstance(beat, str):
+        beat = float(beat)
+        fixes.append("beat_type")
+    elif isinstance(beat, bool) or not isinstance(beat, (int, float)):
+        raise ValueError(f"beat must be a number, got {beat!r}")
+    if isinstance(pitch, float) and pitch.is_integer():
+        pitch = int(pitch)
+        fixes.append("pitch_type")
+    elif isinstance(pitch, str) and pitch.strip().isdigit():
+        pitch = int(pitch)
+        fixes.append("pitch_type")
+    elif pitch is None:
+        raise ValueError("event has no pitch")
+    duration = repair_duration(duration, fixes)
+    velocity = repair_velocity(velocity, fixes)
+    return [beat, pitch, duration, velocity], fixes
+
+
+def repair_section_channels(data: Any) -> Tuple[Any, Counter]:
+    """
+    Repair every event of a raw SectionChannelsResponse dict; the rest of the structure is
+    left for validation to judge.
+
+    :return: The repaired data and a count of fixes by name
+    :raises ValueError: if an event cannot be repaired
+    """
+    fixes = Counter()
+    if not isinstance(data, dict) or not isinstance(data.get("channels"), list):
+        return data, fixes
+    channels = []
+    for channel in data["channels"]:
+        if isinstance(channel, dict) and isinstance(channel.get("sections"), list):
+            channel = {**channel, "sections": [_repair_section(section, fixes) for section in channel["sections"]]}
+        channels.append(channel)
+    return {**data, "channels": channels}, fixes
+
+
+def _repair_section(section: Any, fixes: Counter) -> Any:
+    if not isinstance(section, dict) or not isinstance(section.get("bars"), list):
+        return section
+    bars = []
+    for bar in section["bars"]:
+        if isinstance(bar, dict) and isinstance(bar.get("events"), list):
+            events = []
+            for event in bar["events"]:
+                event, event_fixes = repair_event(event)
+                fixes.update(event_fixes)
+                events.append(event)
+            bar = {**bar, "events": events}
+        bars.append(bar)
+    return {**section, "bars": bars}
+
+
+def record_repair(note_format: str, outcome: str, fixes: Optional[Dict[str, int]] = None):
+    """
+    Count a repair pass that saved a re-prompt (repaired) or could not (failed).
+    """
+    NOTE_REPAIRS.inc(format=note_format, outcome=outcome)
+    for fix, count in (fixes or {}).items():
+        NOTE_REPAIR_FIXES.inc(count, fix=fix)
+    span = current_span()
+    if span is not None:
+        span.set_attribute("note_repair", outcome)
+    if outcome == "repaired":
+        app_logger.info(f"Repaired {note_format} note output instead of re-prompting: {dict(fixes or {})}")
+
+
+# SectionChannelsResponse that repairs near-valid LLM output (see repair_event) before giving up,
+# so a stray `32nd-triplet` or velocity 130 costs no re-prompt. Only output that is still invalid
+# after repair fails validation and is re-asked. No docstring: it would become the schema
+# description sent to the LLM.
+class RepairedSectionChannelsResponse(SectionChannelsResponse):
+    # Same schema, and so the same prompt, as SectionChannelsResponse
+    model_config = ConfigDict(title="SectionChannelsResponse")
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _repair_invalid_events(cls, data: Any, handler):
+        try:
+            return handler(data)
+        except ValueError as error:
+            original_error = error
+        try:
+            repaired, fixes = repair_section_channels(data)
+            response = handler(repaired) if fixes else None
+        except ValueError:
+            response = None
+        if response is None:
+            record_repair("json", "failed")
+            raise original_error
+        record_repair("json", "repaired", fixes)
+        return response
@@ -1,33 +1,132 @@
 from .llm import llm_service, LlmService
-from ..prompts.notes_gen import generate_note_events_prompt
+from ..prompts.notes_gen import generate_note_events_prompt, generate_compact_note_events_prompt
 from ..prompts.base import BASE_CONTEXT_PROMPT
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Callable, AsyncIterator, Tuple, Iterable
 from ..logger import app_logger
 from ..schemas.openrouter import PromptRequest, CompletionKwargs
-from ..schemas.music import MusicPlan, MusicRhythm, SectionNotes, ChannelNotes, MusicNotes, SectionChannelsResponse
+from ..schemas.music import MusicPlan, MusicRhythm, SectionNotes, ChannelNotes, MusicNotes, SectionChannelsResponse, NoteFormat
+from .artifacts import artifact_store, ArtifactStore
+from .compact_notes import parse_compact_notes, repair_compact_notes
+from .note_repair import RepairedSectionChannelsResponse
+from .section_timeline import repeat_sources, bar_offsets, place_section_notes
+from ..metrics import NOTE_SECTIONS_REUSED
+from ..config import app_settings
+from ..utils import timeit, estimate_tokens
+import asyncio
 import json
-from ..utils import timeit
 import concurrent.futures
+import contextvars
+import random
 
 
 class NotesGenService:
-    def __init__(self, llm_service: LlmService):
+    def __init__(
+            self,
+            llm_service: LlmService,
+            artifact_store: Optional[ArtifactStore] = None,
+            slice_context: bool = True,
+            note_format: NoteFormat = NoteFormat.JSON,
+            repair: bool = True,
+            max_section_workers: int = 32,
+            dedup_repeats: bool = True
+    ):
         self.llm_service = llm_service
+        self.artifact_store = artifact_store
+        self.slice_context = slice_context
+        # Wire format the LLM answers in when a request does not pick one
+        self.note_format = note_format
+        # Fix near-valid note output locally; only what cannot be fixed is re-prompted
+        self.repair = repair
+        # Generate repeated sections (A-B-A, a returning chorus) once and copy their notes
+        self.dedup_repeats = dedup_repeats
+        # Threads per sync generation. Each generation gets its own, so all its section calls
+        # reach the LLM rate limiter, whose round-robin across requests decides which goes next;
+        # a pool shared by all generations would serve them first come, first served
+        self.max_section_workers = max_section_workers
 
-    @timeit
-    def generate_section_notes_given_music_rhythm(
+    def _section_context(
+            self, section_name: str, music_plan: MusicPlan, music_rhythm: MusicRhythm
+    ) -> Tuple[str, str]:
+        """
+        Plan and rhythm prompt inputs for one section.
+
+        Sliced to the section's own RhythmSection plus a short summary of its neighbours for
+        transitions, and to the plan structure/motifs of those sections; the global plan fields
+        (style, tempo, key, instruments, ...) are always kept. Without slicing every section
+        prompt carries the whole plan and rhythm, so prompt tokens grow with sections squared.
+        """
+        sections = music_rhythm.sections
+        index = next((i for i, sec in enumerate(sections) if sec.section == section_name), None)
+        if not self.slice_context or index is None:
+            return music_plan.model_dump_json(), music_rhythm.model_dump_json()
+
+        previous_section = sections[index - 1] if index > 0 else None
+        next_section = sections[index + 1] if index + 1 < len(sections) else None
+        relevant = {sec.section for sec in (previous_section, sections[index], next_section) if sec}
+        all_names = {sec.section for sec in sections} | {sec.section for sec in music_plan.structure}
+
+        plan = music_plan.model_dump(mode="json", exclude={"structure", "motivic_ideas"})
+        plan["structure"] = [sec.model_dump() for sec in music_plan.structure if sec.section in relevant]
+        # Motifs of other sections are dropped; ideas not tied to a section name are global
+        plan["motivic_ideas"] = {
+            name: idea for name, idea in music_plan.motivic_ideas.items()
+            if name in relevant or name not in all_names
+        }
+
+        rhythm = {"section": sections[index].model_dump()}
+        for key, neighbour in (("previous_section", previous_section), ("next_section", next_section)):
+            if neighbour:
+                rhythm[key] = neighbour.model_dump(include={"section", "bars", "dynamics", "loop"})
+
+        return (
+            json.dumps(plan, ensure_ascii=False, separators=(",", ":")),
+            json.dumps(rhythm, ensure_ascii=False, separators=(",", ":")),
+        )
+
+    def prompt_token_report(self, music_plan: MusicPlan, music_rhythm: MusicRhythm) -> Dict[str, Dict[str, int]]:
+        """
+        Estimated prompt tokens of every section request, with and without context slicing.
+        """
+        full_prompt_tokens = estimate_tokens(generate_note_events_prompt(
+            section_name="", rhythm_input=music_rhythm.model_dump_json(), music_plan_input=music_plan.model_dump_json()
+        ))
+        report = {}
+        for sec in music_rhythm.sections:
+            music_plan_input, rhythm_input = self._section_context(sec.section, music_plan, music_rhythm)
+            report[sec.section] = {
+                "full": full_prompt_tokens + estimate_tokens(sec.section),
+                "sliced": estimate_tokens(generate_note_events_prompt(
+                    section_name=sec.section, rhythm_input=rhythm_input, music_plan_input=music_plan_input
+                )),
+            }
+        return report
+
+    def _log_prompt_tokens(self, music_plan: MusicPlan, music_rhythm: MusicRhythm):
+        report = self.prompt_token_report(music_plan, music_rhythm)
+        full = sum(tokens["full"] for tokens in report.values())
+        sliced = sum(tokens["sliced"] for tokens in report.values())
+        app_logger.info(
+            f"Notes prompts for {len(report)} sections: ~{sliced if self.slice_context else full} tokens "
+            f"(~{sliced} sliced, ~{full} with full context)"
+        )
+
+    def _build_section_notes_request(
             self,
             section_name: str,
             music_plan: MusicPlan,
             music_rhythm: MusicRhythm,
             model: str = None,
-            kwargs: dict = None
-    ) -> Optional[SectionChannelsResponse]:
-        app_logger.info(f"Generating notes for section: {section_name}")
-        prompt = generate_note_events_prompt(
+            kwargs: dict = None,
+            note_format: Optional[NoteFormat] = None
+    ) -> PromptRequest:
+        music_plan_input, rhythm_input = self._section_context(section_name, music_plan, music_rhythm)
+        compact = NoteFormat(note_format or self.note_format) == NoteFormat.COMPACT
+        # The compact format needs a fraction of the output tokens of nested JSON
+        generate_prompt = generate_compact_note_events_prompt if compact else generate_note_events_prompt
+        prompt = generate_prompt(
             section_name=section_name,
-            rhythm_input=music_rhythm.model_dump_json(),
-            music_plan_input=music_plan.model_dump_json()
+            rhythm_input=rhythm_input,
+            music_plan_input=music_plan_input
         )
         completion_kwargs = CompletionKwargs(
             max_tokens=8192,
@@ -41,65 +140,327 @@ class NotesGenService:
             user_messages=prompt,
             system_messages=BASE_CONTEXT_PROMPT,
             model=model,
-            response_format=SectionChannelsResponse,
+            response_format=RepairedSectionChannelsResponse if self.repair else SectionChannelsResponse,
+            response_parser=(repair_compact_notes if self.repair else parse_compact_notes) if compact else None,
             kwargs=completion_kwargs,
         )
+        return prompt_request
+
+    @timeit(stage="section_notes")
+    def generate_section_notes_given_music_rhythm(
+            self,
+            section_name: str,
+            music_plan: MusicPlan,
+            music_rhythm: MusicRhythm,
+            model: str = None,
+            kwargs: dict = None,
+            note_format: Optional[NoteFormat] = None
+    ) -> Optional[SectionChannelsResponse]:
+        app_logger.info(f"Generating notes for section: {section_name}")
+        prompt_request = self._build_section_notes_request(
+            section_name, music_plan, music_rhythm, model, kwargs, note_format
+        )
         response = self.llm_service.prompt_llm(prompt_request)
         if response:
             return response
         return None
 
-    @timeit
+    @timeit(stage="section_notes")
+    async def generate_section_notes_given_music_rhythm_async(
+            self,
+            section_name: str,
+            music_plan: MusicPlan,
+            music_rhythm: MusicRhythm,
+            model: str = None,
+            kwargs: dict = None,
+            note_format: Optional[NoteFormat] = None
+    ) -> Optional[SectionChannelsResponse]:
+        app_logger.info(f"Generating notes for section: {section_name}")
+        prompt_request = self._build_section_notes_request(
+            section_name, music_plan, music_rhythm, model, kwargs, note_format
+        )
+        response = await self.llm_service.prompt_llm_async(prompt_request)
+        if response:
+            return response
+        return None
+
+    def _merge_section_results(
+            self, channel_dict: Dict[str, List[SectionNotes]], result: Optional[SectionChannelsResponse]
+    ):
+        if result:
+            for channel_note in result.channels:
+                channel_name = channel_note.channel
+                if channel_name not in channel_dict:
+                    channel_dict[channel_name] = []
+                # Assuming each channel_note has sections with one item
+                if channel_note.sections:
+                    channel_dict[channel_name].append(channel_note.sections[0])
+        else:
+            app_logger.error("Failed to generate notes for a section")
+
+    def _build_music_notes(self, channel_dict: Dict[str, List[SectionNotes]]) -> Optional[MusicNotes]:
+        if not channel_dict:
+            app_logger.error("Failed to generate notes for any section")
+            return None
+
+        # Build ChannelNotes
+        channel_notes = []
+        for channel_name, section_list in channel_dict.items():
+            channel_notes.append(ChannelNotes(channel=channel_name, sections=section_list))
+
+        return MusicNotes(channels=channel_notes)
+
+    def repeat_sources(self, music_rhythm: MusicRhythm) -> List[int]:
+        """
+        For each rhythm section, the index of the section generating its notes: an earlier
+        occurrence of the same section when deduplicating repeats, else the section itself.
+        """
+        if not self.dedup_repeats:
+            return list(range(len(music_rhythm.sections)))
+        sources = repeat_sources(music_rhythm.sections)
+        reused = sum(1 for index, source in enumerate(sources) if source != index)
+        if reused:
+            NOTE_SECTIONS_REUSED.inc(reused)
+            app_logger.info(
+                f"Generating {len(sources) - reused} unique sections, reusing notes for {reused} repeats"
+            )
+        return sources
+
+    def collect_music_notes(
+            self,
+            section_results: Iterable[Optional[SectionChannelsResponse]],
+            music_rhythm: Optional[MusicRhythm] = None
+    ) -> Optional[MusicNotes]:
+        """
+        Merge per-section results into one MusicNotes, keeping the given section order.
+
+        :param music_rhythm: Rhythm the results belong to, one per section; each result is then
+            placed after the bars of the sections before it instead of every section starting at bar 1
+        """
+        section_results = list(section_results)
+        if music_rhythm is not None:
+            offsets = bar_offsets(music_rhythm.sections)
+            # Repeats may carry the notes of the section's first use, numbered from its offset
+            source_offsets = [offsets[source] for source in repeat_sources(music_rhythm.sections)]
+            section_results = [
+                place_section_notes(section_result, section, offset, source_offset) if section_result else None
+                for section_result, section, offset, source_offset in zip(
+                    section_results, music_rhythm.sections, offsets, source_offsets
+                )
+            ]
+        channel_dict = {}
+        for section_result in section_results:
+            self._merge_section_results(channel_dict, section_result)
+        return self._build_music_notes(channel_dict)
+
+    def save_music_notes(self, music_notes: MusicNotes, run_id: Optional[str] = None, name: str = "music_notes"):
+        """
+        Record generated notes as an artifact of a run (music_notes by default), in the background.
+        """
+        if not self.artifact_store:
+            return
+        self.artifact_store.save(run_id or self.artifact_store.new_run_id(), name, music_notes)
+
+    @timeit(stage="notes")
     def generate_all_channel_notes(
             self,
             music_plan: MusicPlan,
             music_rhythm: MusicRhythm,
             model: str = None,
-            kwargs: dict = None) -> Optional[MusicNotes]:
+            kwargs: dict = None,
+            on_section_complete: Optional[Callable[[str, Optional[SectionChannelsResponse]], None]] = None,
+            run_id: Optional[str] = None,
+            note_format: Optional[NoteFormat] = None
+    ) -> Optional[MusicNotes]:
+        """
+        Generate notes for every rhythm section in parallel and merge them per channel.
+
+        :param on_section_complete: Optional callback invoked with (section name, result) as each
+            section finishes; result is None when the section failed
+        :param run_id: Run id to record the notes artifact under; a new one is used if omitted
+        :param note_format: Wire format the LLM answers in; the service default if omitted
+        """
         sections = [sec.section for sec in music_rhythm.sections]
         app_logger.info(f"Generating notes for sections: {sections}")
 
         if not sections:
             app_logger.error("No sections found in music rhythm")
             return None
-
-        # Dictionary to accumulate sections per channel
-        channel_dict = {}
+        self._log_prompt_tokens(music_plan, music_rhythm)
 
         def generate_for_section(section_name):
-            return self.generate_section_notes_given_music_rhythm(section_name, music_plan, music_rhythm, model, kwargs)
+            return self.generate_section_notes_given_music_rhythm(
+                section_name, music_plan, music_rhythm, model, kwargs, note_format
+            )
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(sections)) as executor:
-            futures = [executor.submit(generate_for_section, section)
-                       for section in sections]
+        sources = self.repeat_sources(music_rhythm)
+        results = [None] * len(sections)
+        unique = [index for index, source in enumerate(sources) if source == index]
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(unique), self.max_section_workers), thread_name_prefix="notes-section"
+        ) as executor:
+            # Run each section in a copy of the caller's context so its spans nest under this trace
+            futures = {
+                executor.submit(contextvars.copy_context().run, generate_for_section, sections[index]): index
+                for index in unique
+            }
             for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    for channel_note in result.channels:
-                        channel_name = channel_note.channel
-                        if channel_name not in channel_dict:
-                            channel_dict[channel_name] = []
-                        # Assuming each channel_note has sections with one item
-                        if channel_note.sections:
-                            channel_dict[channel_name].append(channel_note.sections[0])
-                else:
-                    app_logger.error("Failed to generate notes for a section")
+                section_result = future.result()
+                # The section and its repeats are done
+                for index, source in enumerate(sources):
+                    if source == futures[future]:
+                        results[index] = section_result
+                        if on_section_complete:
+                            on_section_complete(sections[index], section_result)
 
-        if not channel_dict:
-            app_logger.error("Failed to generate notes for any section")
-            return None
+        result = self.collect_music_notes(results, music_rhythm)
+        if result:
+            self.save_music_notes(result, run_id)
+        return result
 
-        # Build ChannelNotes
-        channel_notes = []
-        for channel_name, section_list in channel_dict.items():
-            channel_notes.append(ChannelNotes(channel=channel_name, sections=section_list))
+    @timeit(stage="notes")
+    async def generate_all_channel_notes_async(
+            self,
+            music_plan: MusicPlan,
+            music_rhythm: MusicRhythm,
+            model: str = None,
+            kwargs: dict = None,
+            run_id: Optional[str] = None,
+            semaphore: Optional[asyncio.Semaphore] = None,
+            artifact_name: str = "music_notes",
+            note_format: Optional[NoteFormat] = None) -> Optional[MusicNotes]:
+        """
+        Async version of generate_all_channel_notes, one coroutine per section.
 
-        result = MusicNotes(channels=channel_notes)
+        :param semaphore: Optional concurrency budget shared with other generations; each
+            section call holds one slot while it runs
+        :param artifact_name: Name to record the notes artifact under
+        """
+        sections = [sec.section for sec in music_rhythm.sections]
+        app_logger.info(f"Generating notes for sections: {sections}")
 
-        with open("music_notes.json", "w") as f:
-            json.dump(result.model_dump(), f, indent=4)
+        if not sections:
+            app_logger.error("No sections found in music rhythm")
+            return None
+        self._log_prompt_tokens(music_plan, music_rhythm)
 
+        async def generate_for_section(section_name):
+            if semaphore is None:
+                return await self.generate_section_notes_given_music_rhythm_async(
+                    section_name, music_plan, music_rhythm, model, kwargs, note_format
+                )
+            async with semaphore:
+                return await self.generate_section_notes_given_music_rhythm_async(
+                    section_name, music_plan, music_rhythm, model, kwargs, note_format
+                )
+
+        # Fan out one coroutine per unique section on the event loop instead of one thread each
+        sources = self.repeat_sources(music_rhythm)
+        unique = [index for index, source in enumerate(sources) if source == index]
+        unique_results = dict(zip(unique, await asyncio.gather(*[
+            generate_for_section(sections[index]) for index in unique
+        ])))
+        results = [unique_results[source] for source in sources]
+
+        result = self.collect_music_notes(results, music_rhythm)
+        if result:
+            self.save_music_notes(result, run_id, artifact_name)
         return result
 
+    @staticmethod
+    def variation_kwargs(
+            kwargs: Optional[dict], count: int, seed: Optional[int] = None, temperatures: Optional[List[float]] = None
+    ) -> List[dict]:
+        """
+        Completion kwargs of each variation: consecutive seeds from `seed` (random if omitted)
+        and, if given, the temperatures cycled across variations.
+        """
+        base_seed = seed if seed is not None else random.randrange(2 ** 31 - count)
+        variations = []
+        for index in range(count):
+            variation = {**(kwargs or {}), "seed": base_seed + index}
+            if temperatures:
+                variation["temperature"] = temperatures[index % len(temperatures)]
+            variations.append(variation)
+        return variations
+
+    @timeit
+    async def generate_variations_async(
+            self,
+            music_plan: MusicPlan,
+            music_rhythm: MusicRhythm,
+            variation_kwargs: List[dict],
+            model: str = None,
+            max_concurrency: int = 8,
+            run_id: Optional[str] = None,
+            note_format: Optional[NoteFormat] = None
+    ) -> List[Optional[MusicNotes]]:
+        """
+        Generate several takes of the notes for one plan and rhythm.
+
+        All section calls of all variations share one budget of `max_concurrency` in-flight
+        LLM requests, so asking for more takes queues work instead of bursting the provider.
+
+        :param variation_kwargs: Completion kwargs per variation, e.g. from variation_kwargs()
+        :param run_id: Run id to record the notes of variation i under as music_notes_<i>
+        :return: Notes per variation, None where a variation failed
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        app_logger.info(
+            f"Generating {len(variation_kwargs)} variations of {len(music_rhythm.sections)} sections "
+            f"with at most {max_concurrency} concurrent requests"
+        )
+        return list(await asyncio.gather(*[
+            self.generate_all_channel_notes_async(
+                music_plan, music_rhythm, model, kwargs,
+                run_id=run_id, semaphore=semaphore, artifact_name=f"music_notes_{index}", note_format=note_format
+            )
+            for index, kwargs in enumerate(variation_kwargs)
+        ]))
+
+    async def iter_section_notes_async(
+            self,
+            music_plan: MusicPlan,
+            music_rhythm: MusicRhythm,
+            model: str = None,
+            kwargs: dict = None,
+            note_format: Optional[NoteFormat] = None
+    ) -> AsyncIterator[Tuple[str, Optional[SectionChannelsResponse]]]:
+        """
+        Generate all sections concurrently and yield (section name, result) as each one finishes;
+        repeats of a section are yielded with it.
+        """
+        sections = [sec.section for sec in music_rhythm.sections]
+        app_logger.info(f"Streaming notes for sections: {sections}")
+
+        async def generate_for_section(index):
+            return index, await self.generate_section_notes_given_music_rhythm_async(
+                sections[index], music_plan, music_rhythm, model, kwargs, note_format
+            )
+
+        sources = self.repeat_sources(music_rhythm)
+        tasks = [
+            asyncio.create_task(generate_for_section(index))
+            for index, source in enumerate(sources) if source == index
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                done_index, section_result = await next_done
+                for index, source in enumerate(sources):
+                    if source == done_index:
+                        yield sections[index], section_result
+        finally:
+            # Client went away mid-stream; stop paying for the remaining sections
+            for task in tasks:
+                task.cancel()
+
 
-notes_gen_service = NotesGenService(llm_service=llm_service)
+notes_gen_service = NotesGenService(
+    llm_service=llm_service,
+    artifact_store=artifact_store,
+    slice_context=app_settings.notes_context_slicing,
+    note_format=NoteFormat(app_settings.notes_format),
+    repair=app_settings.notes_repair_enabled,
+    max_section_workers=app_settings.llm_max_in_flight,
+    dedup_repeats=app_settings.notes_dedup_repeats,
+)
@@ -0,0 +1,214 @@
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+from ..config import app_settings
+from ..logger import app_logger
+from ..schemas.music import MusicChords, MusicNotes, MusicPlan, MusicRhythm, RhythmSection, NoteFormat, PlanMode
+from .music_plan import music_plan_service, MusicPlanService
+from .notes_gen import notes_gen_service, NotesGenService
+from .section_timeline import repeat_sources
+from ..metrics import NOTE_SECTIONS_REUSED
+
+
+class GenerationPipeline:
+    """
+    description -> plan -> chords -> rhythm -> notes, with the notes stage pipelined on the rhythm.
+
+    The rhythm is streamed and each section's notes are requested as soon as the LLM has moved
+    on to the next section, instead of after the whole rhythm is written; the next section is
+    known by then, so the sliced notes context (see NotesGenService._section_context) is the
+    same as with the full rhythm. With `pipelining` off, or without context slicing (every
+    section prompt then needs the whole rhythm), the notes stage waits for the full rhythm.
+    Fused plan modes (see MusicPlanService) are streamed the same way. A repeated section
+    (see section_timeline.repeat_sources) gets the notes of its first occurrence.
+    """
+
+    def __init__(
+            self,
+            music_plan_service: MusicPlanService,
+            notes_gen_service: NotesGenService,
+            pipelining: bool = True
+    ):
+        self.music_plan_service = music_plan_service
+        self.notes_gen_service = notes_gen_service
+        self.pipelining = pipelining
+
+    async def _generate_plan(
+            self,
+            description: str,
+            on_plan: Callable[[MusicPlan, MusicChords], None],
+            on_section: Callable[[RhythmSection], None],
+            plan_mode: Optional[PlanMode],
+            model: Optional[str],
+            kwargs: Optional[dict]
+    ) -> MusicRhythm:
+        """
+        Plan, chords and rhythm in the given mode, reporting the plan and chords, then each
+        rhythm section, as soon as they are complete.
+        """
+        plan_mode = plan_mode or self.music_plan_service.plan_mode
+        if plan_mode == PlanMode.STAGED:
+            music_plan, music_chords = await self.music_plan_service.generate_music_chords_given_description_async(
+                description=description, model=model, kwargs=kwargs
+            )
+            on_plan(music_plan, music_chords)
+            if self.pipelining:
+                return await self.music_plan_service.stream_music_rhythm_given_chords_async(
+                    music_chords=music_chords, on_section=on_section, model=model, kwargs=kwargs
+                )
+            music_rhythm = await self.music_plan_service.generate_music_rhythm_given_chords_async(
+                music_chords=music_chords, model=model, kwargs=kwargs
+            )
+        else:
+            music_plan = None
+            if plan_mode == PlanMode.FUSED:
+                music_plan = await self.music_plan_service.generate_music_plan_given_description_async(
+                    description=description, model=model, kwargs=kwargs
+                )
+            if self.pipelining:
+                _, _, music_rhythm = await self.music_plan_service.stream_fused_music_plan_async(
+                    description, on_plan, on_section, music_plan=music_plan, model=model, kwargs=kwargs
+                )
+                return music_rhythm
+            music_plan, music_chords, music_rhythm = await self.music_plan_service.generate_fused_music_plan_async(
+                description, music_plan, model=model, kwargs=kwargs
+            )
+            on_plan(music_plan, music_chords)
+        for section in music_rhythm.sections:
+            on_section(section)
+        return music_rhythm
+
+    async def iter_events_async(
+            self,
+            description: str,
+            model: str = None,
+            kwargs: dict = None,
+            run_id: Optional[str] = None,
+            note_format: Optional[NoteFormat] = None,
+            plan_mode: Optional[PlanMode] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Run the whole generation, yielding `("rhythm", (music_plan, music_rhythm))` once the
+        rhythm is complete, then `("section", (index, section name, result))` as each section's
+        notes finish; result is None when the section failed. Sections finished before the
+        rhythm are yielded right after it.
+
+        :param run_id: Run id to record the music plan artifact under
+        :param plan_mode: Stages per LLM call; the plan service default if omitted
+        :raises LlmError: if the plan, chords or rhythm stage fails
+        """
+        eager = self.pipelining and self.notes_gen_service.slice_context
+
+        # Every stage reports here; tasks are only created from this loop, in the caller's
+        # context, so their spans nest under the request and not under the rhythm call
+        events: asyncio.Queue = asyncio.Queue()
+        sections: List[RhythmSection] = []
+        notes_tasks: List[asyncio.Task] = []
+        started = 0
+        # Section index -> indices of its later repeats, which reuse its notes
+        repeats: Dict[int, List[int]] = {}
+        finished: Dict[int, Tuple[str, Any]] = {}
+        music_plan = music_chords = music_rhythm = None
+
+        def finish(index: int, section_result: Any) -> List[int]:
+            # The section and the repeats waiting for it, now with notes
+            done = [index] + repeats.get(index, [])
+            for done_index in done:
+                finished[done_index] = sections[done_index].section, section_result
+            return done
+
+        def start_notes(index: int):
+            nonlocal started
+            started += 1
+            section_name = sections[index].section
+            if self.notes_gen_service.dedup_repeats:
+                source = repeat_sources(sections[:index + 1])[index]
+                if source != index:
+                    NOTE_SECTIONS_REUSED.inc()
+                    repeats.setdefault(source, []).append(index)
+                    if source in finished:
+                        finished[index] = section_name, finished[source][1]
+                    return
+            # Before the rhythm is complete, what is written so far; it includes the next
+            # section, which is all the sliced context needs of the rest
+            rhythm = music_rhythm or MusicRhythm(sections=sections[:index + 2])
+            task = asyncio.create_task(self.notes_gen_service.generate_section_notes_given_music_rhythm_async(
+                section_name, music_plan, rhythm, model, kwargs, note_format
+            ))
+            task.add_done_callback(lambda done: events.put_nowait(("notes", (index, section_name, done))))
+            notes_tasks.append(task)
+
+        rhythm_task = asyncio.create_task(self._generate_plan(
+            description,
+            lambda plan, chords: events.put_nowait(("plan", (plan, chords))),
+            lambda section: events.put_nowait(("rhythm_section", section)),
+            plan_mode, model, kwargs
+        ))
+        rhythm_task.add_done_callback(lambda done: events.put_nowait(("rhythm", done)))
+        try:
+            while music_rhythm is None or len(finished) < started:
+                event, payload = await events.get()
+                if event == "plan":
+                    music_plan, music_chords = payload
+                elif event == "rhythm_section":
+                    sections.append(payload)
+                    if eager and len(sections) > 1:
+                        start_notes(len(sections) - 2)
+                elif event == "rhythm":
+                    music_rhythm = payload.result()
+                    for index in range(started, len(sections)):
+                        start_notes(index)
+                    app_logger.info(
+                        f"Rhythm complete with {len(sections)} sections, "
+                        f"{len(finished)} already with notes"
+                    )
+                    self.music_plan_service.save_music_plan(
+                        run_id, description, music_plan, music_chords, music_rhythm
+                    )
+                    yield "rhythm", (music_plan, music_rhythm)
+                    for index in sorted(finished):
+                        yield "section", (index, *finished[index])
+                else:
+                    index, section_name, task = payload
+                    for done_index in finish(index, task.result()):
+                        if music_rhythm is not None:
+                            yield "section", (done_index, *finished[done_index])
+        finally:
+            # Failed stage or client gone; stop paying for the calls still running
+            rhythm_task.cancel()
+            for task in notes_tasks:
+                task.cancel()
+
+    async def generate_music_notes_async(
+            self,
+            description: str,
+            model: str = None,
+            kwargs: dict = None,
+            run_id: Optional[str] = None,
+            note_format: Optional[NoteFormat] = None,
+            plan_mode: Optional[PlanMode] = None
+    ) -> Optional[MusicNotes]:
+        """
+        Notes for a description, merged in rhythm order and recorded under `run_id`.
+
+        :raises LlmError: if the plan, chords or rhythm stage fails
+        """
+        results = {}
+        async for event, payload in self.iter_events_async(description, model, kwargs, run_id, note_format, plan_mode):
+            if event == "rhythm":
+                _, music_rhythm = payload
+            elif event == "section":
+                index, _, section_result = payload
+                results[index] = section_result
+        music_notes = self.notes_gen_service.collect_music_notes(
+            [results.get(index) for index in range(len(music_rhythm.sections))], music_rhythm
+        )
+        if music_notes:
+            self.notes_gen_service.save_music_notes(music_notes, run_id)
+        return music_notes
+
+
+generation_pipeline = GenerationPipeline(
+    music_plan_service=music_plan_service,
+    notes_gen_service=notes_gen_service,
+    pipelining=app_settings.notes_pipelining,
+)
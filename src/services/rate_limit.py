@@ -0,0 +1,277 @@
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+import asyncio
+import threading
+import time
+from ..config import app_settings
+
+
+class TokenBucket:
+    """
+    Refills `rate_per_minute` units per minute up to `capacity`; with the default capacity of
+    one second of quota, calls are paced evenly instead of bursting a minute's worth at once.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(self.rate, 1.0)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` units are available; amounts above the capacity only wait for a
+        full bucket so they are never starved.
+        """
+        self._refill()
+        missing = min(amount, self.capacity) - self._tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        """Take `amount` units; an amount above the capacity leaves the bucket in debt, delaying the next calls."""
+        self._refill()
+        self._tokens -= amount
+
+    def give_back(self, amount: float):
+        """Return units that were reserved but not used, e.g. a token estimate above the actual usage."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class Permit:
+    """
+    Admission of one LLM call; release it when the call ends, with the tokens it actually used
+    so an overestimate goes back to the model's token budget.
+    """
+
+    def __init__(self, limiter: "LlmRateLimiter", model: str, tokens: int, waited: float):
+        self.limiter = limiter
+        self.model = model
+        self.tokens = tokens
+        self.waited = waited
+        self.used_tokens: Optional[int] = None
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter._release(self)
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ("model", "tokens", "enqueued", "grant", "permit")
+
+    def __init__(self, model: str, tokens: int, grant: Callable[[], None]):
+        self.model = model
+        self.tokens = tokens
+        self.enqueued = time.perf_counter()
+        self.grant = grant
+        self.permit: Optional[Permit] = None
+
+
+class LlmRateLimiter:
+    """
+    Process-wide admission control for outbound LLM calls.
+
+    A call is admitted once fewer than `max_in_flight` calls are running and its model's
+    token buckets allow one more request (`requests_per_minute`) and its estimated tokens
+    (`tokens_per_minute`); `model_limits` overrides both per model. Waiting calls are queued per
+    `key` (the request or job they belong to) and keys are served round-robin, so a request
+    fanning out a dozen sections does not delay every other request by a dozen calls. Admissions
+    are paced by the buckets, which keeps throughput at the quota instead of bursting into 429s
+    and then idling through the backoff. Works for threads (acquire) and coroutines
+    (acquire_async) alike.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        model_limits: Optional[Dict[str, Dict[str, float]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.model_limits = model_limits or {}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._request_buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._token_buckets: Dict[str, Optional[TokenBucket]] = {}
+        # key -> waiting calls, and the round-robin order of keys with waiting calls
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._order: Deque[str] = deque()
+        self._timer: Optional[threading.Timer] = None
+        self._timer_deadline = 0.0
+        self.in_flight = 0
+        self.admitted = 0
+        self.waited_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "LlmRateLimiter":
+        return cls(
+            max_in_flight=app_settings.llm_max_in_flight,
+            requests_per_minute=app_settings.llm_requests_per_minute,
+            tokens_per_minute=app_settings.llm_tokens_per_minute,
+            model_limits=app_settings.llm_model_rate_limits,
+        )
+
+    def _buckets(self, model: str):
+        if model not in self._request_buckets:
+            limits = self.model_limits.get(model, {})
+            rpm = limits.get("rpm", self.requests_per_minute)
+            tpm = limits.get("tpm", self.tokens_per_minute)
+            self._request_buckets[model] = TokenBucket(rpm, clock=self._clock) if rpm else None
+            self._token_buckets[model] = TokenBucket(tpm, clock=self._clock) if tpm else None
+        return self._request_buckets[model], self._token_buckets[model]
+
+    def _wait_time(self, waiter: _Waiter) -> float:
+        requests, tokens = self._buckets(waiter.model)
+        return max(
+            requests.wait_time(1) if requests is not None else 0.0,
+            tokens.wait_time(waiter.tokens) if tokens is not None else 0.0,
+        )
+
+    def _dispatch(self):
+        """Admit waiting calls round-robin across keys while capacity lasts; lock held."""
+        next_wait = None
+        skipped = 0
+        while self._order and self.in_flight < self.max_in_flight and skipped < len(self._order):
+            key = self._order[0]
+            queue = self._queues[key]
+            waiter = queue[0]
+            wait = self._wait_time(waiter)
+            if wait > 0:
+                # Throttled model; give the other keys their turn meanwhile
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                self._order.rotate(-1)
+                skipped += 1
+                continue
+            skipped = 0
+            queue.popleft()
+            if queue:
+                self._order.rotate(-1)
+            else:
+                del self._queues[key]
+                self._order.popleft()
+            self._admit(waiter)
+        if next_wait is not None:
+            self._schedule(next_wait)
+
+    def _schedule(self, wait: float):
+        """Dispatch again in `wait` seconds, unless a dispatch is already due sooner; lock held."""
+        deadline = self._clock() + wait
+        if self._timer is not None:
+            if self._timer_deadline <= deadline:
+                return
+            # A waiter of another model is ready before the pending timer; don't hold it behind
+            self._timer.cancel()
+        timer = threading.Timer(wait, lambda: self._on_timer(timer))
+        timer.daemon = True
+        self._timer, self._timer_deadline = timer, deadline
+        timer.start()
+
+    def _on_timer(self, timer: threading.Timer):
+        with self._lock:
+            if self._timer is not timer:
+                # Replaced by a sooner timer after it had already fired
+                return
+            self._timer = None
+            self._dispatch()
+
+    def _admit(self, waiter: _Waiter):
+        requests, tokens = self._buckets(waiter.model)
+        if requests is not None:
+            requests.take(1)
+        if tokens is not None:
+            tokens.take(waiter.tokens)
+        self.in_flight += 1
+        self.admitted += 1
+        waited = time.perf_counter() - waiter.enqueued
+        self.waited_seconds += waited
+        waiter.permit = Permit(self, waiter.model, waiter.tokens, waited)
+        waiter.grant()
+
+    def _enqueue(self, waiter: _Waiter, key: str):
+        with self._lock:
+            if key not in self._queues:
+                self._queues[key] = deque()
+                self._order.append(key)
+            self._queues[key].append(waiter)
+            self._dispatch()
+
+    def _cancel(self, waiter: _Waiter, key: str) -> bool:
+        """Drop a call that gave up waiting; False if it was admitted meanwhile."""
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is None or waiter not in queue:
+                return False
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[key]
+                self._order.remove(key)
+            return True
+
+    def _release(self, permit: Permit):
+        with self._lock:
+            self.in_flight -= 1
+            if permit.used_tokens is not None and permit.used_tokens < permit.tokens:
+                _, tokens = self._buckets(permit.model)
+                if tokens is not None:
+                    tokens.give_back(permit.tokens - permit.used_tokens)
+            self._dispatch()
+
+    def acquire(self, model: str, tokens: int, key: str = "default") -> Permit:
+        """
+        Block the calling thread until the call is admitted.
+
+        :param tokens: Estimated tokens of the call, prompt plus completion
+        :param key: Request the call belongs to, for fair queueing
+        """
+        admitted = threading.Event()
+        waiter = _Waiter(model, tokens, admitted.set)
+        self._enqueue(waiter, key)
+        admitted.wait()
+        return waiter.permit
+
+    async def acquire_async(self, model: str, tokens: int, key: str = "default") -> Permit:
+        """
+        Async version of acquire, waiting without holding a thread.
+        """
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+
+        waiter = _Waiter(model, tokens, grant)
+        self._enqueue(waiter, key)
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if not self._cancel(waiter, key):
+                waiter.permit.release()
+            raise
+        return waiter.permit
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "admitted": self.admitted,
+                "waited_seconds": round(self.waited_seconds, 3),
+            }
@@ -0,0 +1,64 @@
+from typing import List, Optional, Sequence, Tuple
+from ..schemas.music import RhythmSection, SectionChannelsResponse, ChannelNotes, SectionNotes
+
+
+def section_key(section: RhythmSection) -> Tuple[str, int]:
+    """
+    Identity of a section's material: its name and length. Notes prompts are built per section
+    name (see NotesGenService._section_context), so sections sharing both get the same prompt.
+    """
+    return section.section.strip().casefold(), section.bars
+
+
+def repeat_sources(sections: Sequence[RhythmSection]) -> List[int]:
+    """
+    For each section, the index of the first section with the same material, whose notes it
+    reuses; its own index when it is the first.
+    """
+    first = {}
+    return [first.setdefault(section_key(section), index) for index, section in enumerate(sections)]
+
+
+def bar_offsets(sections: Sequence[RhythmSection]) -> List[int]:
+    """Bars before each section in the song."""
+    offsets, total = [], 0
+    for section in sections:
+        offsets.append(total)
+        total += section.bars
+    return offsets
+
+
+def place_section_notes(
+        section_result: SectionChannelsResponse, section: RhythmSection, bar_offset: int, source_offset: Optional[int] = None
+) -> SectionChannelsResponse:
+    """
+    A section's notes at its place in the song, with bars numbered from `bar_offset` + 1.
+
+    Notes are asked for with bars counted from 1 in each section; an LLM numbering them song-wide
+    instead starts past the bars before the section it wrote, at `source_offset` + 1 (the offset
+    of the section's first use for a repeat reusing its notes), so such bars are made
+    section-local first. A channel's only section is named after `section`; when the LLM split a
+    channel into several, only those it named as `section` take its spelling and the others keep
+    their own name.
+
+    :param source_offset: Bars before the section the notes were written for; `bar_offset` if omitted
+    """
+    if source_offset is None:
+        source_offset = bar_offset
+    bar_numbers = [bar.bar for channel in section_result.channels for sec in channel.sections for bar in sec.bars]
+    first_bar = min(bar_numbers, default=1)
+    shift = bar_offset - (source_offset if 0 < source_offset < first_bar else 0)
+    name = section.section.strip().casefold()
+    return SectionChannelsResponse(channels=[
+        ChannelNotes(channel=channel.channel, sections=[
+            SectionNotes(
+                section=(
+                    section.section if len(channel.sections) == 1 or sec.section.strip().casefold() == name
+                    else sec.section
+                ),
+                bars=[bar.model_copy(update={"bar": bar.bar + shift}) for bar in sec.bars],
+            )
+            for sec in channel.sections
+        ])
+        for channel in section_result.channels
+    ])
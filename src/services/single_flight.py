@@ -0,0 +1,102 @@
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+import asyncio
+import threading
+
+
+class _LeaderGone(Exception):
+    """The call being waited on was cancelled before it finished; waiters run it themselves."""
+
+
+class SingleFlightStats:
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+
+    def snapshot(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first call for a key runs, and calls made with the
+    same key while it is in flight wait for it and get its result (or exception) instead of
+    running again. Once it finishes the key is released; later calls run anew (or hit a cache).
+
+    Works across threads and event loops: sync callers block on the shared future and async
+    callers await it. If an async caller running the call is cancelled (e.g. its client went
+    away), the next waiter runs it instead of failing with it.
+    """
+
+    def __init__(self):
+        self.stats = SingleFlightStats()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """The in-flight future for `key`, and whether the caller is the one to run the call."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats.coalesced += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            self.stats.calls += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result: Any = None, error: BaseException = None):
+        with self._lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once for concurrent callers with the same key.
+
+        :return: (result, shared), shared being True when the result came from another caller's call
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result(), True
+                except _LeaderGone:
+                    continue
+            try:
+                result = fn()
+            except BaseException as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result)
+            return result, False
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async version of do, awaiting `fn()` once for concurrent callers with the same key.
+
+        :return: (result, shared), shared being True when the result came from another caller's call
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    # Shielded: a waiter being cancelled must not cancel the shared call
+                    return await asyncio.shield(asyncio.wrap_future(future)), True
+                except _LeaderGone:
+                    continue
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self._finish(key, future, error=_LeaderGone())
+                raise
+            except BaseException as e:
+                self._finish(key, future, error=e)
+                raise
+            self._finish(key, future, result)
+            return result, False
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
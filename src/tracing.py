@@ -0,0 +1,270 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import concurrent.futures
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+import httpx
+from .config import app_settings
+from .logger import app_logger
+
+
+class Span:
+    """
+    One timed operation of a trace. Times come from the monotonic perf_counter clock;
+    only the trace keeps a wall-clock start for display.
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "thread", "start", "end")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "thread": self.thread,
+            "start_ms": round((self.start - self.trace.root.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans of one request or job, rooted at the span that started it."""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    @property
+    def duration(self) -> float:
+        return self.root.duration
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [span.to_dict() for span in spans],
+        }
+
+    def waterfall(self, width: int = 60) -> str:
+        """
+        Text waterfall of the spans: one line per span, indented by nesting, with a bar
+        placed and sized by its offset and duration within the trace.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        total = max(self.duration, 1e-9)
+        depths = {self.root.span_id: 0}
+        lines = [f"trace {self.trace_id} {self.root.name} {self.duration * 1000:.1f}ms"]
+        for span in spans:
+            depth = depths.setdefault(span.span_id, depths.get(span.parent_id, -1) + 1)
+            offset = int((span.start - self.root.start) / total * width)
+            length = max(int(span.duration / total * width), 1)
+            bar = (" " * offset + "█" * length).ljust(width)
+            attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+            lines.append(
+                f"{bar} {span.duration * 1000:9.1f}ms  {'  ' * depth}{span.name} [{span.thread}] {attributes}".rstrip()
+            )
+        return "\n".join(lines)
+
+
+class JsonlTraceExporter:
+    """Appends each finished trace as one JSON line to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Dict[str, Any]):
+        line = json.dumps(trace, default=str, separators=(",", ":"))
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class HttpTraceExporter:
+    """POSTs each finished trace as JSON to a collector endpoint."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self._client = httpx.Client(timeout=timeout)
+
+    def export(self, trace: Dict[str, Any]):
+        self._client.post(self.url, content=json.dumps(trace, default=str), headers={"Content-Type": "application/json"})
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Request-scoped tracing with spans nested through contextvars.
+
+    A span opened while another is current becomes its child, across awaits, asyncio tasks
+    and threads started with a copied context (asyncio.to_thread, contextvars.copy_context().run).
+    When a root span ends its trace is kept among the `max_recent` latest traces and handed
+    to the exporters on a background thread, so exporting never blocks the request path.
+    """
+
+    def __init__(self, exporters: Sequence[Any] = (), max_recent: int = 200):
+        self.exporters = list(exporters)
+        self._recent: "deque[Trace]" = deque(maxlen=max_recent)
+        self._lock = threading.Lock()
+        self._export_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="trace-exporter"
+        )
+
+    @classmethod
+    def from_settings(cls) -> "Tracer":
+        exporters = []
+        if app_settings.trace_export_file:
+            exporters.append(JsonlTraceExporter(app_settings.trace_export_file))
+        if app_settings.trace_export_url:
+            exporters.append(HttpTraceExporter(app_settings.trace_export_url))
+        return cls(exporters=exporters, max_recent=app_settings.trace_max_recent)
+
+    @contextmanager
+    def span(self, name: str, new_trace: bool = False, trace_id: Optional[str] = None, **attributes) -> Iterator[Span]:
+        """
+        Time a block as a span, the child of the current span if there is one.
+
+        :param name: Span name, e.g. the stage or function
+        :param new_trace: Start a new trace even if a span is current, e.g. for a background job
+        :param trace_id: Id of a new trace; random if omitted
+        """
+        parent = None if new_trace else _current_span.get()
+        trace = parent.trace if parent is not None else Trace(trace_id)
+        span = Span(trace, name, parent.span_id if parent is not None else None, attributes)
+        trace.add(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_attribute("error", repr(e))
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            if parent is None:
+                self._finish(trace)
+
+    def _finish(self, trace: Trace):
+        with self._lock:
+            self._recent.append(trace)
+        if self.exporters:
+            self._export_executor.submit(self._export, trace.to_dict())
+
+    def _export(self, trace: Dict[str, Any]):
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                app_logger.error(f"Failed to export trace {trace['trace_id']}: {e}")
+
+    def recent(self, min_duration: float = 0.0, limit: int = 20) -> List[Trace]:
+        """
+        Latest finished traces lasting at least `min_duration` seconds, slowest first.
+        """
+        with self._lock:
+            traces = [trace for trace in self._recent if trace.duration >= min_duration]
+        traces.sort(key=lambda trace: trace.duration, reverse=True)
+        return traces[:limit]
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return next((trace for trace in self._recent if trace.trace_id == trace_id), None)
+
+    def flush(self):
+        """
+        Block until every queued export has finished.
+        """
+        self._export_executor.submit(lambda: None).result()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+tracer = Tracer.from_settings()
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running a function (sync or async) in a span named after it."""
+    def decorator(func):
+        span_name = name or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware opening the root span of every HTTP request, kept open until the
+    response body (including streamed responses) is sent, and returning its id in X-Trace-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with tracer.span(f"{scope['method']} {scope['path']}", new_trace=True) as root:
+            async def send_with_trace_id(message):
+                if message["type"] == "http.response.start":
+                    root.set_attribute("status", message["status"])
+                    message["headers"] = [*message.get("headers", []), (b"x-trace-id", root.trace.trace_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
@@ -1,15 +1,45 @@
 import time
+import inspect
 from functools import wraps
+from typing import Optional
 from .logger import app_logger
+from .metrics import observe_stage
+from .tracing import tracer
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count of a text (~4 characters per token), without a tokenizer dependency."""
+    return (len(text) + 3) // 4
+
+def timeit(func=None, *, stage: Optional[str] = None):
+    """
+    Decorator to measure the execution time of a function (sync or async) on the monotonic
+    clock, as a tracing span nested under the current one.
+    With `stage`, e.g. `@timeit(stage="plan")`, the latency is also recorded in the stage metrics.
+    """
+    if func is None:
+        return lambda func: timeit(func, stage=stage)
+    if stage:
+        func = observe_stage(stage)(func)
+    attributes = {"stage": stage} if stage else {}
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            with tracer.span(func.__name__, **attributes):
+                result = await func(*args, **kwargs)
+            end_time = time.perf_counter()
+            elapsed_time = end_time - start_time
+            app_logger.info(f"Function '{func.__name__}' executed in {elapsed_time:.4f} seconds")
+            return result
+        return async_wrapper
 
-def timeit(func):
-    """Decorator to measure the execution time of a function."""
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
+        start_time = time.perf_counter()
+        with tracer.span(func.__name__, **attributes):
+            result = func(*args, **kwargs)
+        end_time = time.perf_counter()
         elapsed_time = end_time - start_time
         app_logger.info(f"Function '{func.__name__}' executed in {elapsed_time:.4f} seconds")
         return result
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -0,0 +1,103 @@
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+from src.main import app
+from src.services.artifacts import ArtifactStore
+from src.services.notes_gen import NotesGenService
+from src.schemas.music import MusicNotes, ChannelNotes, SectionNotes, BarNotes
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def sample_music_notes():
+    return MusicNotes(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="Intro", bars=[BarNotes(bar=1, events=[[1.0, "C4", "quarter", 80]])])
+        ])
+    ])
+
+
+def test_save_and_load_compact(tmp_path, sample_music_notes):
+    store = ArtifactStore(str(tmp_path))
+
+    store.save("run1", "music_notes", sample_music_notes)
+    store.save("run1", "extra", {"a": [1, 2]})
+    store.flush()
+
+    assert store.load("run1", "music_notes") == sample_music_notes.model_dump(mode="json")
+    assert store.list_artifacts("run1") == ["extra", "music_notes"]
+    with open(tmp_path / "run1" / "extra.json") as f:
+        assert f.read() == '{"a":[1,2]}'
+    assert store.load("run1", "missing") is None
+    assert store.load("unknown", "music_notes") is None
+
+
+def test_runs_are_isolated(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    store.save("run1", "music_plan", {"description": "first"})
+    store.save("run2", "music_plan", {"description": "second"})
+    store.flush()
+
+    assert store.load("run1", "music_plan") == {"description": "first"}
+    assert store.load("run2", "music_plan") == {"description": "second"}
+
+
+def test_eviction_keeps_newest_runs(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_runs=2)
+
+    for index in range(3):
+        store.save(f"run{index}", "music_plan", {"index": index})
+        store.flush()
+        mtime = time.time() - 10 + index
+        os.utime(tmp_path / f"run{index}", (mtime, mtime))
+
+    store.evict()
+
+    assert store.list_runs() == ["run2", "run1"]
+
+
+def test_eviction_by_age(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_age_seconds=60)
+    store.save("old", "music_plan", {})
+    store.save("new", "music_plan", {})
+    store.flush()
+    os.utime(tmp_path / "old", (0, time.time() - 120))
+
+    store.evict()
+
+    assert store.list_runs() == ["new"]
+
+
+def test_invalid_names_rejected(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.save("../escape", "music_plan", {})
+    with pytest.raises(ValueError):
+        store.load("run1", "../../etc/passwd")
+
+
+def test_notes_service_records_artifact_under_run(tmp_path, sample_music_notes):
+    store = ArtifactStore(str(tmp_path))
+    service = NotesGenService(Mock(), artifact_store=store)
+
+    service.save_music_notes(sample_music_notes, "run42")
+    store.flush()
+
+    assert MusicNotes.model_validate(store.load("run42", "music_notes")) == sample_music_notes
+
+
+def test_runs_routes(tmp_path, sample_music_notes):
+    store = ArtifactStore(str(tmp_path))
+    store.save("run1", "music_notes", sample_music_notes)
+    store.flush()
+
+    with patch('src.routes.runs.artifact_store', store):
+        assert client.get("/runs").json() == {"runs": ["run1"]}
+        assert client.get("/runs/run1").json() == {"run_id": "run1", "artifacts": ["music_notes"]}
+        assert client.get("/runs/run1/music_notes").json()["channels"][0]["channel"] == "melody"
+        assert client.get("/runs/run1/music_plan").status_code == 404
+        assert client.get("/runs/missing").status_code == 404
@@ -0,0 +1,45 @@
+import json
+from benchmarks.bench_hot_paths import scale_notes_json, split_sections, build_cases, find_regressions
+from src.schemas.music import MusicNotes
+
+
+def load_notes():
+    with open("music_notes.json", "r") as f:
+        return json.load(f)
+
+
+def result(seconds, reference=1.0):
+    return {"seconds": seconds, "relative": seconds / reference, "reference_seconds": reference}
+
+
+def test_scale_notes_json_repeats_sections_with_later_bars():
+    raw = load_notes()
+    scaled = scale_notes_json(raw, 3)
+
+    for channel, scaled_channel in zip(raw["channels"], scaled["channels"]):
+        assert len(scaled_channel["sections"]) == 3 * len(channel["sections"])
+        first, last = channel["sections"][0], scaled_channel["sections"][-len(channel["sections"])]
+        assert last["section"] == f"{first['section']}_2"
+        assert [bar["bar"] for bar in last["bars"]] == [bar["bar"] + 2 * len(first["bars"]) for bar in first["bars"]]
+    MusicNotes.model_validate(scaled)
+
+
+def test_merge_case_rebuilds_the_piece():
+    music_notes = MusicNotes.model_validate(load_notes())
+    section_results, music_rhythm = split_sections(music_notes)
+    merge, items = build_cases(load_notes())["merge_sections"]
+
+    assert items == len(section_results) == len(music_rhythm.sections)
+    assert [channel.channel for channel in merge().channels] == [channel.channel for channel in music_notes.channels]
+
+
+def test_find_regressions_needs_both_seconds_and_relative_slowdown():
+    baseline = {"results": {"a@x1": result(1.0), "b@x1": result(1.0), "c@x1": result(1.0)}}
+    current = {"results": {
+        "a@x1": result(2.0),               # slower in both
+        "b@x1": result(2.0, reference=2),  # the whole machine is slower
+        "c@x1": result(1.1),               # within tolerance
+        "d@x1": result(9.0),               # not in the baseline
+    }}
+
+    assert find_regressions(baseline, current, tolerance=0.25) == ["a@x1"]
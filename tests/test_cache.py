@@ -0,0 +1,94 @@
+import os
+import time
+import pytest
+from pydantic import BaseModel
+from src.services.cache import StageCache, schema_version
+from src.schemas.openrouter import PromptRequest, CompletionKwargs
+from src.schemas.music import MusicChords, ChordSection, MusicRhythm
+
+
+@pytest.fixture
+def sample_music_chords():
+    return MusicChords(key="C", sections=[
+        ChordSection(name="Intro", bars=4, chords=["C", "G"], motifs={"Intro": [1, 2]}, loop="to A")
+    ])
+
+
+def make_request(user_messages="chords for plan", temperature=None, response_format=MusicChords):
+    kwargs = CompletionKwargs(temperature=temperature) if temperature is not None else CompletionKwargs()
+    return PromptRequest(
+        user_messages=user_messages, system_messages="system", kwargs=kwargs, response_format=response_format
+    )
+
+
+def test_make_key_is_stable_and_content_addressed():
+    key = StageCache.make_key(make_request(), "model-a")
+
+    assert key == StageCache.make_key(make_request(), "model-a")
+    assert key != StageCache.make_key(make_request(user_messages="other"), "model-a")
+    assert key != StageCache.make_key(make_request(), "model-b")
+    assert key != StageCache.make_key(make_request(temperature=0.5), "model-a")
+    assert key != StageCache.make_key(make_request(response_format=MusicRhythm), "model-a")
+
+
+def test_make_key_none_for_unstructured_response():
+    assert StageCache.make_key(make_request(response_format=None), "model-a") is None
+
+
+def test_schema_version_changes_with_schema():
+    class First(BaseModel):
+        value: int
+
+    class Second(BaseModel):
+        value: str
+
+    assert schema_version(First) != schema_version(Second)
+
+
+def test_get_set_roundtrip_and_stats(tmp_path, sample_music_chords):
+    cache = StageCache(str(tmp_path))
+    key = StageCache.make_key(make_request(), "model-a")
+
+    assert cache.get(key, MusicChords) is None
+    cache.set(key, sample_music_chords)
+
+    assert cache.get(key, MusicChords) == sample_music_chords
+    assert cache.stats.snapshot()["hits"] == {"MusicChords": 1}
+    assert cache.stats.snapshot()["misses"] == {"MusicChords": 1}
+
+
+def test_entries_persist_across_instances(tmp_path, sample_music_chords):
+    key = StageCache.make_key(make_request(), "model-a")
+    StageCache(str(tmp_path)).set(key, sample_music_chords)
+
+    reloaded = StageCache(str(tmp_path))
+
+    assert len(reloaded) == 1
+    assert reloaded.get(key, MusicChords) == sample_music_chords
+
+
+def test_ttl_expiry(tmp_path, sample_music_chords):
+    cache = StageCache(str(tmp_path), ttl_seconds=0.01)
+    key = StageCache.make_key(make_request(), "model-a")
+    cache.set(key, sample_music_chords)
+
+    time.sleep(0.02)
+
+    assert cache.get(key, MusicChords) is None
+    assert cache.stats.expirations == 1
+    assert len(cache) == 0
+
+
+def test_lru_eviction(tmp_path, sample_music_chords):
+    cache = StageCache(str(tmp_path), max_entries=2)
+    keys = [StageCache.make_key(make_request(user_messages=str(i)), "model-a") for i in range(3)]
+
+    cache.set(keys[0], sample_music_chords)
+    cache.set(keys[1], sample_music_chords)
+    cache.get(keys[0], MusicChords)          # keys[1] is now least recently used
+    cache.set(keys[2], sample_music_chords)
+
+    assert cache.get(keys[1], MusicChords) is None
+    assert cache.get(keys[0], MusicChords) == sample_music_chords
+    assert cache.stats.evictions == 1
+    assert len([f for _, _, files in os.walk(tmp_path) for f in files]) == 2
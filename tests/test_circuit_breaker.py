@@ -0,0 +1,163 @@
+import asyncio
+from unittest.mock import Mock, AsyncMock, patch
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+from src.services.circuit_breaker import (
+    CircuitBreaker, CircuitBreakerRegistry, CircuitState, LlmError, LlmErrorKind, classify_error,
+)
+from src.services.llm import LlmService
+from src.schemas.openrouter import PromptRequest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    return CircuitBreaker("m", failure_threshold=2, base_backoff=10.0, max_backoff=30.0,
+                          clock=clock, jitter=lambda: 1.0, **kwargs)
+
+
+def status_error(cls, status, headers=None):
+    request = httpx.Request("POST", "https://example.com/chat/completions")
+    response = httpx.Response(status, request=request, headers=headers or {})
+    return cls("failed", response=response, body=None)
+
+
+def test_classify_error():
+    assert classify_error(status_error(openai.RateLimitError, 429)) == LlmErrorKind.RATE_LIMITED
+    assert classify_error(status_error(openai.InternalServerError, 502)) == LlmErrorKind.UNAVAILABLE
+    assert classify_error(status_error(openai.AuthenticationError, 401)) == LlmErrorKind.REJECTED
+    assert classify_error(openai.APITimeoutError(httpx.Request("POST", "https://example.com"))) == LlmErrorKind.TIMEOUT
+    assert classify_error(ValueError("line 1: bad")) == LlmErrorKind.VALIDATION
+    assert classify_error(RuntimeError("boom")) == LlmErrorKind.ERROR
+
+    error = LlmError.from_exception("m", status_error(openai.RateLimitError, 429, {"retry-after": "7"}))
+    assert error.retry_after == 7.0
+    assert str(error).startswith("rate_limited from m")
+
+
+def test_breaker_opens_after_threshold_and_probes():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.record_failure(LlmErrorKind.UNAVAILABLE)
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure(LlmErrorKind.UNAVAILABLE)
+    assert breaker.state == CircuitState.OPEN
+
+    with pytest.raises(LlmError) as e:
+        breaker.before_call()
+    assert e.value.kind == LlmErrorKind.CIRCUIT_OPEN
+    assert e.value.retry_after == 10.0
+
+    # After the backoff a single probe goes through
+    clock.now += 10.0
+    breaker.before_call()
+    assert breaker.state == CircuitState.HALF_OPEN
+    with pytest.raises(LlmError):
+        breaker.before_call()
+
+    # A failed probe reopens for twice as long, up to max_backoff
+    breaker.record_failure(LlmErrorKind.TIMEOUT)
+    assert breaker.snapshot()["retry_in"] == 20.0
+    clock.now += 20.0
+    breaker.before_call()
+    breaker.record_failure(LlmErrorKind.TIMEOUT)
+    assert breaker.snapshot()["retry_in"] == 30.0
+
+    clock.now += 30.0
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.snapshot() == {
+        "state": "closed", "consecutive_failures": 0, "trips": 0, "retry_in": 0.0, "last_error": "timeout",
+    }
+
+
+def test_breaker_rate_limit_trips_at_once_and_honours_retry_after():
+    breaker = make_breaker(FakeClock())
+    breaker.record_failure(LlmErrorKind.RATE_LIMITED, retry_after=60.0)
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.snapshot()["retry_in"] == 60.0
+
+
+def test_breaker_ignores_validation_errors_and_cancelled_probes():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(5):
+        breaker.record_failure(LlmErrorKind.VALIDATION)
+    assert breaker.state == CircuitState.CLOSED
+
+    breaker.record_failure(LlmErrorKind.UNAVAILABLE)
+    breaker.record_failure(LlmErrorKind.UNAVAILABLE)
+    clock.now += 10.0
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+
+
+def make_service(failure_threshold=2):
+    return LlmService(
+        llm_provider="openrouter", circuit_breakers=CircuitBreakerRegistry(failure_threshold=failure_threshold)
+    )
+
+
+PROMPT = PromptRequest(user_messages="Hi", system_messages="", model="llama3")
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_sheds_calls_to_failing_model(mock_instructor):
+    mock_client = Mock()
+    mock_client.create_with_completion.side_effect = status_error(openai.InternalServerError, 503)
+    mock_instructor.return_value = mock_client
+    service = make_service()
+
+    assert service.prompt_llm(PROMPT) is None
+    with pytest.raises(LlmError) as e:
+        service.prompt_llm(PROMPT, raise_errors=True)
+    assert e.value.kind == LlmErrorKind.UNAVAILABLE
+
+    # Open: fails fast without calling the provider
+    with pytest.raises(LlmError) as e:
+        service.prompt_llm(PROMPT, raise_errors=True)
+    assert e.value.kind == LlmErrorKind.CIRCUIT_OPEN
+    assert mock_client.create_with_completion.call_count == 2
+    assert service.circuit_breakers.snapshot()["llama3"]["state"] == "open"
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_async_rate_limited(mock_instructor):
+    mock_client = Mock()
+    mock_client.create_with_completion = AsyncMock(
+        side_effect=status_error(openai.RateLimitError, 429, {"retry-after": "30"})
+    )
+    mock_instructor.return_value = mock_client
+    service = make_service()
+
+    with pytest.raises(LlmError) as e:
+        asyncio.run(service.prompt_llm_async(PROMPT, raise_errors=True))
+    assert e.value.kind == LlmErrorKind.RATE_LIMITED
+    assert e.value.retry_after == 30.0
+    assert asyncio.run(service.prompt_llm_async(PROMPT)) is None
+    assert mock_client.create_with_completion.await_count == 1
+
+
+def test_llm_error_response():
+    from src.main import app
+    from src.services import music_plan_service
+
+    error = LlmError(LlmErrorKind.CIRCUIT_OPEN, "llama3", "circuit open", retry_after=4.2)
+    with patch.object(music_plan_service, "generate_music_plan_given_description_async",
+                      AsyncMock(side_effect=error)):
+        response = TestClient(app).get("/create_music_plan", params={"description": "calm piano"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    assert response.json() == {"error": "circuit open", "kind": "circuit_open", "model": "llama3", "retry_after": 4.2}
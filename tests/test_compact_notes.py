@@ -0,0 +1,85 @@
+import json
+import pytest
+from src.schemas.music import MusicNotes, SectionChannelsResponse, ChannelNotes
+from src.schemas.note_events import REST_PITCH
+from src.services.compact_notes import CompactNotesParser, parse_compact_notes, format_compact_notes
+
+
+COMPACT_TEXT = """```
+melody|A|3: 1 D4 q 80; 2 F4 e 85; 2.5 A4 e. 85
+bass|A|3: 1 D2 h 90; 3 r q 0
+perc|A|3: 1 kick s 100; 1 42 t 70
+```"""
+
+
+def test_parse_compact_notes():
+    response = parse_compact_notes(COMPACT_TEXT)
+
+    assert isinstance(response, SectionChannelsResponse)
+    assert [channel.channel for channel in response.channels] == ["melody", "bass", "perc"]
+    melody_bar = response.channels[0].sections[0].bars[0]
+    assert response.channels[0].sections[0].section == "A"
+    assert melody_bar.bar == 3
+    assert melody_bar.events.to_list() == [[1, "D4", "quarter", 80], [2, "F4", "eighth", 85], [2.5, "A4", "dotted_eighth", 85]]
+    assert response.channels[1].sections[0].bars[0].events[1].pitch == REST_PITCH
+    assert response.channels[2].sections[0].bars[0].events.to_list() == [[1, "kick", "sixteenth", 100], [1, 42, "thirty-second", 70]]
+
+
+def test_parse_compact_notes_matches_json_events():
+    compact = parse_compact_notes("melody|Intro|1: 1 C4 quarter 80; 1.5 Zz4 q 70")
+    expected = SectionChannelsResponse.model_validate({"channels": [{"channel": "melody", "sections": [
+        {"section": "Intro", "bars": [{"bar": 1, "events": [[1, "C4", "quarter", 80], [1.5, "Zz4", "quarter", 70]]}]}
+    ]}]})
+
+    assert compact == expected
+
+
+def test_parser_accepts_chunks_split_anywhere():
+    parser = CompactNotesParser()
+    for start in range(0, len(COMPACT_TEXT), 7):
+        parser.feed(COMPACT_TEXT[start:start + 7])
+
+    assert parser.close() == parse_compact_notes(COMPACT_TEXT)
+
+
+def test_repeated_bar_lines_are_merged():
+    response = parse_compact_notes("melody|A|1: 1 C4 q 80\nmelody|A|1: 2 D4 q 80\nmelody|A|2: 1 E4 q 80")
+
+    bars = response.channels[0].sections[0].bars
+    assert [bar.bar for bar in bars] == [1, 2]
+    assert len(bars[0].events) == 2
+
+
+@pytest.mark.parametrize("text,message", [
+    ("melody|A|1: 1 C4 q 80\nmelody A 2: 1 C4 q 80", "line 2"),
+    ("melody|A|1: 1 C4 q", "beat pitch duration velocity"),
+    ("melody|A|1: 1 C4 x 80", "unknown duration"),
+    ("melody|A|1: 1 C4 q 200", "velocity"),
+    ("melody|A|1: 1 300 q 80", "pitch"),
+    ("Sure, here are the notes!", "line 1"),
+    ("", "no bar lines"),
+])
+def test_parse_compact_notes_invalid(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse_compact_notes(text)
+
+
+def test_format_compact_notes_round_trip():
+    with open("music_notes.json", "r") as f:
+        music_notes = MusicNotes.model_validate(json.load(f))
+
+    compact = format_compact_notes(music_notes)
+
+    assert parse_compact_notes(compact).channels == music_notes.channels
+    assert len(compact) < len(music_notes.model_dump_json()) * 0.6
+
+
+def test_format_compact_notes_keeps_spelled_events_parseable():
+    notes = SectionChannelsResponse.model_validate({"channels": [{"channel": "perc", "sections": [{"section": "A", "bars": [
+        {"bar": 1, "events": [[1, "Closed Hat", "8th", 70], [2, "bd", "quarter", 90], [3, "rest", "half", 0]]}
+    ]}]}]})
+
+    compact = format_compact_notes(notes)
+
+    assert compact == "perc|A|1: 1 42 8th 70; 2 bd q 90; 3 r h 0"
+    assert parse_compact_notes(compact).channels == notes.channels
@@ -0,0 +1,91 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.fake_llm_server import create_app, FakeLlmConfig
+from src.schemas.music import MusicPlan, MusicChords, MusicRhythm, SectionChannelsResponse, NoteFormat
+from src.services.compact_notes import parse_compact_notes
+from src.services.music_plan import MusicPlanService
+from src.services.notes_gen import NotesGenService
+
+
+def chat_body(prompt_request, stream=False):
+    messages = [
+        {"role": "user", "content": prompt_request.user_messages},
+        {"role": "system", "content": prompt_request.system_messages},
+    ]
+    if prompt_request.response_parser is None:
+        # What instructor's JSON mode adds: the response schema in a system message
+        schema = json.dumps(prompt_request.response_format.model_json_schema(), indent=2)
+        messages.insert(0, {"role": "system", "content": f"provide the parsed objects in json that match the following json_schema:\n\n{schema}"})
+    return {"model": "fake", "messages": messages, "stream": stream}
+
+
+def chat(client, prompt_request):
+    return client.post("/v1/chat/completions", json=chat_body(prompt_request))
+
+
+def content(response):
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def test_stages_answer_schema_valid_and_consistent():
+    client = TestClient(create_app(FakeLlmConfig()))
+    plan_service = MusicPlanService(llm_service=None)
+
+    music_plan = MusicPlan.model_validate_json(content(chat(client, plan_service._build_music_plan_request("A song"))))
+    music_chords = MusicChords.model_validate_json(content(chat(client, plan_service._build_music_chords_request(music_plan))))
+    music_rhythm = MusicRhythm.model_validate_json(content(chat(client, plan_service._build_music_rhythm_request(music_chords))))
+
+    planned = [(sec.section, sec.bars) for sec in music_plan.structure]
+    assert [(sec.name, sec.bars) for sec in music_chords.sections] == planned
+    assert [(sec.section, sec.bars) for sec in music_rhythm.sections] == planned
+
+    notes_service = NotesGenService(llm_service=None)
+    section = music_rhythm.sections[1]
+    notes = SectionChannelsResponse.model_validate_json(content(chat(
+        client, notes_service._build_section_notes_request(section.section, music_plan, music_rhythm)
+    )))
+    assert {channel.channel for channel in notes.channels} == {"melody", "bass", "harmony", "perc"}
+    assert all(len(channel.sections[0].bars) == section.bars for channel in notes.channels)
+
+    compact = parse_compact_notes(content(chat(
+        client, notes_service._build_section_notes_request(section.section, music_plan, music_rhythm, note_format=NoteFormat.COMPACT)
+    )))
+    assert [(channel.channel, len(channel.sections[0].bars)) for channel in compact.channels] == [
+        (channel.channel, section.bars) for channel in notes.channels
+    ]
+    assert client.get("/stats").json()["stages"] == {
+        "MusicPlan": 1, "MusicChords": 1, "MusicRhythm": 1, "SectionChannelsResponse": 1, "compact_notes": 1,
+    }
+
+
+def test_streamed_answer_reassembles():
+    client = TestClient(create_app(FakeLlmConfig()))
+    prompt_request = MusicPlanService(llm_service=None)._build_music_plan_request("A song")
+
+    body = {**chat_body(prompt_request, stream=True), "stream_options": {"include_usage": True}}
+    with client.stream("POST", "/v1/chat/completions", json=body) as response:
+        lines = [line for line in response.iter_lines() if line.startswith("data: ")]
+
+    assert lines[-1] == "data: [DONE]"
+    chunks = [json.loads(line[len("data: "):]) for line in lines[:-1]]
+    assert chunks[-1]["choices"] == [] and chunks[-1]["usage"]["completion_tokens"] > 0
+    text = "".join(chunk["choices"][0]["delta"].get("content") or "" for chunk in chunks[:-1])
+    assert MusicPlan.model_validate_json(text) == MusicPlan.model_validate_json(content(chat(client, prompt_request)))
+
+
+def test_injected_failures():
+    plan_request = MusicPlanService(llm_service=None)._build_music_plan_request("A song")
+
+    rate_limited = chat(TestClient(create_app(FakeLlmConfig(rate_limit_rate=1.0, retry_after=2))), plan_request)
+    assert rate_limited.status_code == 429
+    assert rate_limited.headers["Retry-After"] == "2"
+
+    assert chat(TestClient(create_app(FakeLlmConfig(error_rate=1.0))), plan_request).status_code == 500
+
+    client = TestClient(create_app(FakeLlmConfig(malformed_rate=1.0)))
+    malformed = chat(client, plan_request)
+    assert malformed.status_code == 200
+    with pytest.raises(ValueError):
+        json.loads(content(malformed))
+    assert client.get("/stats").json()["outcomes"] == {"malformed": 1}
@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, MagicMock, patch
+from src.services.hedging import LatencyTracker, HedgePolicy
+from src.services.llm import LlmService
+from src.schemas.openrouter import PromptRequest
+
+
+def make_policy(**kwargs):
+    policy = HedgePolicy(min_samples=10, max_ratio=1.0, **kwargs)
+    for _ in range(10):
+        policy.latencies.record("slow-model", 0.05)
+    return policy
+
+
+def make_service(policy, latencies, failures=(), queued=0.0, track_threads=False):
+    """
+    LlmService whose calls to each model take the given seconds, or raise for failing models,
+    after waiting `queued` seconds for the rate limiter; calls record the thread they ran on
+    with `track_threads`.
+    """
+    with patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'}):
+        service = LlmService(llm_provider="openrouter", hedge_policy=policy)
+    calls = []
+
+    def complete(prompt_request, model, on_admitted=None, abandoned=None):
+        time.sleep(queued)
+        if on_admitted is not None:
+            on_admitted()
+        calls.append((model, threading.current_thread().name) if track_threads else model)
+        time.sleep(latencies[model])
+        if model in failures:
+            raise RuntimeError(f"{model} failed")
+        return f"response from {model}", Mock()
+
+    async def complete_async(prompt_request, model, on_admitted=None):
+        await asyncio.sleep(queued)
+        if on_admitted is not None:
+            on_admitted()
+        calls.append((model, threading.current_thread().name) if track_threads else model)
+        await asyncio.sleep(latencies[model])
+        if model in failures:
+            raise RuntimeError(f"{model} failed")
+        return f"response from {model}", Mock()
+
+    service._complete = complete
+    service._complete_async = complete_async
+    return service, calls
+
+
+PROMPT = PromptRequest(user_messages="Hi", system_messages="", model="slow-model")
+
+
+def test_latency_tracker_quantile():
+    tracker = LatencyTracker(window=10)
+    assert tracker.quantile("m", 0.9) is None
+    for seconds in range(1, 21):
+        tracker.record("m", seconds)
+
+    assert tracker.count("m") == 10
+    assert tracker.quantile("m", 0.9) == 20
+    assert tracker.quantile("m", 0.5) == 16
+
+
+def test_hedge_policy_needs_samples_and_budget():
+    policy = HedgePolicy(min_samples=3, max_ratio=0.5)
+    assert policy.hedge_delay("m") is None
+    for seconds in (1, 2, 3):
+        policy.latencies.record("m", seconds)
+
+    assert policy.hedge_delay("m") == 3
+    # Two calls so far allow one hedge
+    assert policy.try_acquire() is True
+    assert policy.try_acquire() is False
+    assert policy.snapshot() == {"calls": 2, "hedges": 1}
+    assert policy.hedge_model("m") == "m"
+    assert HedgePolicy(fallback_model="fast").hedge_model("m") == "fast"
+
+
+def test_async_hedge_to_fallback_wins_and_cancels_primary():
+    service, calls = make_service(make_policy(fallback_model="fast-model"), {"slow-model": 5, "fast-model": 0.01})
+
+    start = time.perf_counter()
+    response = asyncio.run(service.prompt_llm_async(PROMPT))
+
+    assert response == "response from fast-model"
+    assert calls == ["slow-model", "fast-model"]
+    assert time.perf_counter() - start < 1
+
+
+def test_async_fast_primary_not_hedged():
+    policy = make_policy(fallback_model="fast-model")
+    service, calls = make_service(policy, {"slow-model": 0.01, "fast-model": 0.01})
+
+    assert asyncio.run(service.prompt_llm_async(PROMPT)) == "response from slow-model"
+    assert calls == ["slow-model"]
+    assert policy.hedges == 0
+
+
+def test_async_hedge_failure_falls_back_to_primary():
+    service, calls = make_service(
+        make_policy(fallback_model="fast-model"), {"slow-model": 0.2, "fast-model": 0.01}, failures={"fast-model"}
+    )
+
+    assert asyncio.run(service.prompt_llm_async(PROMPT)) == "response from slow-model"
+    assert calls == ["slow-model", "fast-model"]
+
+
+def test_hedge_budget_exhausted_waits_for_primary():
+    policy = make_policy()
+    policy.max_ratio = 0
+    service, calls = make_service(policy, {"slow-model": 0.2})
+
+    assert asyncio.run(service.prompt_llm_async(PROMPT)) == "response from slow-model"
+    assert calls == ["slow-model"]
+
+
+def test_sync_hedge_same_model():
+    latencies = iter([0.5, 0.01])
+    service, calls = make_service(make_policy(), {"slow-model": 0})
+    original = service._complete
+
+    def complete(prompt_request, model, on_admitted=None, abandoned=None):
+        if on_admitted is not None:
+            on_admitted()
+        time.sleep(next(latencies))
+        return original(prompt_request, model, None, abandoned)
+
+    service._complete = complete
+
+    start = time.perf_counter()
+    assert service.prompt_llm(PROMPT) == "response from slow-model"
+    assert calls == ["slow-model"]  # the hedge answered while the primary was still sleeping
+    assert time.perf_counter() - start < 0.4
+
+
+def test_calls_queued_in_the_rate_limiter_are_not_hedged():
+    # Queued far longer than the 0.05s hedge delay, then answering quickly
+    policy = make_policy(fallback_model="fast-model")
+    service, calls = make_service(policy, {"slow-model": 0.01, "fast-model": 0.01}, queued=0.2)
+
+    assert asyncio.run(service.prompt_llm_async(PROMPT)) == "response from slow-model"
+    assert service.prompt_llm(PROMPT) == "response from slow-model"
+    assert calls == ["slow-model", "slow-model"]
+    assert policy.hedges == 0
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_latency_excludes_the_rate_limiter_wait(mock_instructor):
+    mock_client = Mock()
+    mock_client.create_with_completion.return_value = ("ok", Mock())
+    mock_instructor.return_value = mock_client
+    limiter = Mock()
+
+    def acquire(model, tokens, key):
+        time.sleep(0.2)
+        return MagicMock(waited=0.2)
+
+    limiter.acquire.side_effect = acquire
+    policy = HedgePolicy()
+    service = LlmService(llm_provider="openrouter", hedge_policy=policy, rate_limiter=limiter)
+
+    assert service.prompt_llm(PROMPT) == "ok"
+    assert policy.latencies.quantile("slow-model", 1.0) < 0.1
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_sync_losing_call_latency_not_recorded(mock_instructor):
+    mock_client = Mock()
+
+    def create_with_completion(model, **kwargs):
+        time.sleep(0.3 if model == "slow-model" else 0.01)
+        return f"response from {model}", Mock()
+
+    mock_client.create_with_completion.side_effect = create_with_completion
+    mock_instructor.return_value = mock_client
+    policy = make_policy(fallback_model="fast-model")
+    service = LlmService(llm_provider="openrouter", hedge_policy=policy)
+
+    assert service.prompt_llm(PROMPT) == "response from fast-model"
+    # Let the losing primary run to the end
+    service._hedge_executor.shutdown(wait=True)
+    assert policy.latencies.count("fast-model") == 1
+    assert policy.latencies.count("slow-model") == 10
+    assert policy.latencies.quantile("slow-model", 1.0) == 0.05
+
+
+def test_sync_hedging_bounded_by_executor_slots():
+    with patch('src.services.llm.app_settings.llm_max_connections', 2):
+        policy = make_policy(fallback_model="fast-model")
+        service, calls = make_service(policy, {"slow-model": 0.3, "fast-model": 0.01}, track_threads=True)
+
+    # The hedge wins; the losing primary keeps its slot until it ends
+    assert service.prompt_llm(PROMPT) == "response from fast-model"
+    # One slot left: the next slow call runs on it, but has no slot for a hedge
+    assert service.prompt_llm(PROMPT) == "response from slow-model"
+    assert policy.hedges == 1
+
+    # Every slot held by losers still running: calls run inline and unhedged
+    for _ in range(2):
+        service._hedge_slots.acquire()
+    calls.clear()
+    assert service.prompt_llm(PROMPT) == "response from slow-model"
+    assert calls == [("slow-model", threading.current_thread().name)]
+    assert policy.hedges == 1
@@ -1,12 +1,30 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 from src.main import app
-from src.schemas.music import MusicPlan, MusicRhythm, MusicNotes, TempoFeel, Instrument, StructureSection, LengthScale, RhythmSection
+from src.schemas.music import MusicPlan, MusicRhythm, MusicNotes, SectionChannelsResponse, PlanMode, ChannelNotes, SectionNotes, BarNotes, TempoFeel, Instrument, StructureSection, LengthScale, RhythmSection
+from src.services.circuit_breaker import LlmError, LlmErrorKind
+from src.services.notes_gen import NotesGenService
+from src.services.pipeline import GenerationPipeline
 
 client = TestClient(app)
 
 
+def streamed_rhythm(rhythm):
+    async def stream(music_chords, on_section, **kwargs):
+        for section in rhythm.sections:
+            on_section(section)
+        return rhythm
+    return stream
+
+
+def pipeline_with(mock_plan_service, mock_notes_service):
+    mock_plan_service.plan_mode = PlanMode.STAGED
+    mock_notes_service.slice_context = True
+    mock_notes_service.collect_music_notes.side_effect = NotesGenService(Mock()).collect_music_notes
+    return patch('src.routes.llm.generation_pipeline', GenerationPipeline(mock_plan_service, mock_notes_service))
+
+
 @patch('src.routes.llm.music_plan_service')
 @patch('src.routes.llm.notes_gen_service')
 @patch('src.routes.llm.json_to_midi_bytes')
@@ -27,13 +45,19 @@ def test_full_pipeline_generate_midi_from_description(mock_midi, mock_notes_serv
     mock_rhythm = MusicRhythm(sections=[
         RhythmSection(section="Intro", bars=4, bass=["pattern"], perc=["kick"], melody=["mel"], harmony=["harm"], voiceLeading=["vl"], dynamics=["dyn"], polyphony="mono", loop="repeat")
     ])
-    mock_notes = MusicNotes(channels=[])
+    section_notes = SectionChannelsResponse(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="Intro", bars=[BarNotes(bar=1, events=[[1.0, "C4", "quarter", 80]])])
+        ])
+    ])
 
-    mock_plan_service.generate_music_rhythm_given_description.return_value = (mock_plan, mock_rhythm)
-    mock_notes_service.generate_all_channel_notes.return_value = mock_notes
+    mock_plan_service.generate_music_chords_given_description_async = AsyncMock(return_value=(mock_plan, Mock()))
+    mock_plan_service.stream_music_rhythm_given_chords_async = streamed_rhythm(mock_rhythm)
+    mock_notes_service.generate_section_notes_given_music_rhythm_async = AsyncMock(return_value=section_notes)
     mock_midi.return_value = b'midi_bytes'
 
-    response = client.get("/generate_midi_from_description?description=A jazz piece")
+    with pipeline_with(mock_plan_service, mock_notes_service):
+        response = client.get("/generate_midi_from_description?description=A jazz piece")
 
     assert response.status_code == 200
     data = response.json()
@@ -41,13 +65,16 @@ def test_full_pipeline_generate_midi_from_description(mock_midi, mock_notes_serv
     assert data["description"] == "A jazz piece"
 
 
-@patch('src.routes.llm.music_plan_service')
-def test_pipeline_failure_at_plan(mock_plan_service):
-    mock_plan_service.generate_music_rhythm_given_description.return_value = (None, None)
+def test_pipeline_failure_at_plan():
+    mock_plan_service = Mock()
+    mock_plan_service.generate_music_chords_given_description_async = AsyncMock(
+        side_effect=LlmError(LlmErrorKind.VALIDATION, "llama3", "invalid plan")
+    )
 
-    response = client.get("/generate_midi_from_description?description=A jazz piece")
+    with pipeline_with(mock_plan_service, Mock()):
+        response = client.get("/generate_midi_from_description?description=A jazz piece")
 
-    assert response.status_code == 200
+    assert response.status_code == 502
     data = response.json()
     assert "error" in data
 
@@ -69,10 +96,11 @@ def test_pipeline_failure_at_notes(mock_notes_service, mock_plan_service):
     )
     mock_rhythm = MusicRhythm(sections=[])
 
-    mock_plan_service.generate_music_rhythm_given_description.return_value = (mock_plan, mock_rhythm)
-    mock_notes_service.generate_all_channel_notes.return_value = None
+    mock_plan_service.generate_music_chords_given_description_async = AsyncMock(return_value=(mock_plan, Mock()))
+    mock_plan_service.stream_music_rhythm_given_chords_async = streamed_rhythm(mock_rhythm)
 
-    response = client.get("/generate_midi_from_description?description=A jazz piece")
+    with pipeline_with(mock_plan_service, mock_notes_service):
+        response = client.get("/generate_midi_from_description?description=A jazz piece")
 
     assert response.status_code == 200
     data = response.json()
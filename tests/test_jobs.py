@@ -0,0 +1,171 @@
+import time
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+from src.main import app
+from src.services.jobs import JobManager, JobQueueFullError
+from src.schemas.jobs import JobRequest, JobState, JobStage
+from src.schemas.music import MusicRhythm, MusicNotes, RhythmSection
+
+client = TestClient(app)
+
+
+def make_rhythm(section_names):
+    return MusicRhythm(sections=[
+        RhythmSection(section=name, bars=4, bass=["b"], perc=["p"], melody=["m"], harmony=["h"], voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat")
+        for name in section_names
+    ])
+
+
+def wait_for(manager, job_id, states=(JobState.COMPLETED, JobState.FAILED), timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = manager.get_status(job_id)
+        if status.state in states:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not reach {states}")
+
+
+@pytest.fixture
+def mock_services():
+    plan_service = Mock()
+    notes_service = Mock()
+
+    def fake_rhythm(description, model, kwargs, on_stage, run_id, plan_mode):
+        for stage in ["plan", "chords", "rhythm"]:
+            on_stage(stage)
+        return Mock(), make_rhythm(["Intro", "A"])
+
+    def fake_notes(music_plan, music_rhythm, model, kwargs, on_section_complete, run_id, note_format):
+        for section in music_rhythm.sections:
+            on_section_complete(section.section, Mock())
+        return MusicNotes(channels=[])
+
+    plan_service.generate_music_rhythm_given_description.side_effect = fake_rhythm
+    notes_service.generate_all_channel_notes.side_effect = fake_notes
+    return plan_service, notes_service
+
+
+def test_job_runs_to_completion(mock_services):
+    manager = JobManager(*mock_services, max_workers=1)
+
+    status = manager.submit(JobRequest(description="A jazz piece"))
+    assert status.state == JobState.QUEUED
+
+    final = wait_for(manager, status.job_id)
+    assert final.state == JobState.COMPLETED
+    assert final.stage == JobStage.DONE
+    assert final.progress.sections_total == 2
+    assert final.progress.sections_done == 2
+    assert manager.get_result(status.job_id)[:4] == b"MThd"
+
+
+def test_job_failure_reported(mock_services):
+    plan_service, notes_service = mock_services
+    plan_service.generate_music_rhythm_given_description.side_effect = None
+    plan_service.generate_music_rhythm_given_description.return_value = None
+    manager = JobManager(plan_service, notes_service, max_workers=1)
+
+    status = manager.submit(JobRequest(description="A jazz piece"))
+    final = wait_for(manager, status.job_id)
+
+    assert final.state == JobState.FAILED
+    assert "rhythm" in final.error
+    assert manager.get_result(status.job_id) is None
+
+
+def test_job_queue_depth_bounded(mock_services):
+    plan_service, notes_service = mock_services
+    release = threading.Event()
+    plan_service.generate_music_rhythm_given_description.side_effect = lambda **kwargs: release.wait(5) and None
+    manager = JobManager(plan_service, notes_service, max_workers=1, queue_depth=1)
+
+    running = manager.submit(JobRequest(description="first"))
+    wait_for(manager, running.job_id, states=(JobState.RUNNING,))
+    manager.submit(JobRequest(description="second"))
+    with pytest.raises(JobQueueFullError):
+        manager.submit(JobRequest(description="third"))
+
+    release.set()
+    manager.shutdown()
+
+
+def test_finished_jobs_evicted_beyond_retention(mock_services):
+    manager = JobManager(*mock_services, max_workers=1, retention=1)
+
+    first = manager.submit(JobRequest(description="first"))
+    wait_for(manager, first.job_id)
+    second = manager.submit(JobRequest(description="second"))
+    wait_for(manager, second.job_id)
+    manager.submit(JobRequest(description="third"))
+
+    assert manager.get_status(first.job_id) is None
+    assert manager.get_status(second.job_id) is not None
+
+
+@patch('src.routes.jobs.job_manager')
+def test_submit_job_route_queue_full(mock_manager):
+    mock_manager.submit.side_effect = JobQueueFullError("Job queue is full")
+
+    response = client.post("/jobs", json={"description": "A jazz piece"})
+
+    assert response.status_code == 503
+
+
+def test_job_routes_end_to_end(mock_services):
+    manager = JobManager(*mock_services, max_workers=1)
+    with patch('src.routes.jobs.job_manager', manager):
+        response = client.post("/jobs", json={"description": "A jazz piece"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        wait_for(manager, job_id)
+        status = client.get(f"/jobs/{job_id}").json()
+        assert status["state"] == "completed"
+        assert status["progress"] == {"sections_total": 2, "sections_done": 2}
+
+        result = client.get(f"/jobs/{job_id}/result")
+        assert result.status_code == 200
+        assert result.json()["description"] == "A jazz piece"
+        assert "midi_data" in result.json()
+
+        binary = client.get(f"/jobs/{job_id}/result", headers={"Accept": "audio/midi"})
+        assert binary.headers["content-type"] == "audio/midi"
+        assert binary.content == manager.get_result(job_id)
+
+
+def test_job_routes_unknown_and_pending():
+    manager = Mock()
+    manager.get_status.return_value = None
+    manager.get_status_and_result.return_value = (None, None)
+    with patch('src.routes.jobs.job_manager', manager):
+        assert client.get("/jobs/missing").status_code == 404
+        assert client.get("/jobs/missing/result").status_code == 404
+
+    manager.get_status_and_result.return_value = (Mock(state=JobState.RUNNING), None)
+    with patch('src.routes.jobs.job_manager', manager):
+        assert client.get("/jobs/running/result").status_code == 409
+
+
+def test_job_result_of_an_evicted_job_is_not_found(mock_services):
+    manager = JobManager(*mock_services, max_workers=1, retention=0)
+    status = manager.submit(JobRequest(description="A jazz piece"))
+    wait_for(manager, status.job_id)
+    completed, midi_bytes = manager.get_status_and_result(status.job_id)
+    assert completed.state == JobState.COMPLETED and midi_bytes[:4] == b"MThd"
+
+    # The next submission evicts the finished job; status and bytes go together
+    manager.submit(JobRequest(description="Another piece"))
+    assert manager.get_status_and_result(status.job_id) == (None, None)
+    with patch('src.routes.jobs.job_manager', manager):
+        assert client.get(f"/jobs/{status.job_id}/result").status_code == 404
+
+    # A completed status without bytes is a missing result, not a server error
+    race = Mock()
+    race.get_status_and_result.return_value = (completed, None)
+    with patch('src.routes.jobs.job_manager', race):
+        response = client.get(f"/jobs/{status.job_id}/result")
+    assert response.status_code == 404
+    assert "no longer available" in response.json()["detail"]
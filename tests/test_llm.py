@@ -1,5 +1,6 @@
+import asyncio
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch, ANY
 from src.services.llm import LlmService
 from src.services.midi import duration_to_ticks, pitch_to_midi
 from src.schemas.openrouter import PromptRequest, CompletionKwargs
@@ -8,9 +9,9 @@ from src.schemas.openrouter import PromptRequest, CompletionKwargs
 def test_llm_service_initialization_openrouter():
     service = LlmService(llm_provider="openrouter")
     assert service.llm_provider == "openrouter"
-    assert service.client is None
+    assert len(service.client_pool) == 0
 
-@patch('instructor.from_provider')
+@patch('instructor.from_openai')
 @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
 def test_prompt_llm_openrouter(mock_instructor):
     mock_client = Mock()
@@ -42,7 +43,8 @@ def test_prompt_llm_openrouter(mock_instructor):
         ],
         response_model=None,
         **mocked_config,
-        max_retries=3
+        max_retries=ANY,
+        hooks=ANY
     )
     assert response == "Test response"
 
@@ -64,3 +66,110 @@ def test_pitch_to_midi():
     assert pitch_to_midi(60) == 60
     assert pitch_to_midi("rest") == -1
     assert pitch_to_midi("kick", is_percussion=True) == 36
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_async_openrouter(mock_instructor):
+    mock_client = Mock()
+    mock_client.create_with_completion = AsyncMock(return_value=("Test response", Mock()))
+    mock_instructor.return_value = mock_client
+
+    service = LlmService(llm_provider="openrouter")
+    prompt_request = PromptRequest(
+        user_messages="Hello, LLM!",
+        system_messages="You are a helpful assistant.",
+        model="llama3",
+        kwargs=CompletionKwargs(temperature=0.7)
+    )
+
+    response = asyncio.run(service.prompt_llm_async(prompt_request))
+
+    assert response == "Test response"
+    mock_client.create_with_completion.assert_awaited_once()
+    assert mock_client.create_with_completion.call_args.kwargs["model"] == "llama3"
+    assert mock_client.create_with_completion.call_args.kwargs["temperature"] == 0.7
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_async_failure_returns_none(mock_instructor):
+    mock_client = Mock()
+    mock_client.create_with_completion = AsyncMock(side_effect=RuntimeError("boom"))
+    mock_instructor.return_value = mock_client
+
+    service = LlmService(llm_provider="openrouter")
+    prompt_request = PromptRequest(user_messages="Hi", system_messages="", model="llama3")
+
+    assert asyncio.run(service.prompt_llm_async(prompt_request)) is None
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_served_from_cache(mock_instructor, tmp_path):
+    from src.services.cache import StageCache
+    from src.schemas.music import MusicRhythm
+
+    rhythm = MusicRhythm(sections=[])
+    mock_client = Mock()
+    mock_client.create_with_completion.return_value = (rhythm, Mock())
+    mock_instructor.return_value = mock_client
+
+    service = LlmService(llm_provider="openrouter", cache=StageCache(str(tmp_path)))
+    prompt_request = PromptRequest(
+        user_messages="rhythm please", system_messages="", model="llama3", response_format=MusicRhythm
+    )
+
+    assert service.prompt_llm(prompt_request) == rhythm
+    assert service.prompt_llm(prompt_request) == rhythm
+    assert asyncio.run(service.prompt_llm_async(prompt_request)) == rhythm
+
+    # Only the first call reaches the LLM
+    assert mock_client.create_with_completion.call_count == 1
+
+def _text_completion(text):
+    completion = Mock()
+    completion.choices = [Mock(message=Mock(content=text))]
+    return completion
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_response_parser_reasks_on_parse_error(mock_instructor):
+    from src.services.compact_notes import parse_compact_notes
+    from src.schemas.music import SectionChannelsResponse
+
+    mock_client = Mock()
+    mock_client.client.chat.completions.create.side_effect = [
+        _text_completion("Here are your notes"),
+        _text_completion("melody|A|1: 1 C4 q 80"),
+    ]
+    mock_instructor.return_value = mock_client
+
+    service = LlmService(llm_provider="openrouter")
+    prompt_request = PromptRequest(
+        user_messages="notes please", system_messages="", model="llama3",
+        response_format=SectionChannelsResponse, response_parser=parse_compact_notes
+    )
+
+    response = service.prompt_llm(prompt_request)
+
+    assert response.channels[0].sections[0].bars[0].events.to_list() == [[1, "C4", "quarter", 80]]
+    mock_client.create_with_completion.assert_not_called()
+    first_call, second_call = mock_client.client.chat.completions.create.call_args_list
+    assert "response_model" not in first_call.kwargs and "max_retries" not in first_call.kwargs
+    assert second_call.kwargs["messages"][-2] == {"role": "assistant", "content": "Here are your notes"}
+    assert "line 1" in second_call.kwargs["messages"][-1]["content"]
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_async_response_parser_gives_up(mock_instructor):
+    from src.services.compact_notes import parse_compact_notes
+
+    mock_client = Mock()
+    mock_client.client.chat.completions.create = AsyncMock(return_value=_text_completion("not notes"))
+    mock_instructor.return_value = mock_client
+
+    service = LlmService(llm_provider="openrouter")
+    prompt_request = PromptRequest(
+        user_messages="notes please", system_messages="", model="llama3", response_parser=parse_compact_notes
+    )
+
+    assert asyncio.run(service.prompt_llm_async(prompt_request)) is None
+    assert mock_client.client.chat.completions.create.await_count == 3
@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+import httpx
+import instructor
+from src.services.llm_pool import LlmClientPool, ConnectionStats
+
+
+@patch('instructor.from_openai')
+def test_get_client_reuses_pooled_client(mock_from_openai):
+    mock_from_openai.side_effect = lambda *args, **kwargs: Mock()
+    pool = LlmClientPool(api_key="fake")
+
+    first = pool.get_client("model-a", "https://example.com/v1")
+    second = pool.get_client("model-a", "https://example.com/v1")
+
+    assert first is second
+    assert mock_from_openai.call_count == 1
+    assert len(pool) == 1
+
+
+@patch('instructor.from_openai')
+def test_get_client_keyed_by_model_and_mode(mock_from_openai):
+    mock_from_openai.side_effect = lambda *args, **kwargs: Mock()
+    pool = LlmClientPool(api_key="fake")
+
+    json_client = pool.get_client("model-a", "https://example.com/v1", instructor.Mode.JSON)
+    tools_client = pool.get_client("model-a", "https://example.com/v1", instructor.Mode.TOOLS)
+    other_model = pool.get_client("model-b", "https://example.com/v1")
+
+    assert len({id(json_client), id(tools_client), id(other_model)}) == 3
+    # All clients for the same base url share one keep-alive http client
+    http_clients = {id(call.args[0]._client) for call in mock_from_openai.call_args_list}
+    assert len(http_clients) == 1
+
+
+@patch('instructor.from_openai')
+def test_get_client_lru_eviction(mock_from_openai):
+    mock_from_openai.side_effect = lambda *args, **kwargs: Mock()
+    pool = LlmClientPool(api_key="fake", max_clients=2)
+
+    client_a = pool.get_client("model-a", "https://example.com/v1")
+    pool.get_client("model-b", "https://example.com/v1")
+    # Touch model-a so model-b becomes least recently used
+    assert pool.get_client("model-a", "https://example.com/v1") is client_a
+    pool.get_client("model-c", "https://example.com/v1")
+
+    assert len(pool) == 2
+    assert pool.get_client("model-a", "https://example.com/v1") is client_a
+    pool.get_client("model-b", "https://example.com/v1")
+    assert mock_from_openai.call_count == 4
+
+
+def test_connection_limits_applied():
+    pool = LlmClientPool(api_key="fake", max_connections=7, max_keepalive_connections=3)
+    http_client = pool._get_http_client("https://example.com/v1")
+
+    assert isinstance(http_client, httpx.Client)
+    assert pool.limits.max_connections == 7
+    assert pool.limits.max_keepalive_connections == 3
+
+
+def test_connection_stats_counts_reuse():
+    pool = LlmClientPool(api_key="fake")
+    for _ in range(3):
+        request = httpx.Request("POST", "https://example.com/v1/chat/completions")
+        pool._on_request(request)
+        assert request.extensions["trace"] == pool._trace
+    pool._trace("connection.connect_tcp.complete", {})
+
+    assert pool.stats.snapshot() == {"requests": 3, "new_connections": 1, "reused_connections": 2}
+
+
+def test_connection_stats_never_negative():
+    stats = ConnectionStats()
+    stats.record_new_connection()
+    assert stats.reused_connections == 0
+
+
+@patch('instructor.from_openai')
+def test_get_async_client_pooled_per_event_loop(mock_from_openai):
+    mock_from_openai.side_effect = lambda *args, **kwargs: Mock()
+    pool = LlmClientPool(api_key="fake")
+
+    async def get_twice():
+        first = pool.get_async_client("model-a", "https://example.com/v1")
+        second = pool.get_async_client("model-a", "https://example.com/v1")
+        assert first is second
+        return first
+
+    client_loop_1 = asyncio.run(get_twice())
+    client_loop_2 = asyncio.run(get_twice())
+
+    # A new event loop must not reuse clients bound to a previous loop
+    assert client_loop_1 is not client_loop_2
+    assert isinstance(mock_from_openai.call_args.args[0]._client, httpx.AsyncClient)
+
+
+@patch('instructor.from_openai')
+def test_aclose_async_clients_closes_the_running_loops_connections(mock_from_openai):
+    mock_from_openai.side_effect = lambda *args, **kwargs: Mock()
+    pool = LlmClientPool(api_key="fake")
+
+    async def use_and_close():
+        pool.get_async_client("model-a", "https://example.com/v1")
+        http_client = mock_from_openai.call_args.args[0]._client
+        await pool.aclose_async_clients()
+        return http_client
+
+    http_client = asyncio.run(use_and_close())
+
+    assert http_client.is_closed
+    assert len(pool) == 0
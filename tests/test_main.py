@@ -1,3 +1,4 @@
+from unittest.mock import Mock, AsyncMock, patch
 from fastapi.testclient import TestClient
 from src.main import app
 
@@ -11,4 +12,14 @@ def test_read_root():
 def test_health_check():
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy"}
\ No newline at end of file
+    assert response.json() == {"status": "healthy"}
+
+def test_shutdown_closes_pooled_llm_clients():
+    pool = Mock()
+    pool.aclose_async_clients = AsyncMock()
+    with patch('src.main.llm_service.client_pool', pool):
+        with TestClient(app):
+            pool.aclose_async_clients.assert_not_awaited()
+
+    pool.aclose_async_clients.assert_awaited_once()
+    pool.close.assert_called_once()
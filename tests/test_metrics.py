@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+from src.main import app
+from src.metrics import (
+    Counter, Gauge, Histogram, MetricsRegistry, observe_stage, STAGE_DURATION, LLM_TOKENS, LLM_RETRIES, LLM_REQUESTS
+)
+from src.services.llm import LlmService
+from src.schemas.openrouter import PromptRequest
+
+client = TestClient(app)
+
+
+def test_counter_and_gauge_render():
+    registry = MetricsRegistry()
+    tokens = registry.register(Counter("tokens_total", "Tokens", ["model", "kind"]))
+    in_flight = registry.register(Gauge("in_flight", "In flight"))
+
+    tokens.inc(10, model='a"b', kind="prompt")
+    tokens.inc(5, model='a"b', kind="prompt")
+    with in_flight.track_inprogress():
+        assert in_flight.value() == 1
+    with pytest.raises(ValueError):
+        tokens.inc(-1, model="a", kind="prompt")
+    with pytest.raises(ValueError):
+        tokens.inc(model="a")
+
+    text = registry.render()
+    assert "# TYPE tokens_total counter" in text
+    assert 'tokens_total{model="a\\"b",kind="prompt"} 15' in text
+    assert "in_flight 0" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, stage="plan")
+
+    lines = histogram.render().splitlines()
+    assert 'latency_seconds_bucket{stage="plan",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="plan",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{stage="plan",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{stage="plan"} 6.05' in lines
+    assert 'latency_seconds_count{stage="plan"} 4' in lines
+
+
+def test_observe_stage_sync_and_async():
+    @observe_stage("test_sync")
+    def sync_stage():
+        return 1
+
+    @observe_stage("test_async")
+    async def async_stage():
+        return 2
+
+    assert sync_stage() == 1
+    assert asyncio.run(async_stage()) == 2
+    assert STAGE_DURATION.count(stage="test_sync") == 1
+    assert STAGE_DURATION.count(stage="test_async") == 1
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_llm_usage_and_retries_recorded(mock_instructor):
+    completion = Mock()
+    completion.usage.prompt_tokens = 100
+    completion.usage.completion_tokens = 40
+    completion.usage.completion_tokens_details.reasoning_tokens = 25
+
+    def create_with_completion(hooks, **params):
+        # instructor emits completion:kwargs once per attempt
+        hooks.emit_completion_arguments(**params)
+        hooks.emit_completion_arguments(**params)
+        return "response", completion
+
+    mock_client = Mock()
+    mock_client.create_with_completion.side_effect = create_with_completion
+    mock_instructor.return_value = mock_client
+
+    service = LlmService(llm_provider="openrouter")
+    assert service.prompt_llm(PromptRequest(user_messages="Hi", system_messages="", model="metrics-model")) == "response"
+
+    assert LLM_TOKENS.value(model="metrics-model", kind="prompt") == 100
+    assert LLM_TOKENS.value(model="metrics-model", kind="completion") == 40
+    assert LLM_TOKENS.value(model="metrics-model", kind="reasoning") == 25
+    assert LLM_RETRIES.value(model="metrics-model") == 1
+    assert LLM_REQUESTS.value(model="metrics-model", outcome="success") == 1
+
+
+def test_metrics_route():
+    client.get("/health")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE anyllm2music_stage_duration_seconds histogram" in response.text
+    assert "anyllm2music_http_requests_in_flight 1" in response.text
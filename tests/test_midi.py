@@ -1,7 +1,12 @@
+import json
 import pytest
+from pathlib import Path
 from mido import MidiFile
 from io import BytesIO
-from src.services.midi import json_to_midi_bytes, beat_to_ticks, json_to_midi, pitch_to_midi, duration_to_ticks
+from src.services.midi import (
+    json_to_midi_bytes, json_to_midi_bytes_mido, beat_to_ticks, json_to_midi, pitch_to_midi, duration_to_ticks,
+    collect_unknown_pitches
+)
 from src.schemas.music import MusicNotes, ChannelNotes, SectionNotes, BarNotes
 
 
@@ -74,6 +79,43 @@ def test_duration_to_ticks():
         duration_to_ticks("invalid")
 
 
+@pytest.mark.parametrize("pitch, expected", [
+    ("C-1", 0),
+    ("G9", 127),
+    ("B#3", 60),
+    ("Cb4", 59),
+    ("Fbb4", 63),
+    ("F##4", 67),
+    ("eb4", 63),
+    ("C10", None),
+    ("H4", None),
+])
+def test_pitch_to_midi_spellings(pitch, expected):
+    if expected is None:
+        with pytest.raises(ValueError):
+            pitch_to_midi(pitch)
+    else:
+        assert pitch_to_midi(pitch) == expected
+
+
+@pytest.mark.parametrize("pitch, expected", [
+    ("closed-hat", 42),
+    ("hat", 42),
+    ("Open Hi-Hat", 46),
+    ("hand_clap", 39),
+    ("tom1", 41),
+    ("unknown drum", 36),
+])
+def test_pitch_to_midi_percussion_aliases(pitch, expected):
+    assert pitch_to_midi(pitch, is_percussion=True) == expected
+
+
+def test_duration_to_ticks_aliases():
+    assert duration_to_ticks("dotted-quarter") == 720
+    assert duration_to_ticks("16th") == duration_to_ticks("sixteenth") == 120
+    assert duration_to_ticks("thirty-second") == 60
+
+
 def test_json_to_midi_bytes_empty():
     empty_notes = MusicNotes(channels=[])
     midi_bytes = json_to_midi_bytes(empty_notes)
@@ -82,4 +124,98 @@ def test_json_to_midi_bytes_empty():
     buffer = BytesIO(midi_bytes)
     mid = MidiFile(file=buffer)
     # Empty notes result in no tracks
-    assert len(mid.tracks) == 0
\ No newline at end of file
+    assert len(mid.tracks) == 0
+
+
+def test_json_to_midi_bytes_matches_mido_on_sample_file():
+    with open(Path(__file__).parent.parent / "music_notes.json", "r") as f:
+        music_notes = MusicNotes.model_validate(json.load(f))
+
+    assert json_to_midi_bytes(music_notes) == json_to_midi_bytes_mido(music_notes)
+
+
+def test_json_to_midi_bytes_matches_mido(sample_music_notes):
+    assert json_to_midi_bytes(sample_music_notes) == json_to_midi_bytes_mido(sample_music_notes)
+    assert json_to_midi_bytes(sample_music_notes, bpm=90) == json_to_midi_bytes_mido(sample_music_notes, bpm=90)
+
+
+def test_json_to_midi_bytes_matches_mido_edge_cases():
+    music_notes = MusicNotes(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="A", bars=[
+                BarNotes(bar=40, events=[
+                    [1.0, "C4", "whole", 80],
+                    [1.0, "rest", "quarter", 0],
+                    [1.0, "E4", "quarter", 127],
+                ])
+            ])
+        ]),
+        # Duplicate channel names share the last track, as in the mido path
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="B", bars=[BarNotes(bar=1, events=[[2.5, 62, "eighth", 60]])])
+        ]),
+    ])
+
+    assert json_to_midi_bytes(music_notes) == json_to_midi_bytes_mido(music_notes)
+
+
+def test_json_to_midi_bytes_percussion_uses_resolved_pitches():
+    music_notes = MusicNotes(channels=[
+        ChannelNotes(channel="perc", sections=[
+            SectionNotes(section="A", bars=[BarNotes(bar=1, events=[
+                [1.0, "snare", "quarter", 100],
+                [2.0, 42, "quarter", 60],
+            ])])
+        ])
+    ])
+
+    mid = MidiFile(file=BytesIO(json_to_midi_bytes(music_notes)))
+    note_ons = [msg for msg in mid.tracks[0] if msg.type == "note_on"]
+    assert [(msg.note, msg.velocity, msg.channel) for msg in note_ons] == [(38, 80, 9), (42, 60, 9)]
+
+
+def test_json_to_midi_bytes_reports_unknown_pitches_once(caplog):
+    music_notes = MusicNotes(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="A", bars=[
+                BarNotes(bar=1, events=[[1.0, "C10", "quarter", 80], [2.0, "C4", "quarter", 80]]),
+                BarNotes(bar=2, events=[[1.0, "C10", "quarter", 80], [2.0, "X#4", "quarter", 80]]),
+            ])
+        ])
+    ])
+
+    assert collect_unknown_pitches(music_notes) == {"C10": 2, "X#4": 1}
+    with caplog.at_level("WARNING"):
+        midi_bytes = json_to_midi_bytes(music_notes)
+
+    mid = MidiFile(file=BytesIO(midi_bytes))
+    assert [msg.note for msg in mid.tracks[0] if msg.type == "note_on"] == [60]
+    warnings = [record for record in caplog.records if "unknown pitches" in record.getMessage()]
+    assert len(warnings) == 1
+    assert "Skipped 3 events" in warnings[0].getMessage()
+
+
+def test_json_to_midi_bytes_plays_unknown_percussion_as_kick(caplog):
+    music_notes = MusicNotes(channels=[
+        ChannelNotes(channel="perc", sections=[
+            SectionNotes(section="A", bars=[BarNotes(bar=1, events=[
+                [1.0, "bongo_thing", "quarter", 90],
+                [2.0, "snare", "quarter", 100],
+            ])])
+        ]),
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="A", bars=[BarNotes(bar=1, events=[[1.0, "C10", "quarter", 80]])])
+        ]),
+    ])
+
+    with caplog.at_level("WARNING"):
+        midi_bytes = json_to_midi_bytes(music_notes)
+
+    assert midi_bytes == json_to_midi_bytes_mido(music_notes)
+    mid = MidiFile(file=BytesIO(midi_bytes))
+    assert [msg.note for msg in mid.tracks[0] if msg.type == "note_on"] == [36, 38]
+    assert [msg.note for msg in mid.tracks[1] if msg.type == "note_on"] == []
+    warnings = [record.getMessage() for record in caplog.records if "unknown" in record.getMessage()]
+    assert len(warnings) == 1
+    assert "Skipped 1 events with unknown pitches: {'C10': 1}" in warnings[0]
+    assert "Played 1 unknown percussion events as kick: {'bongo_thing': 1}" in warnings[0]
@@ -1,7 +1,8 @@
+import asyncio
 import pytest
-from unittest.mock import Mock, patch, mock_open
+from unittest.mock import Mock, AsyncMock, patch, mock_open
 from src.services.music_plan import MusicPlanService
-from src.schemas.music import MusicPlan, MusicChords, MusicRhythm, TempoFeel, Instrument, StructureSection, LengthScale
+from src.schemas.music import MusicPlan, MusicChords, MusicRhythm, PlanMode, MusicChordsRhythm, MusicPlanChordsRhythm, TempoFeel, Instrument, StructureSection, LengthScale
 
 
 @pytest.fixture
@@ -77,4 +78,56 @@ def test_generate_music_rhythm_given_description_plan_failure(mock_llm_service):
 
     result = service.generate_music_rhythm_given_description("A jazz piece")
 
-    assert result is None
\ No newline at end of file
+    assert result is None
+
+def test_generate_music_rhythm_given_description_async(mock_llm_service, sample_music_plan, sample_music_chords, sample_music_rhythm):
+    service = MusicPlanService(mock_llm_service)
+    mock_llm_service.prompt_llm_async = AsyncMock(side_effect=[sample_music_plan, sample_music_chords, sample_music_rhythm])
+
+    with patch("builtins.open", mock_open()) as mock_file:
+        result = asyncio.run(service.generate_music_rhythm_given_description_async("A jazz piece"))
+
+    assert result == (sample_music_plan, sample_music_rhythm)
+    assert mock_llm_service.prompt_llm_async.await_count == 3
+    mock_llm_service.prompt_llm.assert_not_called()
+
+
+def test_generate_music_rhythm_given_description_async_plan_failure(mock_llm_service):
+    service = MusicPlanService(mock_llm_service)
+    mock_llm_service.prompt_llm_async = AsyncMock(return_value=None)
+
+    result = asyncio.run(service.generate_music_rhythm_given_description_async("A jazz piece"))
+
+    assert result is None
+    assert mock_llm_service.prompt_llm_async.await_count == 1
+
+
+def test_generate_music_rhythm_given_description_fast(mock_llm_service, sample_music_plan, sample_music_chords, sample_music_rhythm):
+    service = MusicPlanService(mock_llm_service, plan_mode=PlanMode.FAST)
+    mock_llm_service.prompt_llm.return_value = MusicPlanChordsRhythm(
+        music_plan=sample_music_plan, music_chords=sample_music_chords, music_rhythm=sample_music_rhythm
+    )
+    stages = []
+
+    result = service.generate_music_rhythm_given_description("A jazz piece", on_stage=stages.append)
+
+    assert result == (sample_music_plan, sample_music_rhythm)
+    # One call answering all three stages
+    prompt_request = mock_llm_service.prompt_llm.call_args[0][0]
+    assert prompt_request.response_format is MusicPlanChordsRhythm
+    assert "A jazz piece" in prompt_request.user_messages
+    assert stages == ["plan"]
+
+
+def test_generate_music_rhythm_given_description_async_fused(mock_llm_service, sample_music_plan, sample_music_chords, sample_music_rhythm):
+    service = MusicPlanService(mock_llm_service)
+    mock_llm_service.prompt_llm_async = AsyncMock(side_effect=[
+        sample_music_plan, MusicChordsRhythm(music_chords=sample_music_chords, music_rhythm=sample_music_rhythm)
+    ])
+
+    result = asyncio.run(service.generate_music_rhythm_given_description_async("A jazz piece", plan_mode=PlanMode.FUSED))
+
+    assert result == (sample_music_plan, sample_music_rhythm)
+    fused_request = mock_llm_service.prompt_llm_async.await_args_list[1].args[0]
+    assert fused_request.response_format is MusicChordsRhythm
+    assert sample_music_plan.model_dump_json() in fused_request.user_messages
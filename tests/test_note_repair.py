@@ -0,0 +1,114 @@
+import json
+import httpx
+import instructor
+import openai
+import pytest
+from pydantic import ValidationError
+from src.metrics import NOTE_REPAIRS, NOTE_REPAIR_FIXES
+from src.schemas.music import SectionChannelsResponse
+from src.services.compact_notes import parse_compact_notes, repair_compact_notes
+from src.services.note_repair import (
+    RepairedSectionChannelsResponse, repair_event, repair_section_channels, snap_duration,
+)
+
+
+def section(events):
+    return {"channels": [{"channel": "melody", "sections": [{"section": "A", "bars": [{"bar": 1, "events": events}]}]}]}
+
+
+@pytest.mark.parametrize("token, expected", [
+    ("32nd-triplet", "thirty-second"),
+    ("triplet quarter", "dotted_eighth"),
+    ("dotted 8th note", "dotted_eighth"),
+    ("1/8", "eighth"),
+    ("0.75", "dotted_eighth"),
+    (2, "half"),
+    ("Half-Note", "half"),
+    ("staccato", None),
+    (None, None),
+])
+def test_snap_duration(token, expected):
+    assert snap_duration(token) == expected
+
+
+def test_repair_event():
+    assert repair_event([1, "C4", "quarter", 80]) == ([1, "C4", "quarter", 80], [])
+    assert repair_event(["1.5", "D4", "32nd-triplet", 130]) == (
+        [1.5, "D4", "thirty-second", 127], ["beat_type", "duration_snapped", "velocity_clamped"]
+    )
+    assert repair_event({"beat": 2, "pitch": "60", "duration": "eighth"}) == (
+        [2, 60, "eighth", 80], ["event_object", "pitch_type", "missing_velocity"]
+    )
+    assert repair_event([3, "kick", "sixteenth", 99.6]) == ([3, "kick", "sixteenth", 100], ["velocity_type"])
+
+    for event in (["x", "C4", "quarter", 80], [1, None, "quarter", 80], [1, "C4", "staccato", 80], [1]):
+        with pytest.raises(ValueError):
+            repair_event(event)
+
+
+def test_repaired_response_fixes_near_valid_output():
+    data = section([[1, "C4", "quarter", 130], ["2", "E4", "32nd-triplet"]])
+    with pytest.raises(ValidationError):
+        SectionChannelsResponse.model_validate(data)
+    repaired_before = NOTE_REPAIRS.value(format="json", outcome="repaired")
+    snapped_before = NOTE_REPAIR_FIXES.value(fix="duration_snapped")
+
+    response = RepairedSectionChannelsResponse.model_validate_json(json.dumps(data))
+
+    assert response.channels[0].sections[0].bars[0].events.to_list() == [
+        [1.0, "C4", "quarter", 127], [2.0, "E4", "thirty-second", 80]
+    ]
+    assert NOTE_REPAIRS.value(format="json", outcome="repaired") == repaired_before + 1
+    assert NOTE_REPAIR_FIXES.value(fix="duration_snapped") == snapped_before + 1
+    # Same schema, so the same prompt, as the plain response model
+    assert RepairedSectionChannelsResponse.model_json_schema() == SectionChannelsResponse.model_json_schema()
+
+
+def test_repaired_response_still_rejects_broken_output():
+    failed_before = NOTE_REPAIRS.value(format="json", outcome="failed")
+    for data in (section([[1, "C4", "staccato", 80]]), {"channels": [{"channel": "melody"}]}):
+        with pytest.raises(ValidationError):
+            RepairedSectionChannelsResponse.model_validate(data)
+    assert NOTE_REPAIRS.value(format="json", outcome="failed") == failed_before + 2
+    assert repair_section_channels("not a dict") == ("not a dict", {})
+
+
+def test_repair_saves_the_reprompt():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        content = json.dumps(section([[1, "C4", "quarter", 130]]))
+        return httpx.Response(200, json={
+            "id": "1", "object": "chat.completion", "created": 0, "model": "m",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        })
+
+    client = instructor.from_openai(openai.OpenAI(
+        api_key="fake", base_url="http://llm.test/v1", http_client=httpx.Client(transport=httpx.MockTransport(handler))
+    ), mode=instructor.Mode.JSON)
+    response = client.chat.completions.create(
+        model="m", messages=[{"role": "user", "content": "notes"}],
+        response_model=RepairedSectionChannelsResponse, max_retries=3,
+    )
+
+    assert len(requests) == 1
+    assert response.channels[0].sections[0].bars[0].events[0].velocity == 127
+
+
+def test_repair_compact_notes():
+    text = "melody|A|1: 1 C4 q 130; 2 E4 32nd-triplet 80; 3 G4 h\nbass|A|1: 1 C2 w 90"
+    with pytest.raises(ValueError):
+        parse_compact_notes(text)
+    repaired_before = NOTE_REPAIRS.value(format="compact", outcome="repaired")
+
+    response = repair_compact_notes(text)
+
+    melody, bass = response.channels
+    assert melody.sections[0].bars[0].events.to_list() == [
+        [1.0, "C4", "quarter", 127], [2.0, "E4", "thirty-second", 80], [3.0, "G4", "half", 80]
+    ]
+    assert bass.sections[0].bars[0].events.to_list() == [[1.0, "C2", "whole", 90]]
+    assert NOTE_REPAIRS.value(format="compact", outcome="repaired") == repaired_before + 1
+    with pytest.raises(ValueError, match="line 1"):
+        repair_compact_notes("melody|A|1: 1 C4 staccato 80")
@@ -1,5 +1,9 @@
+import asyncio
+import contextvars
+import threading
+import time
 import pytest
-from unittest.mock import Mock, patch, mock_open
+from unittest.mock import Mock, AsyncMock, patch, mock_open
 from src.services.notes_gen import NotesGenService
 from src.schemas.music import MusicPlan, MusicRhythm, SectionChannelsResponse, ChannelNotes, SectionNotes, BarNotes, RhythmSection, TempoFeel, Instrument, StructureSection, LengthScale
 
@@ -72,4 +76,244 @@ def test_generate_all_channel_notes_no_sections(mock_llm_service, sample_music_p
 
     result = service.generate_all_channel_notes(sample_music_plan, empty_rhythm)
 
-    assert result is None
\ No newline at end of file
+    assert result is None
+
+def test_generate_all_channel_notes_async(mock_llm_service, sample_music_plan, sample_section_channels_response):
+    service = NotesGenService(mock_llm_service)
+    rhythm = MusicRhythm(sections=[
+        RhythmSection(section=name, bars=4, bass=["b"], perc=["p"], melody=["m"], harmony=["h"], voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat")
+        for name in ["Intro", "A", "Outro"]
+    ])
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_prompt(prompt_request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return sample_section_channels_response
+
+    mock_llm_service.prompt_llm_async = AsyncMock(side_effect=fake_prompt)
+
+    with patch("builtins.open", mock_open()) as mock_file:
+        result = asyncio.run(service.generate_all_channel_notes_async(sample_music_plan, rhythm))
+
+    assert result is not None
+    assert result.channels[0].channel == "melody"
+    assert len(result.channels[0].sections) == 3
+    # All sections are awaited concurrently on one event loop
+    assert max_in_flight == 3
+
+
+def test_generate_all_channel_notes_async_no_sections(mock_llm_service, sample_music_plan):
+    service = NotesGenService(mock_llm_service)
+
+    result = asyncio.run(service.generate_all_channel_notes_async(sample_music_plan, MusicRhythm(sections=[])))
+
+    assert result is None
+
+
+def test_generate_all_channel_notes_reports_section_progress(mock_llm_service, sample_music_plan, sample_music_rhythm, sample_section_channels_response):
+    service = NotesGenService(mock_llm_service)
+    mock_llm_service.prompt_llm.return_value = sample_section_channels_response
+    completed = []
+
+    with patch("builtins.open", mock_open()) as mock_file:
+        service.generate_all_channel_notes(
+            sample_music_plan, sample_music_rhythm,
+            on_section_complete=lambda section, result: completed.append((section, result))
+        )
+
+    assert completed == [("Intro", sample_section_channels_response)]
+
+
+def test_iter_section_notes_async_yields_in_completion_order(mock_llm_service, sample_music_plan, sample_section_channels_response):
+    service = NotesGenService(mock_llm_service)
+    rhythm = MusicRhythm(sections=[
+        RhythmSection(section=name, bars=4, bass=["b"], perc=["p"], melody=["m"], harmony=["h"], voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat")
+        for name in ["Slow", "Fast"]
+    ])
+
+    async def fake_prompt(prompt_request):
+        await asyncio.sleep(0.05 if "Slow section" in prompt_request.user_messages else 0)
+        return sample_section_channels_response
+
+    mock_llm_service.prompt_llm_async = AsyncMock(side_effect=fake_prompt)
+
+    async def collect():
+        return [name async for name, _ in service.iter_section_notes_async(sample_music_plan, rhythm)]
+
+    assert asyncio.run(collect()) == ["Fast", "Slow"]
+
+
+def test_repeated_sections_generated_once(mock_llm_service, sample_music_plan, sample_section_channels_response):
+    service = NotesGenService(mock_llm_service)
+    _, rhythm = make_long_piece(sample_music_plan, ["Intro", "A", "B", "A"])
+    mock_llm_service.prompt_llm_async = AsyncMock(return_value=sample_section_channels_response)
+
+    with patch("builtins.open", mock_open()):
+        result = asyncio.run(service.generate_all_channel_notes_async(sample_music_plan, rhythm))
+
+    assert mock_llm_service.prompt_llm_async.await_count == 3
+    sections = result.channels[0].sections
+    assert [sec.section for sec in sections] == ["Intro", "A", "B", "A"]
+    # Each occurrence at its place in the song, 4 bars each
+    assert [sec.bars[0].bar for sec in sections] == [1, 5, 9, 13]
+
+
+def test_repeated_sections_dedup_disabled(mock_llm_service, sample_music_plan, sample_section_channels_response):
+    service = NotesGenService(mock_llm_service, dedup_repeats=False)
+    _, rhythm = make_long_piece(sample_music_plan, ["Intro", "A", "B", "A"])
+    mock_llm_service.prompt_llm.return_value = sample_section_channels_response
+    completed = []
+
+    with patch("builtins.open", mock_open()):
+        service.generate_all_channel_notes(
+            sample_music_plan, rhythm, on_section_complete=lambda section, result: completed.append(section)
+        )
+
+    assert mock_llm_service.prompt_llm.call_count == 4
+    assert sorted(completed) == ["A", "A", "B", "Intro"]
+
+
+def test_variation_kwargs():
+    variations = NotesGenService.variation_kwargs({"max_tokens": 100}, 3, seed=10, temperatures=[0.5, 1.0])
+
+    assert [v["seed"] for v in variations] == [10, 11, 12]
+    assert [v["temperature"] for v in variations] == [0.5, 1.0, 0.5]
+    assert all(v["max_tokens"] == 100 for v in variations)
+    assert "temperature" not in NotesGenService.variation_kwargs(None, 1)[0]
+
+
+def test_generate_variations_async_shares_concurrency_budget(mock_llm_service, sample_music_plan, sample_section_channels_response):
+    service = NotesGenService(mock_llm_service)
+    rhythm = MusicRhythm(sections=[
+        RhythmSection(section=name, bars=4, bass=["b"], perc=["p"], melody=["m"], harmony=["h"], voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat")
+        for name in ["Intro", "A"]
+    ])
+    in_flight = 0
+    max_in_flight = 0
+    seeds = []
+
+    async def fake_prompt(prompt_request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        seeds.append(prompt_request.kwargs.seed)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        # The second variation fails
+        return None if prompt_request.kwargs.seed == 1 else sample_section_channels_response
+
+    mock_llm_service.prompt_llm_async = AsyncMock(side_effect=fake_prompt)
+
+    results = asyncio.run(service.generate_variations_async(
+        sample_music_plan, rhythm, NotesGenService.variation_kwargs(None, 3, seed=0), max_concurrency=2
+    ))
+
+    assert len(results) == 3
+    assert results[1] is None
+    assert len(results[0].channels[0].sections) == 2
+    assert sorted(seeds) == [0, 0, 1, 1, 2, 2]
+    assert max_in_flight == 2
+
+
+def test_concurrent_sync_generations_interleave(mock_llm_service, sample_music_plan, sample_section_channels_response):
+    from src.services.rate_limit import LlmRateLimiter
+
+    # One call at a time; calls are queued per request, like the trace id does for LlmService
+    limiter = LlmRateLimiter(max_in_flight=1)
+    request_id = contextvars.ContextVar("request_id")
+    order = []
+
+    def fake_prompt(prompt_request):
+        with limiter.acquire("m", 1, key=request_id.get()):
+            order.append(request_id.get())
+            time.sleep(0.01)
+        return sample_section_channels_response
+
+    mock_llm_service.prompt_llm.side_effect = fake_prompt
+    service = NotesGenService(mock_llm_service, max_section_workers=4)
+
+    def generate(name, sections):
+        request_id.set(name)
+        _, rhythm = make_long_piece(sample_music_plan, [f"{name}{index}" for index in range(sections)])
+        service.generate_all_channel_notes(sample_music_plan, rhythm)
+
+    big = threading.Thread(target=generate, args=("big", 8))
+    big.start()
+    time.sleep(0.02)
+    small = threading.Thread(target=generate, args=("small", 2))
+    small.start()
+    big.join()
+    small.join()
+
+    # The small request is served between the big one's calls, not after all of them
+    assert order.count("small") == 2
+    assert max(i for i, name in enumerate(order) if name == "small") < len(order) - 3
+
+
+def make_long_piece(sample_music_plan, names):
+    rhythm = MusicRhythm(sections=[
+        RhythmSection(section=name, bars=4, bass=[f"{name} bass"], perc=["p"], melody=[f"{name} melody"], harmony=["h"], voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat")
+        for name in names
+    ])
+    plan = sample_music_plan.model_copy(update={
+        "structure": [StructureSection(section=name, bars=4, transition=f"{name} transition") for name in names],
+        "motivic_ideas": {**{name: f"{name} motif" for name in names}, "overall": "global idea"},
+    })
+    return plan, rhythm
+
+
+def test_section_context_sliced_to_neighbours(mock_llm_service, sample_music_plan):
+    service = NotesGenService(mock_llm_service)
+    plan, rhythm = make_long_piece(sample_music_plan, ["Intro", "A", "B", "C", "Outro"])
+
+    prompt = service._build_section_notes_request("B", plan, rhythm).user_messages
+
+    assert "B melody" in prompt
+    assert "A transition" in prompt and "C transition" in prompt
+    assert "global idea" in prompt and "Jazz" in prompt
+    # Only the neighbours' summaries, nothing from distant sections
+    assert "A melody" not in prompt
+    assert "Intro motif" not in prompt and "Outro transition" not in prompt
+
+
+def test_section_context_slicing_disabled(mock_llm_service, sample_music_plan):
+    service = NotesGenService(mock_llm_service, slice_context=False)
+    plan, rhythm = make_long_piece(sample_music_plan, ["Intro", "A", "Outro"])
+
+    prompt = service._build_section_notes_request("Intro", plan, rhythm).user_messages
+
+    assert rhythm.model_dump_json() in prompt
+
+
+def test_prompt_token_report(mock_llm_service, sample_music_plan):
+    service = NotesGenService(mock_llm_service)
+    plan, rhythm = make_long_piece(sample_music_plan, [f"S{i}" for i in range(12)])
+
+    report = service.prompt_token_report(plan, rhythm)
+
+    assert list(report) == [f"S{i}" for i in range(12)]
+    assert all(tokens["sliced"] < tokens["full"] for tokens in report.values())
+
+
+def test_compact_note_format_request(mock_llm_service, sample_music_plan, sample_music_rhythm):
+    from src.schemas.music import NoteFormat
+    from src.services.compact_notes import parse_compact_notes, repair_compact_notes
+    service = NotesGenService(mock_llm_service)
+
+    json_request = service._build_section_notes_request("Intro", sample_music_plan, sample_music_rhythm)
+    compact_request = service._build_section_notes_request(
+        "Intro", sample_music_plan, sample_music_rhythm, note_format=NoteFormat.COMPACT
+    )
+
+    assert json_request.response_parser is None
+    assert compact_request.response_parser is repair_compact_notes
+    assert issubclass(compact_request.response_format, SectionChannelsResponse)
+    assert "channel|section|bar" in compact_request.user_messages
+    assert NotesGenService(mock_llm_service, note_format=NoteFormat.COMPACT, repair=False)._build_section_notes_request(
+        "Intro", sample_music_plan, sample_music_rhythm
+    ).response_parser is parse_compact_notes
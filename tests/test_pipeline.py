@@ -0,0 +1,374 @@
+import asyncio
+from unittest.mock import Mock, MagicMock, AsyncMock, patch
+import pytest
+from openai.types.chat import ChatCompletionChunk
+from openai.types.completion_usage import CompletionUsage
+from src.metrics import LLM_TOKENS
+from src.schemas.music import Instrument, LengthScale, MusicChords, MusicPlan, StructureSection, TempoFeel, MusicPlanChordsRhythm, MusicRhythm, RhythmSection, PlanMode
+from src.schemas.openrouter import PromptRequest
+from src.services.circuit_breaker import LlmError, LlmErrorKind
+from src.services.llm import LlmService
+from src.services.music_plan import MusicPlanService
+from src.services.pipeline import GenerationPipeline
+
+
+def rhythm_section(name):
+    return RhythmSection(
+        section=name, bars=2, bass=["b"], perc=["p"], melody=["m"], harmony=["h"],
+        voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat"
+    )
+
+
+PLAN = MusicPlan(
+    genre_style="Jazz", mood_emotion="Relaxed", tempo_feel=TempoFeel(bpm=120, meter="4/4", feel="Swing"),
+    key_tonality="C Major", instruments=[Instrument(name="Piano", role="melody")],
+    structure=[StructureSection(section="Intro", bars=2, transition="Fade in")], motivic_ideas={},
+    dynamic_contour="Flat", length_scale=LengthScale(total_bars=6, duration_seconds="0:12"), looping_behavior="None"
+)
+CHORDS = MusicChords(key="C", sections=[])
+RHYTHM = MusicRhythm(sections=[rhythm_section(name) for name in ["Intro", "A", "Outro"]])
+
+
+def growing_partials(rhythm):
+    # What a stream of the rhythm looks like: each section appears, then grows until the next one starts
+    return [MusicRhythm(sections=rhythm.sections[:count]) for count in range(1, len(rhythm.sections) + 1)]
+
+
+async def streamed_chunks(response, chunk_size=40, usage=None):
+    # An OpenAI chat completion stream of the response's JSON, then the usage chunk if requested
+    text = response.model_dump_json()
+    for start in range(0, len(text), chunk_size):
+        yield ChatCompletionChunk.model_validate({
+            "id": "c", "created": 0, "model": "m", "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": text[start:start + chunk_size]}}],
+        })
+    if usage is not None:
+        yield ChatCompletionChunk(id="c", created=0, model="m", object="chat.completion.chunk", choices=[], usage=usage)
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_streaming_async(mock_instructor):
+    usage = CompletionUsage(prompt_tokens=120, completion_tokens=300, total_tokens=420)
+    mock_client = Mock()
+    mock_client.client.chat.completions.create = AsyncMock(return_value=streamed_chunks(RHYTHM, usage=usage))
+    mock_instructor.return_value = mock_client
+    permit = MagicMock(waited=0.0)
+    permit.__enter__.return_value = permit
+    limiter = Mock(acquire_async=AsyncMock(return_value=permit))
+    service = LlmService(llm_provider="openrouter", rate_limiter=limiter)
+    partials = []
+
+    response = asyncio.run(service.prompt_llm_streaming_async(
+        PromptRequest(user_messages="Hi", system_messages="", model="stream-model", response_format=MusicRhythm),
+        partials.append
+    ))
+
+    assert response == RHYTHM
+    # Sections appear in the partials as they are streamed
+    assert len(partials) > 1 and len(partials[0].sections) < len(RHYTHM.sections)
+    assert mock_client.client.chat.completions.create.await_args.kwargs["stream_options"] == {"include_usage": True}
+    assert LLM_TOKENS.value(model="stream-model", kind="prompt") == 120
+    assert LLM_TOKENS.value(model="stream-model", kind="completion") == 300
+    assert permit.used_tokens == 420
+
+
+def test_stream_rhythm_emits_each_section_once_complete():
+    llm_service = Mock()
+    emitted = []
+
+    async def prompt_llm_streaming_async(prompt_request, on_partial, raise_errors=False):
+        for partial in growing_partials(RHYTHM):
+            on_partial(partial)
+            # Only sections followed by another one are complete
+            assert [section.section for section in emitted] == [s.section for s in partial.sections[:-1]]
+        return RHYTHM
+
+    llm_service.prompt_llm_streaming_async = prompt_llm_streaming_async
+    service = MusicPlanService(llm_service)
+
+    result = asyncio.run(service.stream_music_rhythm_given_chords_async(CHORDS, emitted.append))
+
+    assert result == RHYTHM
+    assert emitted == RHYTHM.sections
+
+
+def test_stream_rhythm_falls_back_to_a_plain_call():
+    llm_service = Mock()
+    llm_service.prompt_llm_streaming_async = AsyncMock(side_effect=LlmError(LlmErrorKind.ERROR, "m", "no stream"))
+    llm_service.prompt_llm_async = AsyncMock(return_value=RHYTHM)
+    emitted = []
+
+    result = asyncio.run(MusicPlanService(llm_service).stream_music_rhythm_given_chords_async(CHORDS, emitted.append))
+
+    assert result == RHYTHM
+    assert emitted == RHYTHM.sections
+    assert llm_service.prompt_llm_async.await_args.kwargs["raise_errors"] is True
+
+
+def test_stream_rhythm_resumes_without_streaming_after_emitting_sections():
+    llm_service = Mock()
+
+    async def prompt_llm_streaming_async(prompt_request, on_partial, raise_errors=False):
+        for partial in growing_partials(RHYTHM)[:2]:
+            on_partial(partial)
+        # Final validation of the streamed answer fails after "Intro" was emitted
+        raise LlmError(LlmErrorKind.VALIDATION, "m", "bad json")
+
+    llm_service.prompt_llm_streaming_async = prompt_llm_streaming_async
+    llm_service.prompt_llm_async = AsyncMock(return_value=RHYTHM)
+    emitted = []
+
+    result = asyncio.run(MusicPlanService(llm_service).stream_music_rhythm_given_chords_async(CHORDS, emitted.append))
+
+    assert result == RHYTHM
+    # Each section once: the retry only adds the sections after the emitted ones
+    assert emitted == RHYTHM.sections
+    retry = llm_service.prompt_llm_async.await_args.args[0]
+    assert '"section": "Intro"' in retry.user_messages and '"section": "A"' not in retry.user_messages
+    # Answers that changed the emitted section are invalid, so they get re-asked
+    retry.response_format.model_validate(RHYTHM.model_dump())
+    changed = MusicRhythm(sections=[rhythm_section("Verse"), *RHYTHM.sections[1:]])
+    with pytest.raises(ValueError, match="already sent"):
+        retry.response_format.model_validate(changed.model_dump())
+
+
+def test_stream_fused_plan_resumes_without_streaming_after_sending_the_plan():
+    llm_service = Mock()
+
+    async def prompt_llm_streaming_async(prompt_request, on_partial, raise_errors=False):
+        for partial in growing_partials(RHYTHM)[:2]:
+            on_partial(MusicPlanChordsRhythm.model_construct(music_plan=PLAN, music_chords=CHORDS, music_rhythm=partial))
+        raise LlmError(LlmErrorKind.ERROR, "m", "stream cut")
+
+    answer = MusicPlanChordsRhythm(music_plan=PLAN, music_chords=CHORDS, music_rhythm=RHYTHM)
+    llm_service.prompt_llm_streaming_async = prompt_llm_streaming_async
+    llm_service.prompt_llm_async = AsyncMock(return_value=answer)
+    calls = []
+
+    result = asyncio.run(MusicPlanService(llm_service).stream_fused_music_plan_async(
+        "A jazz piece",
+        lambda music_plan, music_chords: calls.append(("plan", music_plan, music_chords)),
+        lambda section: calls.append(("section", section.section)),
+    ))
+
+    assert result == (PLAN, CHORDS, RHYTHM)
+    assert calls == [("plan", PLAN, CHORDS), ("section", "Intro"), ("section", "A"), ("section", "Outro")]
+    response_format = llm_service.prompt_llm_async.await_args.args[0].response_format
+    response_format.model_validate(answer.model_dump())
+    with pytest.raises(ValueError, match="music_chords"):
+        response_format.model_validate({**answer.model_dump(), "music_chords": {"key": "D", "sections": []}})
+
+
+def test_stream_fused_plan_sends_plan_before_sections():
+    llm_service = Mock()
+    calls = []
+
+    async def prompt_llm_streaming_async(prompt_request, on_partial, raise_errors=False):
+        # The plan and chords are streamed first, then the rhythm grows; fields not reached yet
+        # are empty dict placeholders in instructor's partials
+        on_partial(MusicPlanChordsRhythm.model_construct(music_plan=PLAN, music_chords={}, music_rhythm={}))
+        for partial in growing_partials(RHYTHM):
+            on_partial(MusicPlanChordsRhythm.model_construct(music_plan=PLAN, music_chords=CHORDS, music_rhythm=partial))
+        return MusicPlanChordsRhythm(music_plan=PLAN, music_chords=CHORDS, music_rhythm=RHYTHM)
+
+    llm_service.prompt_llm_streaming_async = prompt_llm_streaming_async
+    service = MusicPlanService(llm_service)
+
+    result = asyncio.run(service.stream_fused_music_plan_async(
+        "A jazz piece",
+        lambda music_plan, music_chords: calls.append(("plan", music_plan, music_chords)),
+        lambda section: calls.append(("section", section.section)),
+    ))
+
+    assert result == (PLAN, CHORDS, RHYTHM)
+    assert calls == [("plan", PLAN, CHORDS), ("section", "Intro"), ("section", "A"), ("section", "Outro")]
+
+
+def make_pipeline(slice_context=True, pipelining=True):
+    plan_service = Mock()
+    plan_service.plan_mode = PlanMode.STAGED
+    plan_service.generate_music_chords_given_description_async = AsyncMock(return_value=(Mock(), Mock()))
+    notes_service = Mock()
+    notes_service.slice_context = slice_context
+    notes_service.dedup_repeats = True
+    return GenerationPipeline(plan_service, notes_service, pipelining=pipelining)
+
+
+def run_with_gated_rhythm(pipeline):
+    """
+    Stream the rhythm, yielding to the loop after each section and before the stream ends;
+    returns the pipeline events and, per notes call, the rhythm it got and whether the rhythm
+    was complete by then.
+    """
+    notes_calls = []
+    rhythm_written = False
+
+    async def stream(music_chords, on_section, **kwargs):
+        nonlocal rhythm_written
+        for section in RHYTHM.sections:
+            on_section(section)
+            await asyncio.sleep(0)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        rhythm_written = True
+        return RHYTHM
+
+    async def generate_section(section_name, music_plan, music_rhythm, *args):
+        notes_calls.append((section_name, [sec.section for sec in music_rhythm.sections], rhythm_written))
+        return f"notes of {section_name}"
+
+    pipeline.music_plan_service.stream_music_rhythm_given_chords_async = stream
+    pipeline.music_plan_service.generate_music_rhythm_given_chords_async = AsyncMock(return_value=RHYTHM)
+    pipeline.notes_gen_service.generate_section_notes_given_music_rhythm_async = generate_section
+
+    async def run():
+        return [event async for event in pipeline.iter_events_async("A jazz piece", run_id="run")]
+
+    return asyncio.run(run()), notes_calls
+
+
+def test_pipeline_starts_notes_before_the_rhythm_is_complete():
+    pipeline = make_pipeline()
+
+    events, notes_calls = run_with_gated_rhythm(pipeline)
+
+    assert notes_calls == [
+        ("Intro", ["Intro", "A"], False),
+        ("A", ["Intro", "A", "Outro"], False),
+        ("Outro", ["Intro", "A", "Outro"], True),
+    ]
+    assert [event for event, _ in events] == ["rhythm", "section", "section", "section"]
+    # Sections finished before the rhythm come right after it, in order
+    assert [payload[:2] for _, payload in events[1:]] == [(0, "Intro"), (1, "A"), (2, "Outro")]
+    pipeline.music_plan_service.save_music_plan.assert_called_once()
+    assert pipeline.music_plan_service.save_music_plan.call_args.args[0] == "run"
+
+
+@pytest.mark.parametrize("slice_context, pipelining", [(False, True), (True, False)])
+def test_pipeline_waits_for_the_full_rhythm(slice_context, pipelining):
+    pipeline = make_pipeline(slice_context=slice_context, pipelining=pipelining)
+
+    events, notes_calls = run_with_gated_rhythm(pipeline)
+
+    full = ["Intro", "A", "Outro"]
+    assert [(name, rhythm) for name, rhythm, _ in notes_calls] == [(name, full) for name in full]
+    assert len(events) == 4
+
+
+def test_pipeline_rhythm_failure_cancels_started_sections():
+    pipeline = make_pipeline()
+    cancelled = asyncio.Event()
+
+    async def stream(music_chords, on_section, **kwargs):
+        on_section(RHYTHM.sections[0])
+        on_section(RHYTHM.sections[1])
+        await asyncio.sleep(0.01)
+        raise LlmError(LlmErrorKind.UNAVAILABLE, "m", "model down")
+
+    async def generate_section(*args):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    pipeline.music_plan_service.stream_music_rhythm_given_chords_async = stream
+    pipeline.notes_gen_service.generate_section_notes_given_music_rhythm_async = generate_section
+
+    async def run():
+        with pytest.raises(LlmError):
+            async for _ in pipeline.iter_events_async("A jazz piece"):
+                pass
+        await asyncio.sleep(0)
+        return cancelled.is_set()
+
+    assert asyncio.run(run())
+    pipeline.music_plan_service.save_music_plan.assert_not_called()
+
+
+def test_generate_music_notes_async_keeps_rhythm_order():
+    pipeline = make_pipeline()
+    delays = {"Intro": 0.03, "A": 0.0, "Outro": 0.01}
+
+    async def stream(music_chords, on_section, **kwargs):
+        for section in RHYTHM.sections:
+            on_section(section)
+        return RHYTHM
+
+    async def generate_section(section_name, *args):
+        await asyncio.sleep(delays[section_name])
+        return section_name
+
+    pipeline.music_plan_service.stream_music_rhythm_given_chords_async = stream
+    pipeline.notes_gen_service.generate_section_notes_given_music_rhythm_async = generate_section
+    pipeline.notes_gen_service.collect_music_notes.side_effect = lambda results, music_rhythm: list(results)
+
+    result = asyncio.run(pipeline.generate_music_notes_async("A jazz piece", run_id="run"))
+
+    assert result == ["Intro", "A", "Outro"]
+    pipeline.notes_gen_service.save_music_notes.assert_called_once_with(result, "run")
+
+
+def test_pipeline_reuses_notes_of_repeated_sections():
+    pipeline = make_pipeline()
+    rhythm = MusicRhythm(sections=[rhythm_section(name) for name in ["Intro", "A", "B", "A", "Outro"]])
+    notes_calls = []
+
+    async def stream(music_chords, on_section, **kwargs):
+        for section in rhythm.sections:
+            on_section(section)
+            await asyncio.sleep(0)
+        return rhythm
+
+    async def generate_section(section_name, *args):
+        notes_calls.append(section_name)
+        await asyncio.sleep(0.01)
+        return f"notes of {section_name}"
+
+    pipeline.music_plan_service.stream_music_rhythm_given_chords_async = stream
+    pipeline.notes_gen_service.generate_section_notes_given_music_rhythm_async = generate_section
+
+    async def run():
+        return [event async for event in pipeline.iter_events_async("A jazz piece")]
+
+    events = asyncio.run(run())
+
+    assert notes_calls == ["Intro", "A", "B", "Outro"]
+    sections = sorted(payload for event, payload in events if event == "section")
+    assert sections == [
+        (0, "Intro", "notes of Intro"), (1, "A", "notes of A"), (2, "B", "notes of B"),
+        (3, "A", "notes of A"), (4, "Outro", "notes of Outro"),
+    ]
+
+
+def test_pipeline_fast_mode_streams_the_fused_call():
+    pipeline = make_pipeline()
+    plan = Mock()
+    notes_calls = []
+
+    async def stream_fused(description, on_plan, on_section, music_plan=None, **kwargs):
+        on_plan(plan, CHORDS)
+        for section in RHYTHM.sections:
+            on_section(section)
+            await asyncio.sleep(0)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return plan, CHORDS, RHYTHM
+
+    async def generate_section(section_name, music_plan, music_rhythm, *args):
+        notes_calls.append((section_name, music_plan))
+
+    pipeline.music_plan_service.stream_fused_music_plan_async = stream_fused
+    pipeline.notes_gen_service.generate_section_notes_given_music_rhythm_async = generate_section
+
+    async def run():
+        return [event async for event in pipeline.iter_events_async("A jazz piece", plan_mode=PlanMode.FAST)]
+
+    events = asyncio.run(run())
+
+    assert events[0] == ("rhythm", (plan, RHYTHM))
+    assert notes_calls == [("Intro", plan), ("A", plan), ("Outro", plan)]
+    pipeline.music_plan_service.generate_music_chords_given_description_async.assert_not_awaited()
+    pipeline.music_plan_service.generate_music_plan_given_description_async.assert_not_called()
+    assert pipeline.music_plan_service.save_music_plan.call_args.args[1:] == ("A jazz piece", plan, CHORDS, RHYTHM)
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, patch
+from src.services.rate_limit import TokenBucket, LlmRateLimiter
+from src.services.llm import LlmService
+from src.schemas.openrouter import PromptRequest, CompletionKwargs
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_paces_and_allows_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_minute=60, clock=clock)
+    assert bucket.capacity == 1.0
+    assert bucket.wait_time(1) == 0.0
+    bucket.take(1)
+    assert bucket.wait_time(1) == 1.0
+
+    clock.now += 1.0
+    # More than the capacity waits for a full bucket only, then leaves a debt
+    assert bucket.wait_time(5) == 0.0
+    bucket.take(5)
+    assert bucket.wait_time(1) == 5.0
+    bucket.give_back(3)
+    assert bucket.wait_time(1) == 2.0
+
+
+def test_limiter_caps_in_flight():
+    limiter = LlmRateLimiter(max_in_flight=1)
+    first = limiter.acquire("m", 10)
+    admitted = threading.Event()
+
+    def second():
+        limiter.acquire("m", 10).release()
+        admitted.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not admitted.wait(0.1)
+    assert limiter.snapshot()["queued"] == 1
+
+    first.release()
+    assert admitted.wait(1)
+    thread.join()
+    snapshot = limiter.snapshot()
+    assert (snapshot["in_flight"], snapshot["queued"], snapshot["admitted"]) == (0, 0, 2)
+    assert snapshot["waited_seconds"] >= 0.1
+
+
+def test_limiter_serves_requests_round_robin():
+    async def run():
+        limiter = LlmRateLimiter(max_in_flight=1)
+        holder = await limiter.acquire_async("m", 10, key="first")
+        order = []
+
+        async def call(key, index):
+            permit = await limiter.acquire_async("m", 10, key=key)
+            order.append(f"{key}{index}")
+            await asyncio.sleep(0)
+            permit.release()
+
+        # A request fanning out three sections, then a second request with one
+        tasks = [asyncio.create_task(call("a", index)) for index in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(call("b", 0)))
+        await asyncio.sleep(0)
+        holder.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["a0", "b0", "a1", "a2"]
+
+
+def test_limiter_paces_requests_per_model():
+    limiter = LlmRateLimiter(max_in_flight=100, requests_per_minute=600, model_limits={"fast": {"rpm": 60000}})
+    start = time.perf_counter()
+    for _ in range(13):
+        limiter.acquire("slow", 1).release()
+    slow_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(13):
+        limiter.acquire("fast", 1).release()
+    fast_elapsed = time.perf_counter() - start
+
+    # 10 requests/s with a burst of 10: the last 3 wait for the refill
+    assert 0.25 <= slow_elapsed < 1.0
+    assert fast_elapsed < 0.1
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def run():
+        limiter = LlmRateLimiter(max_in_flight=1)
+        holder = await limiter.acquire_async("m", 10)
+        waiter = asyncio.create_task(limiter.acquire_async("m", 10, key="gone"))
+        await asyncio.sleep(0.01)
+        assert limiter.snapshot()["queued"] == 1
+        waiter.cancel()
+        await asyncio.sleep(0)
+        holder.release()
+        return limiter.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["queued"] == 0 and snapshot["in_flight"] == 0 and snapshot["admitted"] == 1
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_prompt_llm_goes_through_limiter(mock_instructor):
+    completion = Mock()
+    completion.usage.total_tokens = 150
+    mock_client = Mock()
+    mock_client.create_with_completion.return_value = ("ok", completion)
+    mock_instructor.return_value = mock_client
+    limiter = LlmRateLimiter(tokens_per_minute=60000, clock=FakeClock())
+    service = LlmService(llm_provider="openrouter", rate_limiter=limiter)
+    prompt_request = PromptRequest(
+        user_messages="Hi", system_messages="", model="llama3", kwargs=CompletionKwargs(max_tokens=500)
+    )
+
+    assert service.prompt_llm(prompt_request) == "ok"
+    assert limiter.snapshot()["in_flight"] == 0
+    assert limiter.admitted == 1
+    # 501 tokens reserved from the 1000 of a second, 150 used: the rest went back to the budget
+    assert limiter._token_buckets["llama3"].wait_time(850) == 0.0
+    assert limiter._token_buckets["llama3"].wait_time(851) > 0.0
+
+
+def test_limiter_wakes_up_for_a_sooner_model():
+    clock = FakeClock()
+    limiter = LlmRateLimiter(max_in_flight=10, model_limits={"slow": {"rpm": 6}, "fast": {"rpm": 600}}, clock=clock)
+    limiter.acquire("slow", 1).release()
+    for _ in range(10):
+        limiter.acquire("fast", 1).release()
+
+    async def run():
+        # The slow model is ready in 10s, the fast one in 0.1s
+        slow = asyncio.create_task(limiter.acquire_async("slow", 1, key="a"))
+        await asyncio.sleep(0.01)
+        fast = asyncio.create_task(limiter.acquire_async("fast", 1, key="b"))
+        await asyncio.sleep(0.01)
+        assert limiter.snapshot()["queued"] == 2
+        clock.now += 0.1
+        permit = await asyncio.wait_for(fast, timeout=1)
+        permit.release()
+        assert not slow.done()
+        slow.cancel()
+
+    asyncio.run(run())
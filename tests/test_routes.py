@@ -1,6 +1,8 @@
+import base64
+import json
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
+from unittest.mock import Mock, AsyncMock, patch
 from src.main import app
 from src.schemas.music import MusicPlan, MusicRhythm, MusicNotes
 
@@ -34,34 +36,104 @@ def test_create_music_plan(mock_service):
         length_scale=LengthScale(total_bars=16, duration_seconds="1:00"),
         looping_behavior="Repeat"
     )
-    mock_service.generate_music_plan_given_description.return_value = mock_plan
+    mock_service.generate_music_plan_given_description_async = AsyncMock(return_value=mock_plan)
 
     response = client.get("/create_music_plan?description=A jazz piece")
 
     assert response.status_code == 200
-    mock_service.generate_music_plan_given_description.assert_called_once_with(
+    mock_service.generate_music_plan_given_description_async.assert_awaited_once_with(
         description="A jazz piece", model=None, kwargs=None
     )
 
 
-@patch('src.routes.llm.music_plan_service')
-def test_generate_midi_from_description(mock_service):
+@patch('src.routes.llm.generation_pipeline')
+def test_generate_midi_from_description(mock_pipeline):
     mock_notes = Mock(spec=MusicNotes)
-    mock_service.generate_music_rhythm_given_description.return_value = (Mock(), Mock())
-    with patch('src.routes.llm.notes_gen_service') as mock_notes_service, \
-         patch('src.routes.llm.json_to_midi_bytes', return_value=b'midi_bytes') as mock_midi:
-        mock_notes_service.generate_all_channel_notes.return_value = mock_notes
-
+    mock_pipeline.generate_music_notes_async = AsyncMock(return_value=mock_notes)
+    with patch('src.routes.llm.json_to_midi_bytes', return_value=b'midi_bytes') as mock_midi:
         response = client.get("/generate_midi_from_description?description=A jazz piece")
 
         assert response.status_code == 200
         data = response.json()
         assert "midi_data" in data
+        assert mock_pipeline.generate_music_notes_async.await_args.kwargs["run_id"] == data["run_id"]
+
+
+@patch('src.routes.llm.generation_pipeline')
+@pytest.mark.parametrize("headers, query", [
+    ({"Accept": "audio/midi"}, ""),
+    ({}, "&format=midi"),
+])
+def test_generate_midi_from_description_binary(mock_pipeline, headers, query):
+    mock_pipeline.generate_music_notes_async = AsyncMock(return_value=Mock(spec=MusicNotes))
+    with patch('src.routes.llm.json_to_midi_bytes', return_value=b'midi_bytes'):
+        response = client.get(f"/generate_midi_from_description?description=A jazz piece{query}", headers=headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "audio/midi"
+        assert response.content == b'midi_bytes'
+        assert response.headers["x-run-id"] in response.headers["content-disposition"]
+
+
+def test_generate_midi_from_cache_negotiation():
+    binary = client.get("/generate_midi_from_cache", headers={"Accept": "audio/midi"})
+    assert binary.headers["content-type"] == "audio/midi"
+    assert binary.content[:4] == b"MThd"
+
+    as_json = client.get("/generate_midi_from_cache", headers={"Accept-Encoding": "gzip"})
+    assert as_json.headers["content-encoding"] == "gzip"
+    assert base64.b64decode(as_json.json()["midi_data"]) == binary.content
+
+
+@patch('src.routes.llm.generation_pipeline')
+def test_create_music_notes_serialized_with_pydantic(mock_pipeline):
+    from src.schemas.music import ChannelNotes, SectionNotes, BarNotes
+    music_notes = MusicNotes(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="A", bars=[BarNotes(bar=1, events=[[1.0, "C4", "quarter", 80]])])
+        ])
+    ])
+    mock_pipeline.generate_music_notes_async = AsyncMock(return_value=music_notes)
 
+    response = client.get("/create_music_notes?description=A jazz piece")
 
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert MusicNotes.model_validate(response.json()) == music_notes
+
+
+@patch('src.routes.llm.notes_gen_service')
 @patch('src.routes.llm.music_plan_service')
-def test_generate_midi_from_description_failure(mock_service):
-    mock_service.generate_music_rhythm_given_description.return_value = (None, None)
+def test_generate_midi_variations(mock_plan_service, mock_notes_service):
+    from src.services.notes_gen import NotesGenService
+    mock_plan_service.generate_music_rhythm_given_description_async = AsyncMock(return_value=(Mock(), Mock()))
+    mock_notes_service.variation_kwargs.side_effect = NotesGenService.variation_kwargs
+    mock_notes_service.generate_variations_async = AsyncMock(return_value=[Mock(spec=MusicNotes), None, Mock(spec=MusicNotes)])
+
+    with patch('src.routes.llm.json_to_midi_bytes', return_value=b'midi_bytes'):
+        response = client.get(
+            "/generate_midi_variations?description=A jazz piece&n=3&seed=7&temperatures=0.7&temperatures=1.1"
+        )
+
+    data = response.json()
+    # Upstream stages run once for all variations
+    mock_plan_service.generate_music_rhythm_given_description_async.assert_awaited_once()
+    assert [v["seed"] for v in data["variations"]] == [7, 8, 9]
+    assert [v["temperature"] for v in data["variations"]] == [0.7, 1.1, 0.7]
+    assert base64.b64decode(data["variations"][0]["midi_data"]) == b'midi_bytes'
+    assert "error" in data["variations"][1]
+    assert mock_notes_service.generate_variations_async.await_args.kwargs["run_id"] == data["run_id"]
+
+
+def test_generate_midi_variations_limit():
+    response = client.get("/generate_midi_variations?description=A jazz piece&n=1000")
+
+    assert "error" in response.json()
+
+
+@patch('src.routes.llm.generation_pipeline')
+def test_generate_midi_from_description_failure(mock_pipeline):
+    mock_pipeline.generate_music_notes_async = AsyncMock(return_value=None)
 
     response = client.get("/generate_midi_from_description?description=A jazz piece")
 
@@ -77,4 +149,107 @@ def test_llm_health(mock_service):
     response = client.get("/llm_health?model=test")
 
     assert response.status_code == 200
-    assert response.json() == {"status": "ok"}
\ No newline at end of file
+    assert response.json() == {"status": "ok"}
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@patch('src.routes.llm.generation_pipeline')
+@patch('src.routes.llm.notes_gen_service')
+def test_stream_midi_from_description(mock_notes_service, mock_pipeline):
+    from src.schemas.music import RhythmSection, SectionChannelsResponse, ChannelNotes, SectionNotes, BarNotes
+    from src.services.notes_gen import NotesGenService
+
+    mock_plan = Mock()
+    mock_plan.model_dump_json.return_value = '{"genre_style": "Jazz"}'
+    rhythm = MusicRhythm(sections=[
+        RhythmSection(section=name, bars=1, bass=["b"], perc=["p"], melody=["m"], harmony=["h"], voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat")
+        for name in ["Intro", "A"]
+    ])
+    section_notes = {
+        name: SectionChannelsResponse(channels=[
+            ChannelNotes(channel="melody", sections=[
+                SectionNotes(section=name, bars=[BarNotes(bar=1, events=[[1.0, "C4", "quarter", 80]])])
+            ])
+        ])
+        for name in ["Intro", "A"]
+    }
+
+    async def fake_iter(**kwargs):
+        yield "rhythm", (mock_plan, rhythm)
+        # Sections finish out of order
+        yield "section", (1, "A", section_notes["A"])
+        yield "section", (0, "Intro", section_notes["Intro"])
+
+    mock_pipeline.iter_events_async = fake_iter
+    mock_notes_service.collect_music_notes.side_effect = NotesGenService(Mock()).collect_music_notes
+
+    response = client.get("/stream_midi_from_description?description=A jazz piece")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    # Never gzipped, which would buffer the events
+    assert "content-encoding" not in response.headers
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["plan", "section", "section", "midi"]
+    assert events[0][1]["music_plan"] == {"genre_style": "Jazz"}
+    assert events[0][1]["run_id"]
+    assert [data["section"] for _, data in events[1:3]] == ["A", "Intro"]
+    assert events[3][1]["description"] == "A jazz piece"
+    # Final notes keep the rhythm section order
+    saved_notes, run_id = mock_notes_service.save_music_notes.call_args.args
+    assert [sec.section for sec in saved_notes.channels[0].sections] == ["Intro", "A"]
+    assert run_id == events[0][1]["run_id"]
+
+
+@patch('src.routes.llm.generation_pipeline')
+def test_stream_midi_from_description_plan_failure(mock_pipeline):
+    from src.services.circuit_breaker import LlmError, LlmErrorKind
+
+    async def failing_iter(**kwargs):
+        raise LlmError(LlmErrorKind.RATE_LIMITED, "llama3", "rate limited", retry_after=3.0)
+        yield
+
+    mock_pipeline.iter_events_async = failing_iter
+
+    response = client.get("/stream_midi_from_description?description=A jazz piece")
+
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["error"]
+    assert events[0][1]["kind"] == "rate_limited"
+
+
+@patch('src.routes.llm.generation_pipeline')
+def test_stream_midi_from_description_unexpected_failure(mock_pipeline):
+    mock_plan = Mock()
+    mock_plan.model_dump_json.return_value = '{"genre_style": "Jazz"}'
+
+    async def failing_iter(**kwargs):
+        yield "rhythm", (mock_plan, MusicRhythm(sections=[]))
+        raise RuntimeError("artifact store unavailable")
+
+    mock_pipeline.iter_events_async = failing_iter
+
+    response = client.get("/stream_midi_from_description?description=A jazz piece")
+
+    events = parse_sse(response.text)
+    assert [event for event, _ in events] == ["plan", "error"]
+    assert events[1][1] == {"error": "Failed to generate music"}
+
+
+@patch('src.routes.llm.generation_pipeline')
+def test_stream_midi_from_description_without_rhythm(mock_pipeline):
+    async def empty_iter(**kwargs):
+        return
+        yield
+
+    mock_pipeline.iter_events_async = empty_iter
+
+    response = client.get("/stream_midi_from_description?description=A jazz piece")
+
+    assert parse_sse(response.text) == [("error", {"error": "Failed to generate music rhythm"})]
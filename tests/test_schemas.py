@@ -1,3 +1,4 @@
+import json
 import pytest
 from pydantic import ValidationError
 from src.schemas.music import (
@@ -5,6 +6,7 @@ from src.schemas.music import (
     TempoFeel, Instrument, StructureSection, LengthScale,
     ChannelNotes, SectionNotes, BarNotes
 )
+from src.schemas.note_events import NoteEvents, NoteEvent, REST_PITCH, UNKNOWN_PITCH
 
 
 def test_music_plan_valid():
@@ -96,9 +98,8 @@ def test_music_notes_validation():
             }
         ]
     }
-    # Pydantic doesn't validate event contents deeply, but let's test basic structure
-    notes_invalid = MusicNotes(**data_invalid)
-    assert notes_invalid.channels[0].sections[0].bars[0].events[0][3] == -10  # no validation
+    with pytest.raises(ValidationError, match="velocity"):
+        MusicNotes(**data_invalid)
 
 
 def test_tempo_feel():
@@ -111,4 +112,72 @@ def test_tempo_feel():
 
 def test_instrument():
     inst = Instrument(name="Piano", role="melody")
-    assert inst.name == "Piano"
\ No newline at end of file
+    assert inst.name == "Piano"
+
+
+def test_bar_notes_events_parsed_to_arrays():
+    bar = BarNotes(bar=1, events=[[1, "C4", "quarter", 80], [2.5, "rest", "eighth", 0], [3, 62, "16th", 90]])
+
+    assert isinstance(bar.events, NoteEvents)
+    assert len(bar.events) == 3
+    assert bar.events[0] == NoteEvent(beat=1.0, pitch=60, duration=480, velocity=80)
+    assert bar.events[1].pitch == REST_PITCH
+    assert list(bar.events)[2] == (3.0, 62, 120, 90)
+    assert bar.events.pitches.itemsize == 1
+    assert bar.events.durations.typecode == "I"
+
+
+def test_bar_notes_events_round_trip():
+    bar = BarNotes(bar=1, events=[[1.5, "Eb4", "dotted_quarter", 80], [2, "rest", "sixteenth", 0]])
+
+    dumped = bar.model_dump()
+    assert dumped["events"] == [[1.5, "Eb4", "dotted_quarter", 80], [2.0, "rest", "sixteenth", 0]]
+    assert BarNotes.model_validate_json(bar.model_dump_json()) == bar
+    assert bar.model_copy(deep=True) == bar
+
+
+def test_bar_notes_events_keep_their_spelling():
+    events = [
+        [1.0, "D4", "quarter", 80], [1.5, "C#4", "8th", 80], [2.0, "Db4", "dotted-quarter", 80],
+        [3.0, 62, "16th", 80], [3.5, "bd", "eighth", 90], [4.0, "Closed Hat", "Dotted Sixteenth", 70],
+    ]
+    bar = BarNotes(bar=1, events=events)
+
+    assert bar.model_dump()["events"] == events
+    assert json.loads(bar.model_dump_json())["events"] == events
+    assert list(bar.events.pitches) == [62, 61, 61, 62, 36, 42]
+    # Spelled differently, the same notes
+    assert BarNotes(bar=1, events=[[1, "D4", "quarter", 80]]) == BarNotes(bar=1, events=[[1, 62, "quarter", 80]])
+
+
+@pytest.mark.parametrize("event, message", [
+    ([1.0, "C4", "quarter"], "event 1 must be"),
+    (["1", "C4", "quarter", 80], "beat must be a number"),
+    ([1.0, "C4", "32nd-triplet", 80], "unknown duration"),
+    ([1.0, "C4", "quarter", 130], "velocity"),
+    ([1.0, "C4", "quarter", 80.5], "velocity"),
+    ([1.0, 200, "quarter", 80], "pitch"),
+])
+def test_bar_notes_events_invalid(event, message):
+    with pytest.raises(ValidationError, match=message):
+        BarNotes(bar=1, events=[[1.0, "C4", "quarter", 80], event])
+
+
+def test_bar_notes_events_keep_unknown_pitches():
+    bar = BarNotes(bar=1, events=[[1, "C10", "quarter", 80], [2, "C4", "quarter", 80], [3, "cowbel", "eighth", 80]])
+
+    assert bar.events.pitches[0] == UNKNOWN_PITCH
+    assert bar.events.unknown_pitches == {0: "C10", 2: "cowbel"}
+    assert bar.model_dump()["events"][0] == [1.0, "C10", "quarter", 80]
+    assert BarNotes.model_validate_json(bar.model_dump_json()) == bar
+
+
+def test_bar_notes_events_json_schema_unchanged():
+    events_schema = BarNotes.model_json_schema()["properties"]["events"]
+
+    assert events_schema["type"] == "array"
+    assert events_schema["items"] == {
+        "items": {"anyOf": [{"type": "number"}, {"type": "string"}, {"type": "integer"}]},
+        "type": "array",
+    }
+    assert "[beat, pitch, duration, velocity]" in events_schema["description"]
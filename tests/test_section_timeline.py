@@ -0,0 +1,81 @@
+from src.schemas.music import RhythmSection, SectionChannelsResponse, ChannelNotes, SectionNotes, BarNotes
+from src.services.section_timeline import repeat_sources, bar_offsets, place_section_notes
+
+
+def rhythm_section(name, bars=4):
+    return RhythmSection(
+        section=name, bars=bars, bass=["b"], perc=["p"], melody=["m"], harmony=["h"],
+        voiceLeading=["v"], dynamics=["d"], polyphony="mono", loop="repeat"
+    )
+
+
+def section_notes(name, bar_numbers):
+    return SectionChannelsResponse(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section=name, bars=[BarNotes(bar=bar, events=[[1.0, "C4", "quarter", 80]]) for bar in bar_numbers])
+        ])
+    ])
+
+
+def test_repeat_sources_match_name_and_length():
+    sections = [rhythm_section("Intro"), rhythm_section("A"), rhythm_section("B"), rhythm_section("a "),
+                rhythm_section("A2"), rhythm_section("A", bars=8), rhythm_section("B")]
+
+    # A2 is a variation and a longer A is different material; both are generated
+    assert repeat_sources(sections) == [0, 1, 2, 1, 4, 5, 2]
+
+
+def test_bar_offsets():
+    assert bar_offsets([rhythm_section("Intro", 2), rhythm_section("A", 8), rhythm_section("Outro", 4)]) == [0, 2, 10]
+
+
+def test_place_section_notes_after_earlier_sections():
+    placed = place_section_notes(section_notes("a ", [1, 2]), rhythm_section("A"), bar_offset=12)
+
+    sec = placed.channels[0].sections[0]
+    assert sec.section == "A"
+    assert [bar.bar for bar in sec.bars] == [13, 14]
+
+
+def test_place_section_notes_renumbers_song_wide_bars():
+    # Notes of a repeat, numbered from the section's first use (5..8) instead of 1..4
+    placed = place_section_notes(section_notes("A", [5, 6, 8]), rhythm_section("A"), bar_offset=16, source_offset=4)
+
+    assert [bar.bar for bar in placed.channels[0].sections[0].bars] == [17, 18, 20]
+
+
+def test_place_section_notes_after_a_shorter_section():
+    # Intro of 4 bars, then an 8-bar A: bars 5..12 are already song-wide, 1..8 are section-local
+    song_wide = place_section_notes(section_notes("A", range(5, 13)), rhythm_section("A", bars=8), bar_offset=4)
+    local = place_section_notes(section_notes("A", range(1, 9)), rhythm_section("A", bars=8), bar_offset=4)
+
+    assert [bar.bar for bar in song_wide.channels[0].sections[0].bars] == list(range(5, 13))
+    assert [bar.bar for bar in local.channels[0].sections[0].bars] == list(range(5, 13))
+
+
+def test_place_section_notes_after_a_longer_section():
+    # Intro of 8 bars, then a 2-bar A numbered 9..10 song-wide, and its repeat after a 4-bar B
+    first = place_section_notes(section_notes("A", [9, 10]), rhythm_section("A", bars=2), bar_offset=8)
+    repeat = place_section_notes(
+        section_notes("A", [9, 10]), rhythm_section("a", bars=2), bar_offset=14, source_offset=8
+    )
+
+    assert [bar.bar for bar in first.channels[0].sections[0].bars] == [9, 10]
+    assert [bar.bar for bar in repeat.channels[0].sections[0].bars] == [15, 16]
+    assert repeat.channels[0].sections[0].section == "a"
+
+
+def test_place_section_notes_keeps_names_of_split_sections():
+    split = SectionChannelsResponse(channels=[
+        ChannelNotes(channel="melody", sections=[
+            SectionNotes(section="a", bars=[BarNotes(bar=1, events=[[1.0, "C4", "quarter", 80]])]),
+            SectionNotes(section="A (fill)", bars=[BarNotes(bar=2, events=[[1.0, "D4", "quarter", 80]])]),
+        ])
+    ])
+    placed = place_section_notes(split, rhythm_section("A"), bar_offset=4)
+
+    assert [sec.section for sec in placed.channels[0].sections] == ["A", "A (fill)"]
+    assert [sec.bars[0].bar for sec in placed.channels[0].sections] == [5, 6]
+    # A single section is the rhythm section, whatever the LLM called it
+    single = place_section_notes(section_notes("Bridge", [1]), rhythm_section("A"), bar_offset=4)
+    assert single.channels[0].sections[0].section == "A"
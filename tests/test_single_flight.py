@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from unittest.mock import Mock, AsyncMock, patch
+import pytest
+from openai.types.chat import ChatCompletionChunk
+from src.schemas.music import MusicRhythm
+from src.schemas.openrouter import PromptRequest
+from src.services.llm import LlmService
+from src.services.single_flight import SingleFlight
+
+
+def test_concurrent_async_calls_share_one_run():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        return await asyncio.gather(*[single_flight.do_async("key", fn) for _ in range(5)])
+
+    results = asyncio.run(run())
+
+    assert calls == 1
+    assert sorted(results) == [("result", False)] + [("result", True)] * 4
+    assert single_flight.stats.snapshot() == {"calls": 1, "coalesced": 4}
+    # The key is released once the call finishes
+    assert len(single_flight) == 0
+    assert asyncio.run(single_flight.do_async("key", fn)) == ("result", False)
+
+
+def test_waiters_get_the_callers_exception():
+    single_flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model down")
+
+    async def run():
+        return await asyncio.gather(*[single_flight.do_async("key", fn) for _ in range(3)], return_exceptions=True)
+
+    errors = asyncio.run(run())
+
+    assert [str(error) for error in errors] == ["model down"] * 3
+    assert single_flight.stats.calls == 1
+
+
+def test_cancelled_caller_hands_over_to_a_waiter():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return calls
+
+    async def run():
+        leader = asyncio.create_task(single_flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(single_flight.do_async("key", fn))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    # The waiter runs the call itself instead of failing with the cancelled caller
+    assert asyncio.run(run()) == (2, False)
+
+
+def test_threads_share_one_run():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(single_flight.do("key", fn))) for _ in range(3)]
+    threads[0].start()
+    started.wait(1)
+    for thread in threads[1:]:
+        thread.start()
+    while single_flight.stats.coalesced < 2:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("result", False), ("result", True), ("result", True)]
+
+
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_identical_prompts_in_flight_are_coalesced(mock_instructor):
+    rhythm = MusicRhythm(sections=[])
+
+    async def create_with_completion(**params):
+        await asyncio.sleep(0.01)
+        return rhythm, Mock()
+
+    mock_client = Mock()
+    mock_client.create_with_completion = AsyncMock(side_effect=create_with_completion)
+    mock_instructor.return_value = mock_client
+    service = LlmService(llm_provider="openrouter", single_flight=SingleFlight())
+
+    def prompt(text):
+        return service.prompt_llm_async(PromptRequest(
+            user_messages=text, system_messages="", model="llama3", response_format=MusicRhythm
+        ))
+
+    async def run():
+        return await asyncio.gather(prompt("rhythm please"), prompt("rhythm please"), prompt("other rhythm"))
+
+    first, second, other = asyncio.run(run())
+
+    assert first == second == other == rhythm
+    # Callers get their own copy of the shared response
+    assert first is not second
+    assert mock_client.create_with_completion.await_count == 2
+
+
+@pytest.mark.parametrize("stream_first", [True, False])
+@patch('instructor.from_openai')
+@patch.dict('os.environ', {'OPENROUTER_API_KEY': 'fake'})
+def test_streamed_and_plain_calls_coalesce(mock_instructor, stream_first):
+    rhythm = MusicRhythm(sections=[])
+
+    async def create_with_completion(**params):
+        await asyncio.sleep(0.01)
+        return rhythm, Mock()
+
+    async def stream():
+        await asyncio.sleep(0.01)
+        yield ChatCompletionChunk.model_validate({
+            "id": "c", "created": 0, "model": "m", "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": rhythm.model_dump_json()}}],
+        })
+
+    mock_client = Mock()
+    mock_client.create_with_completion = AsyncMock(side_effect=create_with_completion)
+    mock_client.client.chat.completions.create = AsyncMock(side_effect=lambda **params: stream())
+    mock_instructor.return_value = mock_client
+    service = LlmService(llm_provider="openrouter", single_flight=SingleFlight())
+    prompt_request = PromptRequest(user_messages="rhythm please", system_messages="", model="llama3", response_format=MusicRhythm)
+    partials = []
+
+    async def run():
+        streamed = service.prompt_llm_streaming_async(prompt_request, partials.append, raise_errors=True)
+        plain = service.prompt_llm_async(prompt_request, raise_errors=True)
+        if stream_first:
+            return await asyncio.gather(streamed, plain)
+        plain, streamed = await asyncio.gather(plain, streamed)
+        return streamed, plain
+
+    streamed, plain = asyncio.run(run())
+
+    assert streamed == plain == rhythm
+    assert [partial.model_dump() for partial in partials] == [rhythm.model_dump()]
+    assert mock_client.client.chat.completions.create.await_count + mock_client.create_with_completion.await_count == 1
@@ -0,0 +1,130 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import json
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import Mock
+from src.main import app
+from src.tracing import Tracer, JsonlTraceExporter, tracer, current_span
+from src.services.notes_gen import NotesGenService
+from src.schemas.music import MusicRhythm, RhythmSection, SectionChannelsResponse
+
+client = TestClient(app)
+
+
+def test_spans_nest_and_finish_trace():
+    local_tracer = Tracer()
+    with local_tracer.span("request", path="/x") as root:
+        with local_tracer.span("stage") as child:
+            assert current_span() is child
+        assert current_span() is root
+
+    assert current_span() is None
+    assert child.trace is root.trace
+    assert child.parent_id == root.span_id
+    assert child.end <= root.end
+    assert local_tracer.recent() == [root.trace]
+
+
+def test_context_propagates_to_threads_and_tasks():
+    local_tracer = Tracer()
+
+    def in_thread():
+        with local_tracer.span("thread_work") as span:
+            return span
+
+    async def in_task():
+        with local_tracer.span("task_work") as span:
+            await asyncio.sleep(0)
+            return span
+
+    with local_tracer.span("request") as root:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            thread_span = executor.submit(contextvars.copy_context().run, in_thread).result()
+            orphan_span = executor.submit(in_thread).result()
+
+    async def main():
+        with local_tracer.span("async_request") as async_root:
+            task_spans = await asyncio.gather(in_task(), in_task())
+        return async_root, task_spans
+
+    async_root, task_spans = asyncio.run(main())
+
+    assert thread_span.parent_id == root.span_id and thread_span.thread != root.thread
+    # Without a copied context the worker starts a trace of its own
+    assert orphan_span.trace is not root.trace
+    assert all(span.parent_id == async_root.span_id for span in task_spans)
+
+
+def test_error_recorded_on_span():
+    local_tracer = Tracer()
+    try:
+        with local_tracer.span("failing"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    assert "boom" in local_tracer.recent()[0].root.attributes["error"]
+
+
+def test_recent_slowest_first_and_exported(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    local_tracer = Tracer(exporters=[JsonlTraceExporter(str(path))], max_recent=2)
+    for name, delay in [("fast", 0), ("slow", 0.02), ("medium", 0.01)]:
+        with local_tracer.span(name):
+            time.sleep(delay)
+    local_tracer.flush()
+
+    assert [trace.root.name for trace in local_tracer.recent()] == ["slow", "medium"]
+    assert [trace.root.name for trace in local_tracer.recent(min_duration=0.015)] == ["slow"]
+    exported = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [trace["name"] for trace in exported] == ["fast", "slow", "medium"]
+    assert exported[1]["spans"][0]["duration_ms"] >= 20
+
+
+def test_waterfall():
+    local_tracer = Tracer()
+    with local_tracer.span("request") as root:
+        with local_tracer.span("llm", model="m1"):
+            pass
+
+    lines = root.trace.waterfall().splitlines()
+    assert lines[0].startswith(f"trace {root.trace.trace_id} request")
+    assert "█" in lines[1] and lines[2].endswith("model=m1")
+    assert "  llm" in lines[2]
+
+
+def test_section_spans_nest_across_worker_threads():
+    llm_service = Mock()
+    llm_service.prompt_llm.return_value = SectionChannelsResponse(channels=[])
+    service = NotesGenService(llm_service, slice_context=False)
+    music_rhythm = MusicRhythm(sections=[
+        RhythmSection(section=name, bars=1, bass=[], perc=[], melody=[], harmony=[], voiceLeading=[], dynamics=[], polyphony="", loop="")
+        for name in ["A", "B"]
+    ])
+    service._log_prompt_tokens = Mock()
+
+    with tracer.span("request", new_trace=True) as root:
+        service.generate_all_channel_notes(Mock(), music_rhythm)
+
+    spans = {span.span_id: span for span in root.trace.spans}
+    section_spans = [span for span in spans.values() if span.name == "generate_section_notes_given_music_rhythm"]
+    assert len(section_spans) == 2
+    for span in section_spans:
+        assert spans[span.parent_id].name == "generate_all_channel_notes"
+        assert span.attributes == {"stage": "section_notes"}
+
+
+def test_trace_id_header_and_debug_routes():
+    response = client.get("/health")
+    trace_id = response.headers["x-trace-id"]
+
+    trace = client.get(f"/debug/traces/{trace_id}").json()
+    assert trace["name"] == "GET /health"
+    assert trace["spans"][0]["attributes"]["status"] == 200
+
+    waterfall = client.get("/debug/traces", params={"min_duration_ms": 0, "limit": 100})
+    assert waterfall.headers["content-type"].startswith("text/plain")
+    assert trace_id in waterfall.text
+    assert client.get("/debug/traces/missing").status_code == 404